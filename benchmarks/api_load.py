@@ -0,0 +1,121 @@
+"""
+Load-tests the read API against a catalog snapshot built from the fixtures.
+
+The fixture catalog is replicated --scale times with fresh IDs, served from a
+CatalogServer in this process, and queried by keep-alive client threads with a
+mix of list, filter, lookup and conditional requests.
+
+Usage:
+    python -m benchmarks.api_load --clients 8 --duration 10 --scale 100
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import http.client
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+import numpy as np
+
+from benchmarks.stub_servers import load_fixture
+from lib.catalog_index import CatalogIndex, entry_folioid
+from server import CatalogServer
+
+def scaled_catalog(scale):
+    """
+    Replicates the fixture catalog, offsetting IGDB and folio IDs per copy.
+    """
+    games = load_fixture("Database/enriched-items.json")
+    items = load_fixture("Database/dmc-items.json")
+    id_step = max(game["_id"] for game in games) + 1
+
+    scaled_games, scaled_items = [], []
+    for copy in range(scale):
+        suffix = f"-{copy}" if copy else ""
+        scaled_items.extend({**item, "_id": item["_id"] + suffix} for item in items)
+        scaled_games.extend({
+            **game,
+            "_id": game["_id"] + copy * id_step,
+            "dmc_entries": [entry_folioid(entry) + suffix for entry in game.get("dmc_entries", [])],
+        } for game in games)
+
+    return scaled_games, scaled_items
+
+def request_paths(index, rng, count=1000):
+    """
+    Builds a representative mix of request paths.
+    """
+    game_ids = list(index.game_positions)
+    folioids = list(index.items)
+    genres = list(index.indexes["genre"])
+    platforms = list(index.indexes["platform"])
+    years = list(index.indexes["year"])
+
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            paths.append(f"/games/{rng.choice(game_ids)}")
+        elif kind < 0.6:
+            paths.append(f"/items/{rng.choice(folioids)}")
+        elif kind < 0.9:
+            paths.append("/games?" + urlencode({"genre": rng.choice(genres), "platform": rng.choice(platforms), "limit": 20}))
+        else:
+            paths.append("/games?" + urlencode({"year": rng.choice(years), "offset": rng.randint(0, 40)}))
+    return paths
+
+def client(port, paths, etag, deadline, conditional, latencies, statuses):
+    """
+    Sends requests over one keep-alive connection until the deadline.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        headers = {"If-None-Match": etag} if rng.random() < conditional else {}
+        start = time.perf_counter()
+        connection.request("GET", rng.choice(paths), headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status)
+    connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+    parser.add_argument("--scale", type=int, default=100, help="Copies of the fixture catalog to serve")
+    parser.add_argument("--conditional", type=float, default=0.2, help="Share of requests sending If-None-Match")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = CatalogIndex(*scaled_catalog(args.scale))
+    print(f"{len(index)} games, {len(index.items)} items indexed in {time.perf_counter() - start:.2f}s")
+
+    server = CatalogServer(("127.0.0.1", 0), index)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    paths = request_paths(index, random.Random(0))
+    deadline = time.perf_counter() + args.duration
+    latencies, statuses = [], []
+    threads = [
+        threading.Thread(target=client, args=(port, paths, index.etag, deadline, args.conditional, latencies, statuses))
+        for _ in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    server.shutdown()
+
+    latencies = np.array(latencies) * 1000
+    print(f"{args.clients} clients, {args.duration:.0f}s, statuses {dict(sorted(Counter(statuses).items()))}")
+    print(f"{len(latencies) / args.duration:8.0f} req/s  p50 {np.percentile(latencies, 50):6.2f} ms  p99 {np.percentile(latencies, 99):6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Compares the SentenceTransformer (torch) and int8 ONNX embedding backends.
+
+Accuracy: both backends make the pipeline's decisions on the fixture data,
+every distinct edition/platform string in Database/dmc-items.json through
+PlatformMatcher, and every catalog item linked in Database/enriched-items.json
+through GameTitleMatcher, against its linked game plus the most similar other
+game names as distractors. Decisions that differ between backends are listed.
+
+Speed: cold load time (fresh interpreter, model already exported) and
+sentences per second over the fixture strings.
+
+Usage:
+    python -m benchmarks.embedding_backends --threads 4
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Embeddings must be computed, not served from the on-disk store of earlier runs
+os.environ["EMBEDDING_CACHE_DIR"] = tempfile.mkdtemp(prefix="embedding-backends-")
+
+from benchmarks.stub_servers import load_fixture
+from lib.onnx_encoder import ONNX_QUANTIZE, load_onnx_encoder
+from lib.string_matcher import GameTitleMatcher, PlatformMatcher, get_model
+from lib.title_search import TitleSearchIndex
+from main import clean_titles
+
+BACKENDS = ["torch", "onnx"]
+DISTRACTORS = 9  # Other games offered to the title matcher next to the linked one
+
+def title_groups(items, games):
+    """
+    Builds (item, titles, candidates) for every linked catalog item.
+
+    Candidates are the linked game and the games whose names are most similar
+    to the item's title, so the matcher has to tell near-duplicates apart.
+    """
+    items = {item["_id"]: item for item in items}
+    games_by_id = {game["_id"]: game for game in games}
+    index = TitleSearchIndex(("game", game["_id"], [game["name"]]) for game in games)
+
+    groups = []
+    for game in games:
+        for entry in game.get("dmc_entries", []):
+            folioid = entry if isinstance(entry, str) else entry["folioid"]
+            if folioid not in items:
+                continue
+
+            titles = clean_titles(items[folioid])
+            similar = [id for title in titles for _, _, id, _ in index.search(title, limit=DISTRACTORS + 1, min_score=0.1)]
+            distractors = [id for id in dict.fromkeys(similar) if id != game["_id"]][:DISTRACTORS]
+            candidates = [game] + [games_by_id[id] for id in distractors]
+            groups.append((folioid, game["_id"], titles, candidates))
+
+    return groups
+
+def decisions(backend, model_name, platforms, platform_strings, groups):
+    """
+    Returns the platform and title decisions of one backend.
+    """
+    platform_matcher = PlatformMatcher(model_name, cache_path=None, platform_data=platforms, backend=backend)
+    platform_ids = platform_matcher.match_many(platform_strings)
+
+    title_matcher = GameTitleMatcher(model_name, backend=backend)
+    matches = title_matcher.match_many([(titles, candidates) for _, _, titles, candidates in groups])
+    title_ids = [game["_id"] if game else None for game, _ in matches]
+
+    return platform_ids, title_ids
+
+def cold_load_seconds(model_name, backend):
+    """
+    Times importing the matcher module and loading the model in a fresh interpreter.
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        "from lib.string_matcher import get_model; "
+        f"get_model({model_name!r}, {backend!r}); "
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def throughput(model, texts, repeat=3):
+    """
+    Returns the best sentences per second over several passes.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.encode(texts, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Sentence Transformers model name or path")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for both backends, 0 for the default")
+    args = parser.parse_args()
+
+    items = load_fixture("Database/dmc-items.json")
+    games = load_fixture("Database/enriched-items.json")
+    platforms = load_fixture("Database/platforms.json")
+
+    platform_strings = sorted({s for item in items for s in item["edition"] + item["platform"]})
+    groups = title_groups(items, games)
+    texts = list(dict.fromkeys(platform_strings + [t for _, _, titles, _ in groups for t in titles] + [g["name"] for g in games]))
+
+    # Export once up front, so it is neither part of the load time nor of the first encode
+    start = time.perf_counter()
+    load_onnx_encoder(args.model)
+    print(f"ONNX model ready ({'int8' if ONNX_QUANTIZE else 'fp32'}) in {time.perf_counter() - start:.1f}s")
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    results = {}
+    for backend in BACKENDS:
+        model = get_model(args.model, backend) if backend == "torch" else load_onnx_encoder(args.model, threads=args.threads)
+        results[backend] = {
+            "load": cold_load_seconds(args.model, backend),
+            "speed": throughput(model, texts),
+            "decisions": decisions(backend, args.model, platforms, platform_strings, groups),
+        }
+
+    print(f"\n{'backend':<8}{'cold load':>12}{'sentences/s':>14}{'title accuracy':>17}")
+    for backend, result in results.items():
+        title_ids = result["decisions"][1]
+        correct = sum(chosen == linked for chosen, (_, linked, _, _) in zip(title_ids, groups))
+        print(f"{backend:<8}{result['load']:>11.2f}s{result['speed']:>14.0f}{correct / len(groups):>17.1%}")
+
+    # Decisions must not depend on the backend
+    for kind, inputs, index in (("platform", platform_strings, 0), ("title", [folioid for folioid, _, _, _ in groups], 1)):
+        torch_ids, onnx_ids = results["torch"]["decisions"][index], results["onnx"]["decisions"][index]
+        differences = [(key, a, b) for key, a, b in zip(inputs, torch_ids, onnx_ids) if a != b]
+        print(f"\n{kind} decisions: {len(inputs) - len(differences)}/{len(inputs)} identical")
+        for key, a, b in differences:
+            print(f"    {key!r}: torch {a}, onnx {b}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares one IGDB request per title variant against batched /multiquery searches.
+
+Both modes go through the same rate limiter against a local stub IGDB server.
+Multiquery searches run on AsyncIGDBClient like the enrichment does, so the 
+wall-clock difference reflects both the number of rate-limited requests and 
+the requests kept open concurrently.
+
+Usage:
+    python -m benchmarks.igdb_multiquery --games 50
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.stub_servers import IGDBHandler, load_fixture, start_stub_server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=50, help="Number of catalog items to search for")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated server latency in seconds")
+    args = parser.parse_args()
+
+    stats = {}
+    server, base_url = start_stub_server(
+        IGDBHandler,
+        games=load_fixture("Database/enriched-items.json"),
+        platforms=load_fixture("Database/platforms.json"),
+        latency=args.latency,
+        stats=stats,
+    )
+
+    # Configuration is read at import time, so point the helpers at the stub first.
+    # The response cache is bypassed so both modes actually reach the server. Bypassing 
+    # only skips reads, so the caches and reports go to a scratch directory, keeping 
+    # the stub's responses out of the production files.
+    scratch = tempfile.mkdtemp(prefix="igdb-multiquery-")
+    os.environ.update({
+        "IGDB_BASE_URL": f"{base_url}/v4",
+        "TWITCH_TOKEN_URL": f"{base_url}/oauth2/token",
+        "IGDB_CACHE_BYPASS": "1",
+        "IGDB_CACHE_PATH": os.path.join(scratch, "igdb-cache.sqlite"),
+        "EMBEDDING_CACHE_DIR": os.path.join(scratch, "embeddings"),
+        "METRICS_DIR": os.path.join(scratch, "metrics"),
+    })
+    from lib.api_helpers import IGDB_URL, build_igdb_search_game_query, query_igdb_endpoint
+    from lib.igdb_client import AsyncIGDBClient
+    from main import clean_titles
+
+    items = [item for item in load_fixture("Database/dmc-items.json") if item["platform_id_guess"]]
+    searches = [
+        (title, item["platform_id_guess"])
+        for item in items[:args.games] for title in clean_titles(item)
+    ]
+
+    async def search_many():
+        async with AsyncIGDBClient() as client:
+            return await client.search_many(searches)
+
+    stats.clear()
+    start = time.perf_counter()
+    single = [query_igdb_endpoint(IGDB_URL, build_igdb_search_game_query(title, platforms)) for title, platforms in searches]
+    single_time, single_requests = time.perf_counter() - start, stats.get("requests", 0)
+
+    stats.clear()
+    start = time.perf_counter()
+    batched = asyncio.run(search_many())
+    batched_time, batched_requests = time.perf_counter() - start, stats.get("requests", 0)
+
+    assert single == batched, "Multiquery results differ from single queries"
+
+    print(f"{len(searches)} title searches for {min(args.games, len(items))} games")
+    print(f"single queries  {single_requests:5d} requests  {single_time:7.2f}s")
+    print(f"multiquery      {batched_requests:5d} requests  {batched_time:7.2f}s  speedup x{single_time / batched_time:.1f}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
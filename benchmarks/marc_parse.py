@@ -0,0 +1,151 @@
+"""
+Benchmarks the streaming MARC21 parser against the previous DOM-based parser.
+
+OAI-PMH responses are rendered from the fixture catalog with the stub servers'
+templates. Real catalog records carry many more datafields than the pipeline
+reads (notes, subjects, physical description...), so every record is padded
+with unused fields. Both parsers must produce identical records; throughput is
+reported in records per second and peak memory as measured by tracemalloc.
+
+Usage:
+    python -m benchmarks.marc_parse --records 100 10000
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+from benchmarks.stub_servers import load_fixture, oai_get_record_xml, oai_list_records_xml
+from lib.marc import ET as STREAM_ET, OAIStream, parse_marc21_record
+
+NS = {
+    'oai': 'http://www.openarchives.org/OAI/2.0/',
+    'marc': 'http://www.loc.gov/MARC21/slim'
+}
+
+# Previous implementation, kept verbatim as the baseline
+def legacy_extract_marc21_fields(record_elem):
+    datafields_by_tag = defaultdict(list)
+    for df in record_elem.findall('{http://www.loc.gov/MARC21/slim}datafield'):
+        tag = df.get('tag')
+        subfields = {sf.get('code'): sf.text for sf in df.findall('{http://www.loc.gov/MARC21/slim}subfield')}
+        datafields_by_tag[tag].append(subfields)
+
+    return {
+        "title": [item['a'] for item in datafields_by_tag.get("245", [])],
+        "alternative_titles": [item['a'] for item in datafields_by_tag.get("246", [])],
+        "authors": [item['a'] for item in datafields_by_tag.get("710", []) if 'a' in item],
+        "edition": [item['a'] for item in datafields_by_tag.get("250", []) if 'a' in item],
+        "platform": [item['a'] for item in datafields_by_tag.get("753", []) if 'a' in item],
+        "callnumber": datafields_by_tag.get("099", [])[0]['a'] if datafields_by_tag.get("099") else ''
+    }
+
+def legacy_parse_marc21_record(xml_data, id):
+    root = ET.fromstring(xml_data)
+    record_elem = root.find('.//oai:GetRecord/oai:record/marc:record', NS)
+    if record_elem is None:
+        record_elem = root.find('.//{http://www.loc.gov/MARC21/slim}record')
+    if record_elem is None:
+        raise ValueError(f"MARC record not found for ID: {id}")
+    return legacy_extract_marc21_fields(record_elem)
+
+def legacy_list_records(xml_data):
+    root = ET.fromstring(xml_data)
+    records = []
+    for record in root.iterfind('oai:ListRecords/oai:record', NS):
+        header = record.find('oai:header', NS)
+        record_elem = record.find('oai:metadata/marc:record', NS)
+        deleted = header.get('status') == 'deleted'
+        genres = [
+            sf.text or ''
+            for df in record_elem.iterfind("marc:datafield[@tag='655']", NS)
+            for sf in df.iterfind("marc:subfield[@code='a']", NS)
+        ] if record_elem is not None else []
+        records.append({
+            "id": header.findtext('oai:identifier', namespaces=NS),
+            "datestamp": header.findtext('oai:datestamp', namespaces=NS),
+            "deleted": deleted,
+            "is_game": any('video games' in g.lower() for g in genres),
+            "metadata": legacy_extract_marc21_fields(record_elem) if record_elem is not None and not deleted else None
+        })
+    return records
+
+def stream_list_records(xml_data):
+    return list(OAIStream(xml_data))
+
+def padded(xml, fields):
+    """
+    Adds unused control fields and datafields to every MARC record of a response.
+    """
+    filler = '<controlfield tag="008">200101s2020    xx          v   vleng d</controlfield>' + "".join(
+        f'<datafield tag="{500 + i % 100}" ind1=" " ind2=" ">'
+        f'<subfield code="a">General note {i} about the physical item and its contents.</subfield>'
+        f'<subfield code="b">Additional detail.</subfield></datafield>'
+        for i in range(fields)
+    )
+    return xml.replace("</leader>", "</leader>" + filler).encode("utf-8")
+
+def catalog_items(count):
+    """
+    Repeats the fixture catalog up to count items with unique IDs.
+    """
+    items = load_fixture("Database/dmc-items.json")
+    return [{**items[i % len(items)], "_id": f"{items[i % len(items)]['_id']}-{i}"} for i in range(count)]
+
+def measure(function, documents, repeat=3):
+    """
+    Returns (best seconds, peak bytes, outputs) of parsing every document.
+    """
+    elapsed = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [function(document) for document in documents]
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    # Tracing slows every allocation down, so memory is measured on a separate pass
+    tracemalloc.start()
+    for document in documents:
+        function(document)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, outputs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[100, 10000], help="Records per ListRecords response")
+    parser.add_argument("--get-records", type=int, default=2000, help="Number of GetRecord responses")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes, the fastest is reported")
+    parser.add_argument("--padding", type=int, default=30, help="Unused datafields added to every record")
+    args = parser.parse_args()
+
+    print(f"Streaming parser backend: {STREAM_ET.__name__}")
+
+    # Single record responses, as fetched by the full harvest
+    items = catalog_items(args.get_records)
+    documents = [padded(oai_get_record_xml(item), args.padding) for item in items]
+    legacy = measure(lambda xml: legacy_parse_marc21_record(xml, None), documents, repeat=args.repeat)
+    stream = measure(lambda xml: parse_marc21_record(xml, None), documents, repeat=args.repeat)
+    assert legacy[2] == stream[2], "GetRecord outputs differ"
+    print(
+        f"GetRecord x{len(documents):<6}: legacy {len(documents) / legacy[0]:9.0f} rec/s, "
+        f"new {len(documents) / stream[0]:9.0f} rec/s ({legacy[0] / stream[0]:.2f}x)"
+    )
+
+    # Multi-record pages, as fetched by incremental harvests
+    for count in args.records:
+        document = padded(oai_list_records_xml(catalog_items(count), ""), args.padding)
+        legacy = measure(legacy_list_records, [document], repeat=args.repeat)
+        stream = measure(stream_list_records, [document], repeat=args.repeat)
+        assert legacy[2] == stream[2], "ListRecords outputs differ"
+        print(
+            f"ListRecords {count:>6} records ({len(document) / 1e6:6.1f} MB): "
+            f"legacy {count / legacy[0]:9.0f} rec/s peak {legacy[1] / 1e6:7.1f} MB, "
+            f"stream {count / stream[0]:9.0f} rec/s peak {stream[1] / 1e6:7.1f} MB ({legacy[0] / stream[0]:.2f}x)"
+        )
+
+if __name__ == "__main__":
+    main()
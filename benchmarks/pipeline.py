@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark of main.py against stub servers and a local MongoDB or SQLite file.
+
+The catalog REST search, the OAI-PMH server (GetRecord and ListRecords) and
+IGDB are replaced by local stubs replaying the fixtures in Database/, with
+configurable latency and server-side rate limits. The fixtures are scaled
+synthetically (every copy gets fresh IDs and a distinct title token, so copies
+are searched and matched like new games) to expose superlinear behavior.
+
+Stages run either in pipeline order on an empty database (default), or each in
+isolation on directly seeded inputs (--isolate). Stage timings come from the
+metrics registry, so they are the same numbers a production run reports.
+
+With --storage mongodb (default) a local MongoDB is required (mongomock lacks
+query forms the pipeline uses); a throwaway 'games-api-benchmark' database is
+dropped before every scale. With --storage sqlite every scale gets a fresh
+SQLite file in a scratch directory, so the benchmark runs fully offline.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.pipeline --scale 1 10
+    MONGODB_URI=... python -m benchmarks.pipeline --scale 100 --stages enrich_with_igdb --isolate --igdb-rate 50
+    python -m benchmarks.pipeline --scale 1 10 --storage sqlite
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+
+from benchmarks.stub_servers import CatalogHandler, IGDBHandler, OAIHandler, load_fixture, start_stub_server
+
+STAGES = ["build_platforms", "update_dmc_catalog_data", "update_dmc_catalog_data_incremental", "enrich_with_igdb"]
+
+def scaled_fixtures(scale):
+    """
+    Replicates the catalog and IGDB fixtures, keeping every copy linked to its own games.
+
+    Returns:
+        tuple: (dmc_items, igdb_games)
+    """
+    items = load_fixture("Database/dmc-items.json")
+    games = load_fixture("Database/enriched-items.json")
+    id_step = max(game["_id"] for game in games) + 1
+
+    scaled_items, scaled_games = [], []
+    for copy in range(scale):
+        # A distinct word per copy, so the stub's word search still tells copies apart
+        token = f" s{copy:03d}" if copy else ""
+        id_suffix = f"-{copy}" if copy else ""
+
+        scaled_items.extend({
+            **item,
+            "_id": item["_id"] + id_suffix,
+            "title": [title + token for title in item["title"]],
+        } for item in items)
+        scaled_games.extend({
+            **game,
+            "_id": game["_id"] + copy * id_step,
+            "name": game["name"] + token,
+        } for game in games)
+
+    return scaled_items, scaled_games
+
+def configure(server, **attributes):
+    """
+    Replaces the data a running stub server replays.
+    """
+    for name, value in attributes.items():
+        setattr(server.RequestHandlerClass, name, value)
+
+def seed_inputs(storage, stage_name, items, platforms):
+    """
+    Writes the inputs a stage reads, so it can be timed without the stages before it.
+    """
+    if stage_name != "build_platforms":
+        storage.add_platforms(platforms)
+    if stage_name in ("update_dmc_catalog_data_incremental", "enrich_with_igdb"):
+        storage.upsert_changed("dmc-items", items)
+    if stage_name == "update_dmc_catalog_data_incremental":
+        storage.set_state("dmc-items", last_harvest="2000-01-01T00:00:00Z")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10], help="Fixture multipliers to run")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--isolate", action="store_true", help="Seed each stage's inputs and time it alone")
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated latency of every stub request in seconds")
+    parser.add_argument("--igdb-rate", type=float, default=4, help="IGDB requests per second, for client pacing and the stub's 429 limit")
+    parser.add_argument("--oai-rate", type=float, default=0, help="OAI-PMH server limit in requests per second, 0 for none")
+    parser.add_argument("--storage", choices=["mongodb", "sqlite"], default="mongodb", help="Storage backend the pipeline writes to")
+    args = parser.parse_args()
+
+    if args.storage == "mongodb" and not os.getenv("MONGODB_URI"):
+        sys.exit("Set MONGODB_URI to a local MongoDB, e.g. mongodb://localhost:27017")
+
+    platforms = load_fixture("Database/platforms.json")
+    stats = {}
+    catalog_server, catalog_url = start_stub_server(CatalogHandler, latency=args.latency, stats=stats)
+    oai_server, oai_url = start_stub_server(OAIHandler, latency=args.latency, rate_limit=args.oai_rate, stats=stats)
+    igdb_server, igdb_url = start_stub_server(
+        IGDBHandler, platforms=platforms, latency=args.latency, rate_limit=args.igdb_rate, stats=stats
+    )
+
+    # Configuration is read at import time, so point everything at the stubs and scratch locations first
+    scratch = tempfile.mkdtemp(prefix="games-api-benchmark-")
+    os.environ.update({
+        "MSU_CATALOG_URL": f"{catalog_url}/api/v1/search",
+        "MSU_OAI_URL": f"{oai_url}/OAI/Server",
+        "IGDB_BASE_URL": f"{igdb_url}/v4",
+        "TWITCH_TOKEN_URL": f"{igdb_url}/oauth2/token",
+        "MONGODB_DATABASE": "games-api-benchmark",
+        "IGDB_CACHE_PATH": os.path.join(scratch, "igdb-cache.sqlite"),
+        "IGDB_CACHE_BYPASS": "1",
+        "EMBEDDING_CACHE_DIR": os.path.join(scratch, "embeddings"),
+        "METRICS_DIR": "",
+        "EXPORT_DIR": os.path.join(scratch, "export"),
+    })
+
+    import lib.api_helpers
+    import lib.database_helpers
+    import lib.metrics
+    import main as pipeline
+    from lib.storage import MongoStorage, SQLiteStorage
+
+    lib.api_helpers.igdb_bucket.rate = args.igdb_rate
+    storages = []
+
+    def fresh_storage():
+        """
+        Returns an empty storage of the benchmarked backend.
+        """
+        if args.storage == "sqlite":
+            storage = SQLiteStorage(os.path.join(scratch, f"pipeline-{len(storages)}.sqlite"))
+        else:
+            storage = MongoStorage()
+            db = lib.database_helpers.get_db()
+            db.client.drop_database(db.name)
+        storage.ensure_indexes()
+        storages.append(storage)
+        return storage
+
+    stage_functions = {
+        "build_platforms": lambda: pipeline.build_platforms(storage=storage),
+        "update_dmc_catalog_data": lambda: pipeline.update_dmc_catalog_data(page_limit=math.ceil(len(items) / 100), storage=storage),
+        "update_dmc_catalog_data_incremental": lambda: pipeline.update_dmc_catalog_data_incremental(storage=storage),
+        "enrich_with_igdb": lambda: pipeline.enrich_with_igdb(storage=storage),
+    }
+
+    timings = {}
+    for scale in args.scale:
+        items, games = scaled_fixtures(scale)
+        configure(catalog_server, ids=[item["_id"] for item in items])
+        configure(oai_server, items={item["_id"]: item for item in items})
+        configure(igdb_server, games=games)
+
+        lib.metrics.metrics = lib.metrics.MetricsRegistry()
+        stats.clear()
+        storage = fresh_storage()
+
+        for stage_name in args.stages:
+            if args.isolate:
+                storage = fresh_storage()
+                seed_inputs(storage, stage_name, items, platforms)
+            stage_functions[stage_name]()
+
+        report = lib.metrics.metrics.report()
+        timings[scale] = {
+            stage_name: report["histograms"].get(f"stage_seconds{{stage={stage_name}}}", {}).get("sum")
+            for stage_name in args.stages
+        }
+        print(f"scale={scale}: {len(items)} items, {len(games)} IGDB games, stub traffic {dict(sorted(stats.items()))}")
+
+    # Time per catalog item should stay flat as the fixture grows, a rising ratio is superlinear
+    base = args.scale[0]
+    base_items = len(scaled_fixtures(base)[0])
+    print(f"\n{'stage':<38}" + "".join(f"{f'x{scale}':>12}" for scale in args.scale) + "   per-item growth")
+    for stage_name in args.stages:
+        seconds = [timings[scale][stage_name] for scale in args.scale]
+        row = "".join(f"{'n/a':>12}" if s is None else f"{s:11.2f}s" for s in seconds)
+
+        # A stage that recorded no timing (e.g. it was never entered) has no growth to report
+        if None in seconds or not seconds[0]:
+            print(f"{stage_name:<38}{row}   n/a")
+            continue
+        first = seconds[0] / base_items
+        last = seconds[-1] / (base_items * args.scale[-1] / base)
+        print(f"{stage_name:<38}{row}   x{last / first:.2f}")
+
+    if args.storage == "mongodb":
+        db = lib.database_helpers.get_db()
+        db.client.drop_database(db.name)
+    for server in (catalog_server, oai_server, igdb_server):
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Local stand-in HTTP servers for benchmarking the pipeline without network access.
+
+The servers replay the fixture data in Database/*.json so that timings reflect
+our own code plus a configurable amount of simulated network latency.
+
+Author: Amrit Srivastava
+"""
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+MARC_NS = "http://www.loc.gov/MARC21/slim"
+OAI_NS = "http://www.openarchives.org/OAI/2.0/"
+
+_stats_lock = threading.Lock()
+_index_lock = threading.Lock()
+
+def load_fixture(path):
+    """
+    Loads a JSON fixture from the Database directory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def marc21_record_xml(item):
+    """
+    Renders a dmc-items document back into a MARC21 slim record.
+
+    Only the tags read by the pipeline are produced (245, 246, 710, 250, 753, 099), 
+    plus the 'Video games' genre (655) incremental harvests filter on.
+    """
+    fields = [
+        ("655", ["Video games."]),
+        ("245", item.get("title", [])),
+        ("246", item.get("alternative_titles", [])),
+        ("710", item.get("authors", [])),
+        ("250", item.get("edition", [])),
+        ("753", item.get("platform", [])),
+        ("099", [item["callnumber"]] if item.get("callnumber") else []),
+    ]
+
+    datafields = []
+    for tag, values in fields:
+        for value in values:
+            datafields.append(
+                f'<datafield tag="{tag}" ind1=" " ind2=" ">'
+                f'<subfield code="a">{escape(value)}</subfield>'
+                f'</datafield>'
+            )
+
+    return f'<record xmlns="{MARC_NS}"><leader>00000cmm a2200000 i 4500</leader>{"".join(datafields)}</record>'
+
+def oai_header_xml(item, datestamp):
+    return f'<header><identifier>{escape(item["_id"])}</identifier><datestamp>{datestamp}</datestamp></header>'
+
+def oai_list_records_xml(items, token):
+    """
+    Wraps a page of MARC21 records in an OAI-PMH ListRecords response.
+
+    Args:
+        items (list): dmc-items documents on this page.
+        token (str): Resumption token of the next page, empty on the last page.
+    """
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    records = "".join(
+        f'<record>{oai_header_xml(item, now)}<metadata>{marc21_record_xml(item)}</metadata></record>'
+        for item in items
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<OAI-PMH xmlns="{OAI_NS}">'
+        f'<responseDate>{now}</responseDate>'
+        f'<ListRecords>{records}<resumptionToken>{token}</resumptionToken></ListRecords>'
+        f'</OAI-PMH>'
+    )
+
+def oai_get_record_xml(item):
+    """
+    Wraps a MARC21 record in an OAI-PMH GetRecord response.
+    """
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<OAI-PMH xmlns="{OAI_NS}">'
+        f'<responseDate>{time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}</responseDate>'
+        f'<GetRecord><record>'
+        f'<header><identifier>{escape(item["_id"])}</identifier></header>'
+        f'<metadata>{marc21_record_xml(item)}</metadata>'
+        f'</record></GetRecord>'
+        f'</OAI-PMH>'
+    )
+
+class StubRateLimiter:
+    """
+    Sliding one-second window admitting at most rate requests, like a server-side API limit.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.recent = deque()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] >= 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate:
+                return False
+            self.recent.append(now)
+            return True
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Base request handler that applies the configured latency before responding, 
+    and answers 429 once the configured rate limit is exceeded.
+    """
+    latency = 0.0
+    limiter = None  # StubRateLimiter, set through start_stub_server(rate_limit=...)
+    stats = None    # dict of counters, shared with the benchmark
+
+    def count(self, key):
+        if self.stats is not None:
+            with _stats_lock:
+                self.stats[key] = self.stats.get(key, 0) + 1
+
+    def throttled(self):
+        """
+        Sends a 429 and returns True if the request exceeds the rate limit.
+        """
+        if self.limiter is None or self.limiter.allow():
+            return False
+
+        self.count("throttled")
+        data = b'{"message": "Too Many Requests"}'
+        self.send_response(429)
+        self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return True
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def send_body(self, body, content_type="application/json", status=200):
+        if self.latency:
+            time.sleep(self.latency)
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class OAIHandler(StubHandler):
+    """
+    Serves OAI-PMH GetRecord and ListRecords requests for the items in the dmc-items fixture.
+
+    ListRecords reports every item as changed, list_page_size records per page.
+    """
+    items = {}
+    list_page_size = 100
+
+    def do_GET(self):
+        if self.throttled():
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        verb = params.get("verb", [""])[0]
+        identifier = params.get("identifier", [""])[0]
+        self.count("requests")
+
+        if verb == "GetRecord" and identifier in self.items:
+            self.send_body(oai_get_record_xml(self.items[identifier]), "text/xml; charset=utf-8")
+        elif verb == "ListRecords":
+            offset = int(params.get("resumptionToken", ["0"])[0])
+            items = list(self.items.values())[offset:offset + self.list_page_size]
+            token = str(offset + self.list_page_size) if offset + self.list_page_size < len(self.items) else ""
+            self.send_body(oai_list_records_xml(items, token), "text/xml; charset=utf-8")
+        else:
+            self.send_body(f'<OAI-PMH xmlns="{OAI_NS}"><error code="idDoesNotExist"/></OAI-PMH>', "text/xml; charset=utf-8")
+
+class CatalogHandler(StubHandler):
+    """
+    Serves the MSU catalog REST search, paging through the IDs of the dmc-items fixture.
+    """
+    ids = []
+
+    def do_GET(self):
+        if self.throttled():
+            return
+
+        params = parse_qs(urlparse(self.path).query)
+        page = int(params.get("page", ["1"])[0])
+        limit = int(params.get("limit", ["100"])[0])
+        self.count("requests")
+
+        ids = sorted(self.ids) if params.get("sort") == ["id asc"] else self.ids
+        records = [{"id": id} for id in ids[(page - 1) * limit:page * limit]]
+        self.send_body(json.dumps({"resultCount": len(self.ids), "records": records, "status": "OK"}))
+
+class IGDBHandler(StubHandler):
+    """
+    Serves the Twitch token endpoint and the IGDB /games, /multiquery and /platforms 
+    endpoints from the enriched-items and platforms fixtures.
+
+    Searches match fixture games sharing a word with the title, filtered by platform.
+    """
+    games = []
+    platforms = []
+    word_index = None    # word -> fixture positions, rebuilt whenever games is replaced
+    indexed_games = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        if self.throttled():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        self.count("requests")
+
+        if path.endswith("/oauth2/token"):
+            self.send_body(json.dumps({"access_token": "stub-token", "expires_in": 3600, "token_type": "bearer"}))
+        elif path.endswith("/multiquery"):
+            results = [
+                {"name": name, "result": self.search(query)}
+                for name, query in re.findall(r'query \w+ "([^"]*)" \{(.*?)\};', body, re.DOTALL)
+            ]
+            self.send_body(json.dumps(results))
+        elif path.endswith("/games"):
+            self.send_body(json.dumps(self.search(body)))
+        elif path.endswith("/platforms"):
+            self.send_body(json.dumps([{"id": p["_id"], **{k: v for k, v in p.items() if k != "_id"}} for p in self.platforms]))
+        else:
+            self.send_body(json.dumps({"message": "Not found"}), status=404)
+
+    def candidates(self, words):
+        """
+        Returns the games sharing a word with the search, in fixture order.
+        """
+        handler = type(self)
+        with _index_lock:
+            if handler.indexed_games is not handler.games:
+                index = {}
+                for position, game in enumerate(handler.games):
+                    for word in set(re.findall(r"\w{3,}", game["name"].lower())):
+                        index.setdefault(word, []).append(position)
+                handler.word_index, handler.indexed_games = index, handler.games
+
+        if not words:
+            return self.games
+        positions = sorted({position for word in words for position in self.word_index.get(word, [])})
+        return [self.games[position] for position in positions]
+
+    def search(self, query):
+        """
+        Evaluates the search, platform filter, ID cursor and limit of an IGDB game query.
+        """
+        self.count("searches")
+        search = re.search(r'search "((?:[^"\\]|\\.)*)"', query)
+        platform_filter = re.search(r'platforms = \(([^)]*)\)', query)
+        after_id = re.search(r'id > (\d+)', query)
+        limit = re.search(r'limit (\d+)', query)
+
+        words = set(re.findall(r"\w{3,}", search.group(1).lower())) if search else set()
+        platforms = {int(p) for p in platform_filter.group(1).split(",")} if platform_filter else None
+
+        results = []
+        for game in self.candidates(words):
+            if platforms is not None and not platforms & set(game.get("platforms", [])):
+                continue
+            if after_id and game["_id"] <= int(after_id.group(1)):
+                continue
+            results.append({
+                "id": game["_id"],
+                "name": game["name"],
+                "cover": game.get("cover", {}),
+                "first_release_date": game.get("release_date", 0),
+                "genres": game.get("genres", []),
+                "summary": game.get("summary", ""),
+                "game_type": game.get("game_type", 0),
+                "platforms": game.get("platforms", []),
+            })
+
+        if "sort id asc" in query:
+            results.sort(key=lambda game: game["id"])
+
+        return results[:int(limit.group(1))] if limit else results[:10]
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Threaded server with a listen backlog large enough for many concurrent clients.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+def start_stub_server(handler, **attributes):
+    """
+    Starts a handler on a free localhost port in a background thread.
+
+    Args:
+        handler (type): A StubHandler subclass.
+        **attributes: Class attributes to configure on a fresh subclass (e.g. latency, items), 
+            rate_limit (requests per second) enables 429 responses.
+
+    Returns:
+        tuple: (server, base_url); call server.shutdown() when done.
+    """
+    rate_limit = attributes.pop("rate_limit", None)
+    if rate_limit:
+        attributes["limiter"] = StubRateLimiter(rate_limit)
+    configured = type(handler.__name__, (handler,), attributes)
+    server = StubServer(("127.0.0.1", 0), configured)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
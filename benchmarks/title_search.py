@@ -0,0 +1,85 @@
+"""
+Benchmarks lexical title search latency as the number of indexed titles grows.
+
+Synthetic titles are composed from the words of the fixture catalog, queries
+are real catalog titles truncated or misspelled the way users type them.
+
+Usage:
+    python -m benchmarks.title_search --titles 10000 100000
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import random
+import re
+import time
+import numpy as np
+
+from benchmarks.stub_servers import load_fixture
+from lib.title_search import TitleSearchIndex, catalog_documents
+
+def synthetic_documents(count, rng):
+    """
+    Returns the fixture catalog padded with synthetic items up to count titles.
+    """
+    games = load_fixture("Database/enriched-items.json")
+    items = load_fixture("Database/dmc-items.json")
+    documents = list(catalog_documents(games, items))
+
+    words = sorted({word for _, _, titles in documents for title in titles for word in re.findall(r"\w+", title)})
+    indexed = sum(len(titles) for _, _, titles in documents)
+    for i in range(max(0, count - indexed)):
+        documents.append(("item", f"synthetic-{i}", [" ".join(rng.choices(words, k=rng.randint(2, 6)))]))
+
+    return documents
+
+def user_query(title, rng):
+    """
+    Turns a title into a partial or misspelled query.
+    """
+    title = title.lower()
+    kind = rng.random()
+    if kind < 0.4 and len(title) > 6:
+        # Prefix typed so far
+        return title[:rng.randint(4, len(title))]
+    if kind < 0.8 and len(title) > 3:
+        # One character dropped
+        i = rng.randrange(len(title))
+        return title[:i] + title[i + 1:]
+    # Two adjacent characters swapped
+    i = rng.randrange(max(1, len(title) - 1))
+    return title[:i] + title[i + 1:i + 2] + title[i:i + 1] + title[i + 2:]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--titles", type=int, nargs="+", default=[10000, 100000], help="Index sizes to test")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per index size")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sources = [title for _, _, titles in catalog_documents(load_fixture("Database/enriched-items.json"), []) for title in titles]
+    queries = [user_query(rng.choice(sources), rng) for _ in range(args.queries)]
+
+    for count in args.titles:
+        start = time.perf_counter()
+        index = TitleSearchIndex(synthetic_documents(count, random.Random(count)))
+        build_time = time.perf_counter() - start
+
+        latencies = []
+        found = 0
+        for query in queries:
+            start = time.perf_counter()
+            results = index.search(query)
+            latencies.append(time.perf_counter() - start)
+            found += bool(results)
+
+        latencies = np.array(latencies) * 1e6
+        print(
+            f"titles={len(index):>7}  build {build_time:6.2f}s  "
+            f"p50 {np.percentile(latencies, 50):7.1f} us  p99 {np.percentile(latencies, 99):7.1f} us  "
+            f"{found / len(queries):.0%} queries with results"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmarks unprocessed-item detection against a seeded local MongoDB.
+
+Seeds 'dmc-items' and 'enriched-items' in a throwaway database with a given
+share of items already linked, each with its enrichment record, then times
+the legacy unindexed $lookup on 'dmc_entries' against fetch_unprocessed_games,
+which reads the items flagged 'needs_enrichment' or matched by another matcher
+version through their indexes. A share of the linked items is given changed
+inputs (and the flag a harvest sets for them), those must be returned as well.
+The plan stages of the detection query are printed, they should be IXSCANs.
+The legacy join scans 'enriched-items' once per item, so it is only run up
+to --legacy-max items.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.unprocessed_detection --items 10000 100000
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import os
+import random
+import time
+
+# Never touch the real collections, configuration is read at import time
+os.environ["MONGODB_DATABASE"] = os.getenv("BENCHMARK_DATABASE", "games-api-benchmark")
+
+from lib.database_helpers import ensure_indexes, fetch_unprocessed_games, get_db
+
+MATCHER_VERSION = "benchmark"
+
+LEGACY_PIPELINE = [
+    {"$lookup": {"from": "enriched-items", "localField": "_id", "foreignField": "dmc_entries", "as": "link_check"}},
+    {"$match": {"link_check": {"$size": 0}}},
+    {"$project": {"link_check": 0}},
+]
+
+def seed(db, items, linked_share, changed_share, batch_size=5000):
+    """
+    Recreates both collections with synthetic items, linking linked_share of them 
+    to IGDB games and changing the inputs of changed_share of the linked ones.
+
+    Returns:
+        int: Number of items needing enrichment (unlinked or changed).
+    """
+    db["dmc-items"].drop()
+    db["enriched-items"].drop()
+
+    rng = random.Random(0)
+    ids = [f"bench-{i:07d}" for i in range(items)]
+    linked = set(rng.sample(ids, int(items * linked_share)))
+    changed = set(rng.sample(sorted(linked), int(len(linked) * changed_share)))
+
+    # Roughly two catalog copies per IGDB game, like the real collection
+    linked_ids = sorted(linked)
+    games = [linked_ids[i:i + 2] for i in range(0, len(linked_ids), 2)]
+    game_ids = {id: i for i, entries in enumerate(games) for id in entries}
+
+    def enrichment(id):
+        # Linked items carry the record of their match, changed ones a newer input hash and the harvest's flag
+        if id not in linked:
+            return {"input_hash": f"hash-{id}", "needs_enrichment": True}
+        return {
+            "input_hash": f"hash-{id}" + ("-changed" if id in changed else ""),
+            "needs_enrichment": id in changed,
+            "enrichment": {"input_hash": f"hash-{id}", "matcher_version": MATCHER_VERSION, "igdb_id": game_ids[id]},
+        }
+
+    for start in range(0, items, batch_size):
+        db["dmc-items"].insert_many([
+            {
+                "_id": id,
+                "title": f"Benchmark Game {id}",
+                "alternative_titles": [],
+                "platform_id_guess": [rng.randint(1, 200)],
+                "edition": None,
+                "authors": [],
+                "callnumber": None,
+                **enrichment(id),
+            }
+            for id in ids[start:start + batch_size]
+        ])
+
+    for start in range(0, len(games), batch_size):
+        db["enriched-items"].insert_many([
+            {
+                "_id": start + i,
+                "name": f"Benchmark Game {start + i}",
+                "dmc_entries": [{"folioid": id, "confidence": 0.9} for id in entries],
+            }
+            for i, entries in enumerate(games[start:start + batch_size])
+        ])
+
+    return items - len(linked) + len(changed)
+
+def plan_stages(plan):
+    """
+    Lists the stages of a query plan, innermost first.
+    """
+    stages = []
+    for key, value in plan.items():
+        if isinstance(value, dict):
+            stages.extend(plan_stages(value))
+        elif isinstance(value, list):
+            for child in value:
+                if isinstance(child, dict):
+                    stages.extend(plan_stages(child))
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    return stages
+
+def timed(fn):
+    """
+    Returns (elapsed seconds, number of documents) for draining a cursor.
+    """
+    start = time.perf_counter()
+    count = sum(1 for _ in fn())
+    return time.perf_counter() - start, count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000, 100000], help="Catalog sizes to seed")
+    parser.add_argument("--linked", type=float, default=0.8, help="Share of items already enriched")
+    parser.add_argument("--changed", type=float, default=0.05, help="Share of linked items whose inputs changed")
+    parser.add_argument("--legacy-max", type=int, default=10000, help="Largest size the legacy join is run on")
+    args = parser.parse_args()
+
+    db = get_db()
+    print(f"database {db.name}, {args.linked:.0%} of items linked")
+
+    for items in args.items:
+        expected = seed(db, items, args.linked, args.changed)
+
+        if items <= args.legacy_max:
+            # Entries are subdocuments, so the legacy join matches nothing and returns every item
+            legacy_time, legacy_count = timed(lambda: db["dmc-items"].aggregate(LEGACY_PIPELINE))
+            print(f"items={items:>7}  legacy   {legacy_time:8.2f}s  {legacy_count:>7} returned")
+        else:
+            legacy_time = None
+            print(f"items={items:>7}  legacy   skipped (above --legacy-max)")
+
+        ensure_indexes()
+        records_time, records_count = timed(lambda: fetch_unprocessed_games(MATCHER_VERSION))
+        assert records_count == expected, f"Expected {expected} unprocessed items, got {records_count}"
+
+        speedup = f"  speedup x{legacy_time / records_time:.1f}" if legacy_time else ""
+        print(f"items={items:>7}  records  {records_time:8.2f}s  {records_count:>7} returned{speedup}")
+
+        winning_plan = fetch_unprocessed_games(MATCHER_VERSION).explain()["queryPlanner"]["winningPlan"]
+        print(f"items={items:>7}  plan     {' -> '.join(plan_stages(winning_plan))}")
+
+    db.client.drop_database(db.name)
+
+if __name__ == "__main__":
+    main()
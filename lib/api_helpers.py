@@ -8,13 +8,19 @@ University library catalog.
 Author: Amrit Srivastava
 """
 
+import asyncio
 import os
+import random
 import requests
+import threading
 import time
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from collections import defaultdict
-import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
+from lib.marc import OAIStream, parse_marc21_record
+from lib.metrics import increment, observe, timer
+from lib.response_cache import get_response_cache
 
 # Load environment variables
 load_dotenv()
@@ -22,82 +28,241 @@ CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 
 # IGDB API Configuration
-IGDB_URL = "https://api.igdb.com/v4/games"
-IGDB_GAMES_ENDPOINT = "https://api.igdb.com/v4/platforms" 
+IGDB_BASE_URL = os.getenv("IGDB_BASE_URL", "https://api.igdb.com/v4")
+IGDB_URL = f"{IGDB_BASE_URL}/games"
+IGDB_GAMES_ENDPOINT = f"{IGDB_BASE_URL}/platforms"
+IGDB_MULTIQUERY_URL = f"{IGDB_BASE_URL}/multiquery"
+MULTIQUERY_LIMIT = 10   # Max named queries IGDB accepts per multiquery request
+
+# Fields requested by every game query, and the filter excluding specific game types (DLC=1, Mod=5, etc.) 
+# and statuses (Alpha=2, etc.), see https://api-docs.igdb.com/#game-enums
+IGDB_GAME_FIELDS = "id, name, summary, first_release_date, category, platforms, status, game_type, rating, cover.image_id, genres.name"
+IGDB_GAME_CONDITIONS = "game_type != (1, 5, 12, 14) & (status != (2,3,6) | status = null)"
 
 # Rate Limiting Configuration
-REQUEST_LIMIT = 4       # Max requests allowed per window
-REQUEST_WINDOW = 1.0    # Window duration in seconds
-request_times = deque() # History of request timestamps
+REQUEST_LIMIT = 4       # Max requests allowed per second
+REQUEST_BURST = 1       # Requests that may be sent back to back before pacing applies
+IGDB_MAX_CONCURRENCY = int(os.getenv("IGDB_MAX_CONCURRENCY", 8))  # IGDB allows 8 open requests
+IGDB_MAX_RETRIES = int(os.getenv("IGDB_MAX_RETRIES", 5))          # Retries on 429 and 5xx responses
+RETRY_BACKOFF = 0.5     # Base delay in seconds, doubled after every failed attempt
+
+# MSU Library Catalog Configuration
+MSU_CATALOG_URL = os.getenv("MSU_CATALOG_URL", "https://catalog.lib.msu.edu/api/v1/search")
+MSU_CATALOG_SORT = os.getenv("MSU_CATALOG_SORT", "id asc")  # Stable order, so crawls resume after the last ID
+MSU_OAI_URL = os.getenv("MSU_OAI_URL", "https://catalog.lib.msu.edu/OAI/Server")
+
+# OAI-PMH Concurrency Configuration
+OAI_WORKERS = int(os.getenv("OAI_WORKERS", 8))        # Threads fetching and parsing records
+OAI_HOST_LIMIT = int(os.getenv("OAI_HOST_LIMIT", 4))  # Max in-flight requests per host
+
+_host_slots = defaultdict(lambda: threading.BoundedSemaphore(OAI_HOST_LIMIT))
+_host_slots_lock = threading.Lock()
+_thread_local = threading.local()
+
+# Twitch OAuth2 Configuration, the token is requested on first use and cached until it expires
+TWITCH_TOKEN_URL = os.getenv("TWITCH_TOKEN_URL", "https://id.twitch.tv/oauth2/token")
+TOKEN_EXPIRY_MARGIN = 60  # Seconds before expiry at which the token is renewed
+
+_access_token = {"value": None, "expires_at": 0.0}
+_access_token_lock = threading.Lock()
 
-def get_access_token():
+def get_access_token(rejected_token=None):
     """
     Retrieves an OAuth2 access token from Twitch for IGDB API authentication.
 
+    The token is cached and only renewed when it is about to expire, or when 
+    the API rejected it (several callers may report the same rejected token, 
+    it is renewed once).
+
+    Args:
+        rejected_token (str): A token the API answered with 401 Unauthorized.
+
     Returns:
         str: Valid access token for IGDB API calls.
     """
-    url = "https://id.twitch.tv/oauth2/token"
-    payload = {
-        "client_id": CLIENT_ID,
-        "client_secret": CLIENT_SECRET,
-        "grant_type": "client_credentials"
-    }
-    response = requests.post(url, data=payload)
-    response.raise_for_status()
-    return response.json()["access_token"]
+    with _access_token_lock:
+        expired = time.time() >= _access_token["expires_at"] - TOKEN_EXPIRY_MARGIN
+        rejected = rejected_token is not None and rejected_token == _access_token["value"]
+
+        if _access_token["value"] is None or expired or rejected:
+            payload = {
+                "client_id": CLIENT_ID,
+                "client_secret": CLIENT_SECRET,
+                "grant_type": "client_credentials"
+            }
+            response = requests.post(TWITCH_TOKEN_URL, data=payload)
+            response.raise_for_status()
+            data = response.json()
+
+            _access_token["value"] = data["access_token"]
+            _access_token["expires_at"] = time.time() + data.get("expires_in", 0)
+
+        return _access_token["value"]
+
+class TokenBucket:
+    """
+    Thread-safe token bucket pacing requests to a sustained rate.
 
-# Initialize global access token
-ACCESS_TOKEN = get_access_token()
+    Each caller reserves a token up front and then waits until it is due, so 
+    concurrent callers are spaced out evenly instead of bursting and backing off.
+    Usable from threads (acquire) and from asyncio (acquire_async).
+    """
+    def __init__(self, rate, capacity=1):
+        """
+        Args:
+            rate (float): Tokens added per second.
+            capacity (int): Maximum tokens that can accumulate while idle.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns how many seconds the caller must wait before using it.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        """
+        Blocks the calling thread until a token is available.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        self.record(wait)
+        return wait
+
+    async def acquire_async(self):
+        """
+        Suspends the calling coroutine until a token is available.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        self.record(wait)
+        return wait
+
+    def record(self, wait):
+        observe("rate_limit_wait_seconds", wait)
+        increment("rate_limit_wait_seconds_total", wait)
+
+# Shared by every IGDB caller in the process, sync and async alike
+igdb_bucket = TokenBucket(REQUEST_LIMIT, REQUEST_BURST)
 
 def rate_limit():
     """
-    Implements a sliding window rate limiter to prevent API 429 errors.
-    Should be called immediately before or after every API request.
-    """ 
-    now = time.time()
-    request_times.append(now)
-    
-    # Remove timestamps older than the current window
-    while request_times and request_times[0] < now - REQUEST_WINDOW:
-        request_times.popleft()
+    Paces IGDB requests to stay within the API rate limit and prevent 429 errors.
+    Should be called immediately before every API request.
+    """
+    igdb_bucket.acquire()
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Returns how long to wait before retrying a failed request.
+
+    Honors the server's Retry-After header when present, otherwise backs off 
+    exponentially with jitter.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting at 0.
+        retry_after (str): Value of the Retry-After response header.
+    """
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+
+def is_retryable(status_code):
+    """
+    Returns True for responses worth retrying (rate limited or server errors).
+    """
+    return status_code == 429 or status_code >= 500
 
-    # If limit reached, sleep for the remainder of the window
-    if len(request_times) >= REQUEST_LIMIT:
-        sleep_time = REQUEST_WINDOW - (now - request_times[0])
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+def endpoint_name(endpoint):
+    """
+    Returns the last path segment of an endpoint URL (e.g. 'games'), used to label metrics.
+    """
+    return endpoint.rstrip("/").rsplit("/", 1)[-1]
 
-def query_igdb_endpoint(endpoint, query):
+def query_igdb_endpoint(endpoint, query, use_cache=True):
     """
     Executes a POST request to a specific IGDB endpoint.
 
+    Responses are served from and stored in the persistent response cache 
+    unless use_cache is False.
+
     Args:
         endpoint (str): The IGDB API endpoint URL.
         query (str): The query string in IGDB's wrapper syntax.
+        use_cache (bool): Whether to use the response cache for this call.
 
     Returns:
         list/dict: Parsed JSON response from the API.
     """
-    IGDB_HEADERS = {
-        "Client-ID": CLIENT_ID,
-        "Authorization": f"Bearer {ACCESS_TOKEN}"
-    }
-
-    rate_limit()
-
-    response = requests.post(endpoint, headers=IGDB_HEADERS, data=query)
+    if use_cache:
+        hit, cached = get_response_cache().get(endpoint, query)
+        if hit:
+            return cached
+
+    access_token = get_access_token()
+    renewed = False
+
+    for attempt in range(IGDB_MAX_RETRIES + 1):
+        IGDB_HEADERS = {
+            "Client-ID": CLIENT_ID,
+            "Authorization": f"Bearer {access_token}"
+        }
+
+        rate_limit()
+
+        with timer("igdb_request_seconds", endpoint=endpoint_name(endpoint)):
+            response = _http_session().post(endpoint, headers=IGDB_HEADERS, data=query)
+        increment("igdb_requests_total", endpoint=endpoint_name(endpoint), status=response.status_code)
+
+        # Tokens can be revoked or expire mid-run, renew once and retry
+        if response.status_code == 401 and not renewed:
+            access_token = get_access_token(rejected_token=access_token)
+            renewed = True
+            continue
+
+        # Rate limited or server trouble, back off and try again
+        if is_retryable(response.status_code) and attempt < IGDB_MAX_RETRIES:
+            time.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
+            continue
+
+        break
     
     # If query fails we shouldn't silently fail
     try:
         response.raise_for_status()
     except Exception as e:
+        increment("igdb_errors_total", endpoint=endpoint_name(endpoint))
         print(f"Error querying {endpoint}")
         print(f"Query: {query}")
         print(e)
-        exit(1)
-        
-    return response.json()
+        raise
+
+    result = response.json()
+    if use_cache:
+        get_response_cache().set(endpoint, query, result)
+
+    return result
 
 def build_igdb_search_game_query(title, platforms):
     """
@@ -115,7 +280,7 @@ def build_igdb_search_game_query(title, platforms):
         str: Formatted IGDB query string.
     """
     base_query = """
-        fields id, name, summary, first_release_date, category, platforms, status, game_type, rating, cover.image_id, genres.name;
+        fields {fields};
         search "{title}";
         where {conditions};
         limit 100;
@@ -124,38 +289,108 @@ def build_igdb_search_game_query(title, platforms):
     # Filter by specific platforms if provided, otherwise search all
     platform_filter = f"platforms = ({', '.join(map(str, platforms))}) & " if platforms != {-1} else ""
     
-    # Logic to exclude specific game types (DLC=1, Mod=5, etc.) and statuses (Alpha=2, etc.)
-    # https://api-docs.igdb.com/#game-enums
-    conditions = f"{platform_filter} game_type != (1, 5, 12, 14) & (status != (2,3,6) | status = null)"
+    conditions = f"{platform_filter} {IGDB_GAME_CONDITIONS}"
     
-    return base_query.format(title=title, conditions=conditions)
+    # Quotes inside the title would otherwise terminate the search string
+    title = title.replace('\\', '\\\\').replace('"', '\\"')
+
+    return base_query.format(fields=IGDB_GAME_FIELDS, title=title, conditions=conditions)
+
+def chunked(items, size):
+    """
+    Splits a sequence or iterable into lists of at most size items.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def build_igdb_multiquery(queries, endpoint="games"):
+    """
+    Packs several queries for the same endpoint into one multiquery body.
 
-def msu_catalog_api(page, limit=100):
+    Args:
+        queries (list): Query strings in IGDB's wrapper syntax (at most MULTIQUERY_LIMIT).
+        endpoint (str): Name of the IGDB endpoint the queries target.
+
+    Returns:
+        str: Multiquery body where query i is named "i".
+    """
+    return "\n".join(f'query {endpoint} "{i}" {{{query}}};' for i, query in enumerate(queries))
+
+def split_cached_searches(queries):
+    """
+    Separates search queries answered by the response cache from those still to send.
+
+    Returns:
+        tuple: (results, pending) where results maps cached queries to their 
+            results and pending lists the distinct queries that missed.
+    """
+    cache = get_response_cache()
+    results = {}
+    pending = []
+
+    for query in dict.fromkeys(queries):
+        hit, cached = cache.get(IGDB_URL, query)
+        if hit:
+            results[query] = cached
+        else:
+            pending.append(query)
+
+    return results, pending
+
+def store_multiquery_results(batch, response):
+    """
+    Maps a multiquery response back to its queries and caches each result.
+
+    Args:
+        batch (list): Queries in the order they were packed by build_igdb_multiquery.
+        response (list): Parsed /multiquery response.
+
+    Returns:
+        dict: Results keyed by query.
+    """
+    batch_results = {batch[int(named_result["name"])]: named_result.get("result", []) for named_result in response}
+
+    # Queries missing from the response are stored as empty results too
+    batch_results = {query: batch_results.get(query, []) for query in batch}
+    get_response_cache().set_many(IGDB_URL, batch_results.items())
+    return batch_results
+
+def msu_catalog_api(page, limit=100, sort=MSU_CATALOG_SORT):
     """
     Queries the MSU Library REST API for items tagged as video games.
 
     Args:
         page (int): Result page number for pagination.
         limit (int): Number of records per page (max 100).
+        sort (str): Result order. Relevance ranks shift as the index changes, 
+            sorting by ID keeps every record at a predictable position.
 
     Returns:
         dict: JSON response containing library records.
     """
-    catalog_api_url = "https://catalog.lib.msu.edu/api/v1/search"
-    
+    catalog_api_url = MSU_CATALOG_URL
+
     params = {
         "lookfor": "genre:video+games",
         "type": "AllFields",
         "field[]": ["edition", "authors", "title", "id"],
         "limit": limit,
         "page": page,
-        "sort": "relevance",
+        "sort": sort,
         "prettyPrint": "false",
         "lng": "en"
     }
 
     headers = {"accept": "application/json"}
-    response = requests.get(catalog_api_url, params=params, headers=headers)
+    with timer("catalog_request_seconds"):
+        response = requests.get(catalog_api_url, params=params, headers=headers)
+    increment("catalog_requests_total", status=response.status_code)
     
     if response.status_code != 200:
         print(f"MSU Catalog API error: {response.status_code}")
@@ -163,6 +398,27 @@ def msu_catalog_api(page, limit=100):
 
     return response.json()
 
+def _http_session():
+    """
+    Returns a requests Session owned by the calling thread.
+
+    Sessions keep connections alive between calls but are not safe to share 
+    across threads, so each worker gets its own.
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+def _host_slot(url):
+    """
+    Returns the semaphore limiting concurrent requests to the host of a URL.
+    """
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        return _host_slots[host]
+
 def msu_oai_metadata_api(id):
     """
     Fetches and parses granular MARC21 metadata from the MSU OAI-PMH server.
@@ -173,40 +429,79 @@ def msu_oai_metadata_api(id):
     Returns:
         dict: Extracted metadata including titles, authors, and call numbers.
     """
-    url = f"https://catalog.lib.msu.edu/OAI/Server?verb=GetRecord&identifier={id}&metadataPrefix=marc21"
-    response = requests.get(url)
-    xml_data = response.text
+    url = f"{MSU_OAI_URL}?verb=GetRecord&identifier={id}&metadataPrefix=marc21"
 
-    # XML Parsing Logic
-    root = ET.fromstring(xml_data)
-    ns = {
-        'oai': 'http://www.openarchives.org/OAI/2.0/',
-        'marc': 'http://www.loc.gov/MARC21/slim'
-    }
+    # Stay polite to the catalog server regardless of how many workers are running
+    with _host_slot(url):
+        with timer("oai_request_seconds", verb="GetRecord"):
+            response = _http_session().get(url)
+    increment("oai_requests_total", verb="GetRecord", status=response.status_code)
 
-    # Locate MARC record within the OAI wrapper
-    record_elem = root.find('.//oai:GetRecord/oai:record/marc:record', ns)
-    if record_elem is None:
-        record_elem = root.find('.//{http://www.loc.gov/MARC21/slim}record')
-
-    if record_elem is None:
-        raise ValueError(f"MARC record not found for ID: {id}")
-
-    # Map MARC tags to subfield values
-    datafields_by_tag = defaultdict(list)
-    for df in record_elem.findall('{http://www.loc.gov/MARC21/slim}datafield'):
-        tag = df.get('tag')
-        subfields = {sf.get('code'): sf.text for sf in df.findall('{http://www.loc.gov/MARC21/slim}subfield')}
-        datafields_by_tag[tag].append(subfields)
-
-    #  Field Extraction Mapping 
-    results = {
-        "title": [item['a'] for item in datafields_by_tag.get("245", [])],
-        "alternative_titles": [item['a'] for item in datafields_by_tag.get("246", [])],
-        "authors": [item['a'] for item in datafields_by_tag.get("710", []) if 'a' in item],
-        "edition": [item['a'] for item in datafields_by_tag.get("250", []) if 'a' in item],
-        "platform": [item['a'] for item in datafields_by_tag.get("753", []) if 'a' in item],
-        "callnumber": datafields_by_tag.get("099", [])[0]['a'] if datafields_by_tag.get("099") else ''
-    }
+    return parse_marc21_record(response.content, id)
+
+def msu_oai_metadata_many(ids, workers=OAI_WORKERS):
+    """
+    Fetches and parses MARC21 metadata for many records concurrently.
+
+    Requests are spread over a thread pool while the per-host limit bounds how 
+    many are in flight against the catalog server at once. 
+
+    Args:
+        ids (list): Catalog record identifiers.
+        workers (int): Number of worker threads, 1 fetches serially.
+
+    Returns:
+        list: Metadata dicts in the same order as ids.
+    """
+    if workers <= 1 or len(ids) <= 1:
+        return [msu_oai_metadata_api(id) for id in ids]
+
+    # Executor.map yields results in submission order, keeping output deterministic
+    with ThreadPoolExecutor(max_workers=min(workers, len(ids))) as executor:
+        return list(executor.map(msu_oai_metadata_api, ids))
+
+def msu_oai_list_records(from_date=None, until=None):
+    """
+    Harvests MARC21 records changed within a datestamp range via OAI-PMH ListRecords.
+
+    Follows resumption tokens until the server reports the list is complete. 
+    The server lists every changed record, so each one is flagged with whether 
+    it carries the 'video games' genre (MARC 655) used by the catalog search.
+
+    Args:
+        from_date (str): Lower datestamp bound (inclusive), e.g. '2026-01-31'.
+        until (str): Upper datestamp bound (inclusive).
+
+    Yields:
+        tuple: (response_date, records) for each page of the list, where records 
+            is a list of dicts with 'id', 'datestamp', 'deleted', 'is_game' and 'metadata'.
+    """
+    params = {"verb": "ListRecords", "metadataPrefix": "marc21"}
+    if from_date:
+        params["from"] = from_date
+    if until:
+        params["until"] = until
+
+    while params:
+        with _host_slot(MSU_OAI_URL):
+            with timer("oai_request_seconds", verb="ListRecords"):
+                response = _http_session().get(MSU_OAI_URL, params=params)
+        increment("oai_requests_total", verb="ListRecords", status=response.status_code)
+        response.raise_for_status()
+
+        # Records are streamed out of the page instead of building the whole tree
+        stream = OAIStream(response.content)
+        records = list(stream)
+
+        # An empty range is reported as an error rather than an empty list
+        if stream.error is not None:
+            code, message = stream.error
+            if code == 'noRecordsMatch':
+                return
+            raise ValueError(f"OAI-PMH error {code}: {message}")
+
+        yield stream.response_date, records
 
-    return results
+        # Continue with the resumption token until the list is exhausted
+        token = stream.resumption_token
+        params = {"verb": "ListRecords", "resumptionToken": token} if token else None
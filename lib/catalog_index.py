@@ -0,0 +1,188 @@
+"""
+Immutable in-memory snapshot of the catalog used by the read API.
+
+'enriched-items' and 'dmc-items' are loaded once, every document is serialized
+to JSON up front and secondary indexes (genre, platform, release year, folio
+ID) are precomputed as sorted position arrays, so requests only intersect
+arrays and join pre-encoded bytes, and titles go into a trigram search index.
+A new snapshot is built on reload and swapped in whole, so readers never see
+a partially loaded catalog.
+
+Author: Amrit Srivastava
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+import numpy as np
+from lib.database_helpers import get_db, get_harvest_state
+from lib.title_search import TitleSearchIndex, catalog_documents
+
+def entry_folioid(entry):
+    """
+    Returns the folio ID of a 'dmc_entries' element, which older records store as a bare string.
+    """
+    return entry if isinstance(entry, str) else entry.get("folioid")
+
+def release_year(game):
+    """
+    Returns the UTC release year of an enriched game, or None if unknown.
+    """
+    timestamp = game.get("release_date")
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).year
+
+def encode(document):
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class CatalogIndex:
+    """
+    Read-only view of the enriched catalog with secondary indexes.
+    """
+    def __init__(self, enriched_items, dmc_items, marker=None):
+        """
+        Args:
+            enriched_items (list): Documents from 'enriched-items'.
+            dmc_items (list): Documents from 'dmc-items'.
+            marker (str): Enrichment run the documents were loaded after, used to detect reloads.
+        """
+        self.marker = marker
+        self.games = sorted(enriched_items, key=lambda game: game["_id"])
+        self.game_json = [encode(game) for game in self.games]
+        self.game_positions = {game["_id"]: i for i, game in enumerate(self.games)}
+
+        # Folio ID -> (encoded item, position of the linked game or None)
+        linked = {
+            entry_folioid(entry): i
+            for i, game in enumerate(self.games)
+            for entry in game.get("dmc_entries", [])
+        }
+        self.items = {item["_id"]: (encode(item), linked.get(item["_id"])) for item in dmc_items}
+
+        # Secondary indexes: value -> sorted positions in self.games
+        genres, platforms, years = {}, {}, {}
+        for i, game in enumerate(self.games):
+            for genre in game.get("genres", []):
+                # Genres can be filtered on by ID or by case-insensitive name
+                for key in {str(genre.get("id")), str(genre.get("name", "")).lower()}:
+                    genres.setdefault(key, []).append(i)
+            for platform in game.get("platforms", []):
+                platforms.setdefault(str(platform), []).append(i)
+            year = release_year(game)
+            if year:
+                years.setdefault(str(year), []).append(i)
+
+        self.indexes = {
+            name: {key: np.unique(positions) for key, positions in index.items()}
+            for name, index in (("genre", genres), ("platform", platforms), ("year", years))
+        }
+        self.all_positions = np.arange(len(self.games))
+        self.search_index = TitleSearchIndex(catalog_documents(self.games, dmc_items))
+
+        # Responses only depend on the snapshot and the URL, so the snapshot hash is a valid ETag
+        digest = hashlib.sha1()
+        for encoded in self.game_json:
+            digest.update(encoded)
+        for folioid in sorted(self.items):
+            digest.update(self.items[folioid][0])
+        self.etag = f'"{digest.hexdigest()[:16]}"'
+
+    def __len__(self):
+        return len(self.games)
+
+    def game(self, igdb_id):
+        """
+        Returns the encoded enriched game with this IGDB ID, or None.
+        """
+        position = self.game_positions.get(igdb_id)
+        return None if position is None else self.game_json[position]
+
+    def item(self, folioid):
+        """
+        Returns the encoded catalog item with its linked game, or None.
+        """
+        if folioid not in self.items:
+            return None
+
+        encoded, position = self.items[folioid]
+        game = self.game_json[position] if position is not None else b"null"
+        return b'{"item":' + encoded + b',"game":' + game + b"}"
+
+    def filter(self, **filters):
+        """
+        Returns the positions of games matching every filter.
+
+        Args:
+            **filters: Index name ('genre', 'platform', 'year') -> value; None values are ignored.
+
+        Returns:
+            np.ndarray: Sorted game positions.
+        """
+        positions = self.all_positions
+        # Intersect the smallest posting lists first
+        postings = sorted(
+            (self.indexes[name].get(str(value).lower(), self.all_positions[:0]) for name, value in filters.items() if value is not None),
+            key=len
+        )
+        for posting in postings:
+            positions = posting if positions is self.all_positions else np.intersect1d(positions, posting, assume_unique=True)
+            if not len(positions):
+                break
+        return positions
+
+    def page(self, offset=0, limit=50, **filters):
+        """
+        Returns one page of the filtered game list.
+
+        Returns:
+            bytes: JSON object with 'total', 'offset', 'limit' and 'items'.
+        """
+        positions = self.filter(**filters)
+        selected = positions[offset:offset + limit]
+        head = f'{{"total":{len(positions)},"offset":{offset},"limit":{limit},"items":['.encode("utf-8")
+        return head + b",".join(self.game_json[i] for i in selected) + b"]}"
+
+    def search(self, query, limit, matcher=None):
+        """
+        Searches game and item titles, optionally re-ranking with semantic similarity.
+
+        Args:
+            query (str): Partial or misspelled title.
+            limit (int): Maximum number of results.
+            matcher (EmbeddingMatcher): If given, results are re-ranked with its embeddings.
+
+        Returns:
+            bytes: JSON object with the query and its ranked results.
+        """
+        results = self.search_index.search(query, limit=limit)
+        if matcher is not None:
+            results = self.search_index.rerank(query, results, matcher)
+
+        return encode({
+            "query": query,
+            "results": [
+                {"score": round(score, 4), "type": kind, "id": id, "title": title}
+                for score, kind, id, title in results
+            ]
+        })
+
+def enrichment_marker():
+    """
+    Returns the marker written when an enrichment run finishes, or None.
+    """
+    return get_harvest_state("enriched-items").get("last_enriched")
+
+def load_catalog_index():
+    """
+    Builds a catalog snapshot from MongoDB.
+
+    Returns:
+        CatalogIndex: The loaded snapshot.
+    """
+    # Read the marker first so a run finishing mid-load triggers another reload
+    marker = enrichment_marker()
+    db = get_db()
+    # Enrichment bookkeeping stays internal
+    dmc_items = db["dmc-items"].find({}, {"input_hash": 0, "enrichment": 0})
+    return CatalogIndex(list(db["enriched-items"].find({})), list(dmc_items), marker=marker)
@@ -8,18 +8,39 @@ Author: Amrit Srivastava
 """
 
 from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
 import json
 import os
+import threading
 import pymongo
 from lib.api_helpers import IGDB_GAMES_ENDPOINT, query_igdb_endpoint
+from lib.metrics import SIZE_BUCKETS, observe, stage, timer
+from lib.response_cache import NEGATIVE_TTL
 
-# Load environment variables and initialize MongoDB connection
+# Load environment variables, the MongoDB connection is opened on first use
 load_dotenv()
 CONNECTION_STRING = os.getenv("MONGODB_URI")
+DATABASE_NAME = os.getenv("MONGODB_DATABASE", "enriched-game-data")
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 500))  # Documents per bulk write
 
-client = pymongo.MongoClient(CONNECTION_STRING)
-db = client["enriched-game-data"]
-platform_db = db["platform-data"]
+_client = None
+_client_lock = threading.Lock()
+
+def get_db():
+    """
+    Returns the application database, creating the MongoDB client on first call.
+
+    The client is shared by the whole process (pymongo clients are thread-safe 
+    and pool their connections).
+
+    Returns:
+        Database: The 'enriched-game-data' database.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = pymongo.MongoClient(CONNECTION_STRING)
+    return _client[DATABASE_NAME]
 
 def platforms_in_db():
     """
@@ -28,15 +49,176 @@ def platforms_in_db():
     Returns:
         list: A list of all documents in the platform collection.
     """
-    return list(platform_db.find({})) 
+    return list(get_db()["platform-data"].find({}))
 
-def build_platforms(debug=False):
+def get_harvest_state(key):
     """
-    Fetches platform metadata from IGDB and upserts it into the database.
+    Retrieves the stored state of a harvest (e.g. the last successful datestamp).
+
+    Args:
+        key (str): Name of the harvest, typically the target collection.
+
+    Returns:
+        dict: The state document, or an empty dict if the harvest never ran.
+    """
+    return get_db()["harvest-state"].find_one({"_id": key}) or {}
+
+def set_harvest_state(key, **fields):
+    """
+    Records fields on the state document of a harvest.
+
+    Args:
+        key (str): Name of the harvest, typically the target collection.
+        **fields: Values to set on the state document.
+    """
+    get_db()["harvest-state"].update_one({"_id": key}, {"$set": fields}, upsert=True)
+
+def upsert_changed(collection, documents):
+    """
+    Upserts only the documents whose content differs from what is stored.
+
+    Existing documents are loaded in a single query and compared in memory, 
+    so unchanged records cost no writes. Only the fields present in the new 
+    documents are compared and set, fields added by later stages (e.g. the 
+    enrichment record of 'dmc-items') are kept. Documents whose 'input_hash' 
+    is new or changed are flagged 'needs_enrichment'.
+
+    Args:
+        collection (Collection): Target MongoDB collection.
+        documents (list): Full documents keyed by '_id'.
+
+    Returns:
+        tuple: (inserted, updated, unchanged) document counts.
+    """
+    if not documents:
+        return 0, 0, 0
+
+    ids = [doc["_id"] for doc in documents]
+    existing = {doc["_id"]: doc for doc in collection.find({"_id": {"$in": ids}})}
+
+    def changed(doc):
+        stored = existing.get(doc["_id"], {})
+        return any(key not in stored or stored[key] != value for key, value in doc.items())
+
+    def update(doc):
+        fields = {k: v for k, v in doc.items() if k != "_id"}
+        if "input_hash" in doc and existing.get(doc["_id"], {}).get("input_hash") != doc["input_hash"]:
+            fields["needs_enrichment"] = True
+        return {"$set": fields}
+
+    operations = [
+        pymongo.UpdateOne({"_id": doc["_id"]}, update(doc), upsert=True)
+        for doc in documents if changed(doc)
+    ]
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    inserted = sum(1 for doc in documents if doc["_id"] not in existing)
+    updated = len(operations) - inserted
+    return inserted, updated, len(documents) - len(operations)
+
+class BulkWriter:
+    """
+    Buffers documents and upserts them in fixed-size batches as they arrive.
+
+    Keeps memory bounded for long pipelines and ensures completed batches are 
+    persisted even if a later stage fails.
+    """
+    def __init__(self, storage, collection, batch_size=WRITE_BATCH_SIZE, on_flush=None):
+        """
+        Args:
+            storage (Storage): Backend the documents are written to (see lib.storage).
+            collection (str): Name of the target collection.
+            batch_size (int): Number of buffered documents that triggers a flush.
+            on_flush (callable): Called with no arguments after each successful flush.
+        """
+        self.storage = storage
+        self.collection = collection
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.buffer = []
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def add(self, documents):
+        """
+        Buffers documents, flushing every time the batch size is reached.
+        """
+        for doc in documents:
+            self.buffer.append(doc)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered documents, skipping those that did not change.
+        """
+        if self.buffer:
+            observe(f"{self.storage.name}_write_batch_size", len(self.buffer), SIZE_BUCKETS, collection=self.collection)
+            with timer(f"{self.storage.name}_write_seconds", collection=self.collection):
+                inserted, updated, unchanged = self.storage.upsert_changed(self.collection, self.buffer)
+            self.inserted += inserted
+            self.updated += updated
+            self.unchanged += unchanged
+            self.buffer = []
+
+        if self.on_flush:
+            self.on_flush()
+
+class BulkOperationWriter:
+    """
+    Buffers write operations and sends them in periodic bulk writes.
+
+    The run costs one round trip per batch instead of one per document, and 
+    every flushed batch is persisted even if the run fails later on.
+    """
+    def __init__(self, collection, batch_size=WRITE_BATCH_SIZE, ordered=False):
+        """
+        Args:
+            collection (Collection): Target MongoDB collection.
+            batch_size (int): Number of buffered operations that triggers a flush.
+            ordered (bool): If True, operations run in the order they were added 
+                (and stop at the first error), otherwise the server may reorder them.
+        """
+        self.collection = collection
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.operations = []
+        self.upserted = 0
+        self.modified = 0
+
+    def add(self, operation):
+        """
+        Buffers a pymongo write operation, flushing when the batch size is reached.
+        """
+        self.operations.append(operation)
+        if len(self.operations) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the buffered operations in one bulk write.
+        """
+        if not self.operations:
+            return
+
+        observe("mongo_write_batch_size", len(self.operations), SIZE_BUCKETS, collection=self.collection.name)
+        with timer("mongo_write_seconds", collection=self.collection.name):
+            result = self.collection.bulk_write(self.operations, ordered=self.ordered)
+        self.upserted += result.upserted_count
+        self.modified += result.modified_count
+        self.operations = []
+
+@stage("build_platforms")
+def build_platforms(debug=False, storage=None):
+    """
+    Fetches platform metadata from IGDB and stores the platforms not stored yet.
 
     Args:
-        platforms (list): List of platform names (strings) to process.
         debug (bool): If True, writes results to a local JSON file instead of the database.
+        storage (Storage): Backend the platforms are stored in, STORAGE_BACKEND if None.
     """
     def build_query():
         """
@@ -48,73 +230,91 @@ def build_platforms(debug=False):
         where platform_type = (1, 5);
         limit 500;
         """
-    
-    operations = []
-    all_results = []
 
     response = query_igdb_endpoint(IGDB_GAMES_ENDPOINT, build_query())
 
+    consoles = []
     for console in response:
         console["_id"] = console.pop("id")
-    
-        op = pymongo.UpdateOne(
-                {"_id": console["_id"]},
-                {"$setOnInsert": console},
-                upsert=True
-            )
-
-        if debug:
-            all_results.append(console)
-        else:
-            operations.append(op)
-            
-    if operations:
-        # Execute all upserts in a single database call
-        result = platform_db.bulk_write(operations)
-        print(f"Inserted {result.upserted_count} new platforms")
-    elif debug:
+        consoles.append(console)
+
+    if debug:
         # Export to local file for verification
         with open("Database/platforms.json", "w", encoding="utf-8") as f:
-            json.dump(all_results, f, indent=4, ensure_ascii=False)
+            json.dump(consoles, f, indent=4, ensure_ascii=False)
         print("Platforms written to Database/platforms.json")
+    elif consoles:
+        if storage is None:
+            # Imported here, lib.storage builds on this module
+            from lib.storage import get_storage
+            storage = get_storage()
+        print(f"Inserted {storage.add_platforms(consoles)} new platforms")
     else:
         print("No platforms to process") 
 
-def fetch_unprocessed_games():
+def ensure_indexes():
     """
-    Identifies games in the 'dmc-items' collection that have not yet been enriched.
-    
-    Uses an aggregation pipeline to perform a left outer join and filter for 
-    records with no corresponding entry in 'enriched-items'.
+    Creates the indexes the pipeline's queries rely on. Safe to call on every run.
+    """
+    db = get_db()
+
+    # Lets link lookups probe folio IDs instead of scanning 'enriched-items'
+    db["enriched-items"].create_index("dmc_entries.folioid")
+
+    # Unprocessed-item detection only visits flagged items, items matched by another matcher 
+    # version and unmatched items due for another search
+    db["dmc-items"].create_index("needs_enrichment")
+    db["dmc-items"].create_index("enrichment.matcher_version")
+    db["dmc-items"].create_index([("enrichment.igdb_id", 1), ("enrichment.enriched_at", 1)])
+
+    # Records written before the flag existed get it once, the index finds them without a scan
+    db["dmc-items"].update_many(
+        {"needs_enrichment": {"$exists": False}, "enrichment.matcher_version": {"$exists": True}},
+        [{"$set": {"needs_enrichment": {"$ne": ["$enrichment.input_hash", "$input_hash"]}}}]
+    )
+
+def unmatched_retry_cutoff():
+    """
+    Returns the 'enriched_at' before which unmatched items are searched again.
+
+    Items are retried once IGDB_NEGATIVE_TTL has passed, when the empty IGDB 
+    results they were matched against have expired from the response cache, so 
+    games added to IGDB since are found.
+    """
+    return (datetime.now(timezone.utc) - timedelta(seconds=NEGATIVE_TTL)).isoformat()
+
+def fetch_unprocessed_games(matcher_version, batch_size=500):
+    """
+    Identifies games in the 'dmc-items' collection that need to be (re-)enriched.
+
+    Every enriched item carries an 'enrichment' record with the hash of the 
+    inputs and the matcher version its match was made from. Harvests flag 
+    items whose inputs are new or changed with 'needs_enrichment', recording 
+    the enrichment clears it. Flagged items, items without a record or 
+    matched by another matcher version, and unmatched items whose last search 
+    is older than IGDB_NEGATIVE_TTL are returned, all through indexes; 
+    everything else is skipped. Only the fields used by enrichment are returned.
+
+    Args:
+        matcher_version (str): Version of the current title matcher.
+        batch_size (int): Number of documents fetched per round trip.
 
     Returns:
-        list: Documents from 'dmc-items' that require processing.
-    """
-    pipeline = [
-        {
-            # Join 'dmc-items' with 'enriched-items' based on the item ID
-            "$lookup": {
-                "from": "enriched-items",
-                "localField": "_id",           # Primary ID in source
-                "foreignField": "dmc_entries", # Referenced ID in target array
-                "as": "link_check"
-            }
-        },
-        {
-            # Filter for documents where no match was found in the target collection
-            "$match": {
-                "link_check": {"$size": 0}
-            }
-        },
-        {
-            # Clean up temporary field used for filtering
-            "$project": {
-                "link_check": 0
-            }
-        }
-    ]
+        Cursor: Streaming cursor over 'dmc-items' documents that require processing.
+    """
+    # $ne on an indexed field scans the two key ranges around matcher_version, missing records included
+    stale = {
+        "$or": [
+            {"needs_enrichment": True},
+            {"enrichment.matcher_version": {"$ne": matcher_version}},
+            {"enrichment.igdb_id": None, "enrichment.enriched_at": {"$lt": unmatched_retry_cutoff()}},
+        ]
+    }
+
+    # The previous record tells enrichment which link a new match replaces
+    projection = {"title": 1, "alternative_titles": 1, "platform_id_guess": 1, "enrichment": 1}
 
-    return list(db["dmc-items"].aggregate(pipeline))
+    return get_db()["dmc-items"].find(stale, projection, batch_size=batch_size)
 
 if __name__ == "__main__":
     build_platforms(debug=True)
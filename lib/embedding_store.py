@@ -0,0 +1,219 @@
+"""
+Content-addressed, on-disk cache of sentence embeddings.
+
+Embeddings are keyed by a hash of the model name and the normalized text,
+stored in a flat float32 file that is memory-mapped on load, so strings that
+were encoded in a previous run are never passed through the model again.
+
+Author: Amrit Srivastava
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, stores are then only safe within one process
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "Database/embeddings")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(model_name, path=EMBEDDING_CACHE_DIR):
+    """
+    Returns the shared store for a model, so every matcher appends to the same files.
+
+    Args:
+        model_name (str): Name of the model producing the embeddings.
+        path (str): Directory holding the cache files.
+
+    Returns:
+        EmbeddingStore: The store for this model and directory.
+    """
+    with _stores_lock:
+        key = (os.path.abspath(path), model_name)
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(model_name, path)
+        return _stores[key]
+
+class EmbeddingStore:
+    """
+    Append-only embedding cache backed by a memory-mapped NumPy file.
+
+    Files (per model):
+        <model>.json  dimension of the vectors
+        <model>.keys  one hex key per line, line n describes row n
+        <model>.f32   raw float32 rows
+        <model>.lock  flock'ed while the files are read or appended to
+
+    Several processes (e.g. enrichment workers) can share a directory: appends
+    hold the lock and re-read the keys, so rows written by other processes are
+    kept and picked up.
+    """
+    def __init__(self, model_name, path=EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.path = path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        base = os.path.join(path, re.sub(r'[^\w.-]', '_', model_name))
+        self.meta_file = base + ".json"
+        self.keys_file = base + ".keys"
+        self.vectors_file = base + ".f32"
+        self.lock_file = base + ".lock"
+
+        self.dim = None
+        self.index = {}
+        self.vectors = None
+        self.load()
+
+    @contextmanager
+    def file_lock(self):
+        """
+        Holds an exclusive lock on the store's files across processes.
+        """
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_keys(self):
+        """
+        Reads the stored keys, dropping those whose rows were never fully written.
+
+        Must be called under file_lock.
+
+        Returns:
+            list: Keys in row order.
+        """
+        if self.dim is None and os.path.exists(self.meta_file):
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+        if self.dim is None or not (os.path.exists(self.keys_file) and os.path.exists(self.vectors_file)):
+            return []
+
+        with open(self.keys_file, "r", encoding="utf-8") as f:
+            keys = f.read().split()
+
+        # Vectors are written before keys, so a partially written batch leaves extra rows, never missing ones
+        rows = min(len(keys), os.path.getsize(self.vectors_file) // (self.dim * 4))
+        if rows < len(keys):
+            with open(self.keys_file, "w", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in keys[:rows]))
+        return keys[:rows]
+
+    def load(self):
+        """
+        Reads the key index and memory-maps the stored vectors.
+        """
+        if not os.path.exists(self.meta_file):
+            return
+
+        with self.file_lock():
+            keys = self.read_keys()
+        self.index = {key: i for i, key in enumerate(keys)}
+        self.remap(len(keys))
+
+    def remap(self, rows):
+        """
+        Memory-maps the first rows of the vector file.
+        """
+        if rows:
+            self.vectors = np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def key(self, text):
+        """
+        Returns the content address of a text for this model.
+        """
+        normalized = " ".join(text.split())
+        return hashlib.sha1(f"{self.model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def encode(self, texts, encode_fn):
+        """
+        Returns embeddings for texts, encoding only those not already stored.
+
+        Args:
+            texts (list): Strings to embed.
+            encode_fn (callable): Encodes a list of strings into a 2D float array.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(texts), dim).
+        """
+        keys = [self.key(text) for text in texts]
+
+        with self.lock:
+            # Distinct misses are encoded together in one batch
+            missing = {}
+            for text, key in zip(texts, keys):
+                if key not in self.index and key not in missing:
+                    missing[key] = text
+
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+            if missing:
+                self.append(list(missing), np.asarray(encode_fn(list(missing.values())), dtype=np.float32))
+
+            if not texts:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+
+            return np.asarray(self.vectors[[self.index[key] for key in keys]])
+
+    def append(self, keys, vectors):
+        """
+        Appends new rows to the store and refreshes the memory map.
+
+        Rows are placed after whatever is on disk, not after what this process 
+        loaded, and keys another process stored meanwhile are not written twice.
+        """
+        # Release the current mapping so the file can be resized on every platform
+        self.vectors = None
+        os.makedirs(self.path, exist_ok=True)
+
+        with self.file_lock():
+            stored = self.read_keys()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_file, "w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+
+            self.index = {key: i for i, key in enumerate(stored)}
+            new = [i for i, key in enumerate(keys) if key not in self.index]
+            keys = [keys[i] for i in new]
+
+            if keys:
+                start = len(stored)
+                with open(self.vectors_file, "ab") as f:
+                    # Drop rows left over from an interrupted append so offsets stay aligned with keys
+                    f.truncate(start * self.dim * 4)
+                    f.write(vectors[new].tobytes())
+                with open(self.keys_file, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{key}\n" for key in keys))
+
+                for i, key in enumerate(keys):
+                    self.index[key] = start + i
+
+        self.remap(len(self.index))
+
+    def stats(self):
+        """
+        Returns a one-line summary of cache hits and misses.
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"{self.model_name} embeddings: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
@@ -0,0 +1,285 @@
+"""
+Columnar snapshots of the enriched collection for downstream consumers.
+
+Every export is a numbered version directory under EXPORT_DIR holding:
+    games/part-NNN.parquet   igdb_id, name, release_date, genre_ids, platform_ids
+    links/part-NNN.parquet   folioid, igdb_id, confidence
+    joined/part-NNN.arrow    one row per linked item with its game's columns,
+                             uncompressed Arrow IPC so it can be memory-mapped
+    manifest.json            row counts and a content hash per partition
+
+Games and their links are partitioned by IGDB ID, so each partition is joined
+on its own. An incremental export only writes the partitions whose hash
+changed and hard-links the others from the previous version. EXPORT_DIR/LATEST
+names the current version and is replaced atomically once a version is
+complete, so readers never see a partial export.
+
+pyarrow is optional, without it the export is skipped.
+
+Usage:
+    python -m lib.export          # incremental export
+    python -m lib.export --full   # rewrite every partition
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from lib.catalog_index import entry_folioid
+from lib.metrics import increment, stage
+from lib.storage import STORAGE_BACKEND, STORAGE_BACKENDS, get_storage
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "Database/export")         # Empty disables the export
+EXPORT_PARTITIONS = int(os.getenv("EXPORT_PARTITIONS", 16))     # Games are spread over partitions by IGDB ID
+EXPORT_KEEP = int(os.getenv("EXPORT_KEEP", 3))                  # Versions kept, older ones are deleted (0 keeps all)
+LATEST_FILE = "LATEST"
+TABLES = ("games", "links", "joined")
+
+def table_schemas():
+    """
+    Returns the Arrow schema of every exported table.
+    """
+    game_columns = [
+        ("name", pa.string()),
+        ("release_date", pa.int64()),
+        ("genre_ids", pa.list_(pa.int64())),
+        ("platform_ids", pa.list_(pa.int64())),
+    ]
+    return {
+        "games": pa.schema([("igdb_id", pa.int64()), *game_columns]),
+        "links": pa.schema([("folioid", pa.string()), ("igdb_id", pa.int64()), ("confidence", pa.float64())]),
+        "joined": pa.schema([("folioid", pa.string()), ("igdb_id", pa.int64()), ("confidence", pa.float64()), *game_columns]),
+    }
+
+def partition_path(version_dir, table, partition):
+    """
+    Returns the file of one partition of a table.
+    """
+    extension = "arrow" if table == "joined" else "parquet"
+    return os.path.join(version_dir, table, f"part-{partition:03d}.{extension}")
+
+def latest_version(export_dir=EXPORT_DIR):
+    """
+    Returns the directory of the current export, or None if nothing was exported yet.
+    """
+    try:
+        with open(os.path.join(export_dir, LATEST_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(export_dir, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+def read_manifest(version_dir):
+    """
+    Returns the manifest of an export version, or an empty dict if there is none.
+    """
+    if version_dir is None:
+        return {}
+    try:
+        with open(os.path.join(version_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def game_row(game):
+    """
+    Selects the exported columns of an 'enriched-items' document.
+    """
+    return {
+        "igdb_id": game["_id"],
+        "name": game.get("name"),
+        "release_date": game.get("release_date"),
+        # Genres are stored as {id, name} objects, platforms as IDs
+        "genre_ids": [genre["id"] if isinstance(genre, dict) else genre for genre in game.get("genres", [])],
+        "platform_ids": list(game.get("platforms", [])),
+    }
+
+def link_rows(game):
+    """
+    Lists the links of an 'enriched-items' document, bare folio IDs have no confidence.
+    """
+    return [
+        {
+            "folioid": entry_folioid(entry),
+            "igdb_id": game["_id"],
+            "confidence": entry.get("confidence") if isinstance(entry, dict) else None,
+        }
+        for entry in game.get("dmc_entries", [])
+    ]
+
+def partition_games(documents, partitions):
+    """
+    Groups games and their links by partition, sorted so equal contents hash equally.
+
+    Returns:
+        list: (games, links) row lists, one per partition.
+    """
+    grouped = [([], []) for _ in range(partitions)]
+    for game in documents:
+        games, links = grouped[game["_id"] % partitions]
+        games.append(game_row(game))
+        links.extend(link_rows(game))
+
+    for games, links in grouped:
+        games.sort(key=lambda row: row["igdb_id"])
+        links.sort(key=lambda row: row["folioid"])
+    return grouped
+
+def partition_hash(games, links):
+    """
+    Returns a hash of a partition's contents.
+    """
+    payload = json.dumps([games, links], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def write_partition(version_dir, partition, games, links, schemas):
+    """
+    Writes the games, links and joined view files of one partition.
+    """
+    by_id = {row["igdb_id"]: row for row in games}
+    joined = [{**by_id[link["igdb_id"]], **link} for link in links]
+
+    pq.write_table(pa.Table.from_pylist(games, schema=schemas["games"]), partition_path(version_dir, "games", partition))
+    pq.write_table(pa.Table.from_pylist(links, schema=schemas["links"]), partition_path(version_dir, "links", partition))
+
+    # Uncompressed IPC, so memory-mapped readers get the buffers without copying or decoding
+    with pa.OSFile(partition_path(version_dir, "joined", partition), "wb") as sink:
+        with pa.ipc.new_file(sink, schemas["joined"]) as writer:
+            writer.write_table(pa.Table.from_pylist(joined, schema=schemas["joined"]))
+
+def reuse_partition(previous_dir, version_dir, partition):
+    """
+    Carries an unchanged partition over from the previous version, hard-linked when possible.
+    """
+    for table in TABLES:
+        source = partition_path(previous_dir, table, partition)
+        target = partition_path(version_dir, table, partition)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+def prune_versions(export_dir, keep=EXPORT_KEEP):
+    """
+    Deletes all but the newest keep export versions.
+    """
+    versions = sorted(name for name in os.listdir(export_dir) if name.isdigit())
+    for name in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(export_dir, name))
+
+@stage("export_snapshot")
+def export_snapshot(storage=None, full=False, export_dir=EXPORT_DIR, partitions=EXPORT_PARTITIONS):
+    """
+    Exports 'enriched-items' as a new columnar snapshot version.
+
+    Args:
+        storage (Storage): Backend the games are read from, STORAGE_BACKEND if None.
+        full (bool): If True, every partition is rewritten instead of only changed ones.
+        export_dir (str): Directory holding the export versions.
+        partitions (int): Number of partitions games are spread over.
+
+    Returns:
+        str: Directory of the current version, None if the export is disabled.
+    """
+    if not export_dir:
+        return None
+    if pa is None:
+        print("pyarrow is not installed, skipping the columnar export.")
+        return None
+
+    storage = storage or get_storage()
+    previous_dir = latest_version(export_dir)
+    previous = read_manifest(previous_dir)
+
+    # Partitions can only be reused when they were cut the same way
+    previous_hashes = previous.get("partition_hashes", []) if previous.get("partitions") == partitions and not full else []
+
+    grouped = partition_games(storage.iter_documents("enriched-items"), partitions)
+    hashes = [partition_hash(games, links) for games, links in grouped]
+    changed = [p for p in range(partitions) if p >= len(previous_hashes) or previous_hashes[p] != hashes[p]]
+
+    if not changed:
+        print(f"Columnar export is up to date ({previous_dir}).")
+        return previous_dir
+
+    # The version is assembled in a scratch directory and only renamed into place once complete
+    os.makedirs(export_dir, exist_ok=True)
+    version = max([previous.get("version", 0)] + [int(name) for name in os.listdir(export_dir) if name.isdigit()]) + 1
+    version_dir = os.path.join(export_dir, f"{version:06d}")
+    scratch_dir = os.path.join(export_dir, f".{version:06d}.tmp")
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    for table in TABLES:
+        os.makedirs(os.path.join(scratch_dir, table))
+
+    schemas = table_schemas()
+    for partition, (games, links) in enumerate(grouped):
+        if partition in changed:
+            write_partition(scratch_dir, partition, games, links, schemas)
+        else:
+            reuse_partition(previous_dir, scratch_dir, partition)
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "partitions": partitions,
+        "games": sum(len(games) for games, _ in grouped),
+        "links": sum(len(links) for _, links in grouped),
+        "partition_hashes": hashes,
+        "rewritten": changed,
+    }
+    with open(os.path.join(scratch_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    os.rename(scratch_dir, version_dir)
+    latest_tmp = os.path.join(export_dir, LATEST_FILE + ".tmp")
+    with open(latest_tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_dir))
+    os.replace(latest_tmp, os.path.join(export_dir, LATEST_FILE))
+    prune_versions(export_dir)
+
+    increment("export_partitions_total", len(changed), result="written")
+    increment("export_partitions_total", partitions - len(changed), result="reused")
+    print(f"Exported {manifest['games']} games and {manifest['links']} links to {version_dir} "
+          f"({len(changed)} of {partitions} partitions rewritten).")
+    return version_dir
+
+def load_joined_view(version_dir=None):
+    """
+    Memory-maps the joined view of an export version.
+
+    The partitions are read without copying, so loading costs no more than
+    opening the files; pages are read from disk as columns are accessed.
+
+    Args:
+        version_dir (str): Export version to load, the current one if None.
+
+    Returns:
+        Table: One row per linked item, or None if nothing was exported yet.
+    """
+    version_dir = version_dir or latest_version()
+    if version_dir is None:
+        return None
+
+    manifest = read_manifest(version_dir)
+    tables = [
+        pa.ipc.open_file(pa.memory_map(partition_path(version_dir, "joined", partition), "r")).read_all()
+        for partition in range(manifest["partitions"])
+    ]
+    return pa.concat_tables(tables)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the enriched games as a columnar snapshot.")
+    parser.add_argument("--full", action="store_true", help="Rewrite every partition instead of only changed ones")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default=STORAGE_BACKEND, help="Where the collections are stored")
+    args = parser.parse_args()
+
+    export_snapshot(get_storage(args.storage), full=args.full)
@@ -0,0 +1,138 @@
+"""
+Asynchronous IGDB client for running many queries concurrently.
+
+Requests share the process-wide token bucket from lib.api_helpers, are capped
+by a semaphore at IGDB's limit of open requests (and, across workers, by shared
+request slots), reuse pooled connections and
+are retried with backoff on 429 and 5xx responses. Response cache lookups and
+writes are SQLite queries, they run in worker threads so the event loop keeps
+serving the requests in flight.
+
+Author: Amrit Srivastava
+"""
+
+import asyncio
+import contextlib
+import httpx
+
+from lib.api_helpers import (
+    CLIENT_ID, IGDB_MAX_CONCURRENCY, IGDB_MAX_RETRIES, IGDB_MULTIQUERY_URL, MULTIQUERY_LIMIT,
+    build_igdb_multiquery, build_igdb_search_game_query, chunked, endpoint_name, get_access_token, 
+    igdb_bucket, is_retryable, retry_delay, split_cached_searches, store_multiquery_results
+)
+from lib.metrics import increment, timer
+from lib.response_cache import get_response_cache
+
+class AsyncIGDBClient:
+    """
+    Pooled, rate-limited IGDB client. Use as an async context manager:
+
+        async with AsyncIGDBClient() as client:
+            results = await client.search_many(searches)
+    """
+    def __init__(self, max_concurrency=IGDB_MAX_CONCURRENCY, bucket=igdb_bucket, slots=None):
+        """
+        Args:
+            max_concurrency (int): Maximum number of requests open at once.
+            bucket (TokenBucket): Limiter pacing the request rate.
+            slots (SharedRequestSlots): Limit on open requests shared with other 
+                processes (see lib.work_queue), only the local semaphore applies if None.
+        """
+        self.max_concurrency = max_concurrency
+        self.bucket = bucket
+        self.slots = slots
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = None
+
+    async def __aenter__(self):
+        self.client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def query(self, endpoint, query, use_cache=True):
+        """
+        Executes a POST request to a specific IGDB endpoint.
+
+        Args:
+            endpoint (str): The IGDB API endpoint URL.
+            query (str): The query string in IGDB's wrapper syntax.
+            use_cache (bool): Whether to use the response cache for this call.
+
+        Returns:
+            list/dict: Parsed JSON response from the API.
+        """
+        if use_cache:
+            hit, cached = await asyncio.to_thread(get_response_cache().get, endpoint, query)
+            if hit:
+                return cached
+
+        # The token is cached, so this only blocks the loop on the rare renewal
+        access_token = get_access_token()
+        renewed = False
+
+        for attempt in range(IGDB_MAX_RETRIES + 1):
+            headers = {
+                "Client-ID": CLIENT_ID or "",
+                "Authorization": f"Bearer {access_token}"
+            }
+
+            async with self.semaphore, (self.slots.hold() if self.slots else contextlib.nullcontext()):
+                await self.bucket.acquire_async()
+                with timer("igdb_request_seconds", endpoint=endpoint_name(endpoint)):
+                    response = await self.client.post(endpoint, headers=headers, content=query)
+            increment("igdb_requests_total", endpoint=endpoint_name(endpoint), status=response.status_code)
+
+            # Tokens can be revoked or expire mid-run, renew once and retry
+            if response.status_code == 401 and not renewed:
+                access_token = get_access_token(rejected_token=access_token)
+                renewed = True
+                continue
+
+            # Rate limited or server trouble, back off and try again
+            if is_retryable(response.status_code) and attempt < IGDB_MAX_RETRIES:
+                await asyncio.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
+                continue
+
+            break
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            increment("igdb_errors_total", endpoint=endpoint_name(endpoint))
+            print(f"Error querying {endpoint}")
+            print(f"Query: {query}")
+            print(e)
+            raise
+
+        result = response.json()
+        if use_cache:
+            await asyncio.to_thread(get_response_cache().set, endpoint, query, result)
+
+        return result
+
+    async def search_many(self, searches):
+        """
+        Runs many game title searches as concurrent /multiquery requests.
+
+        Args:
+            searches (list): (title, platforms) tuples, as accepted by build_igdb_search_game_query.
+
+        Returns:
+            list: IGDB result lists in the same order as searches.
+        """
+        queries = [build_igdb_search_game_query(title, platforms) for title, platforms in searches]
+        results, pending = await asyncio.to_thread(split_cached_searches, queries)
+
+        async def run_batch(batch):
+            response = await self.query(IGDB_MULTIQUERY_URL, build_igdb_multiquery(batch), use_cache=False)
+            return await asyncio.to_thread(store_multiquery_results, batch, response)
+
+        for batch_results in await asyncio.gather(*(run_batch(batch) for batch in chunked(pending, MULTIQUERY_LIMIT))):
+            results.update(batch_results)
+
+        return [results.get(query, []) for query in queries]
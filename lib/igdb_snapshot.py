@@ -0,0 +1,261 @@
+"""
+Local snapshot of IGDB games for offline candidate retrieval.
+
+Every game released on a platform in 'platform-data' is downloaded once into
+the 'igdb-games' collection, and later refreshed incrementally from IGDB's
+updated_at timestamps. Deleted games, and games that no longer match
+IGDB_GAME_CONDITIONS, never show up as updated, so every
+SNAPSHOT_RECONCILE_DAYS the IDs still on IGDB are listed and the others are
+dropped from the snapshot. Game names are embedded through the shared embedding
+store and held in an exact nearest-neighbor index partitioned by platform, so
+candidates for the title matcher are found locally instead of through one
+rate-limited IGDB search per title variant.
+
+Usage:
+    python -m lib.igdb_snapshot          # incremental refresh
+    python -m lib.igdb_snapshot --full   # download every game again
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from tqdm import tqdm
+from lib.api_helpers import IGDB_URL, IGDB_GAME_FIELDS, IGDB_GAME_CONDITIONS, chunked, query_igdb_endpoint
+from lib.database_helpers import get_db, platforms_in_db, get_harvest_state, set_harvest_state, BulkWriter
+from lib.metrics import stage
+from lib.storage import get_storage
+
+SNAPSHOT_COLLECTION = "igdb-games"
+SNAPSHOT_PAGE_SIZE = 500                                             # IGDB's maximum page size
+SNAPSHOT_CANDIDATES = int(os.getenv("SNAPSHOT_CANDIDATES", 20))      # Nearest games returned per catalog item
+SNAPSHOT_MIN_SCORE = float(os.getenv("SNAPSHOT_MIN_SCORE", 0.5))     # Similarity below which games are not candidates
+SNAPSHOT_RECONCILE_DAYS = float(os.getenv("SNAPSHOT_RECONCILE_DAYS", 7))  # Days between reconciles dropping games gone from IGDB, 0 reconciles every sync
+SNAPSHOT_FIELDS = f"{IGDB_GAME_FIELDS}, updated_at"
+
+def build_snapshot_query(platforms, after_id=0, updated_since=None, limit=SNAPSHOT_PAGE_SIZE, fields=SNAPSHOT_FIELDS):
+    """
+    Constructs one page of the snapshot download, paginating on the game ID.
+
+    Args:
+        platforms (list): IGDB platform IDs to download games for.
+        after_id (int): Only games with a larger ID are returned.
+        updated_since (int): Optional Unix timestamp, only games updated since then are returned.
+        limit (int): Page size.
+        fields (str): Fields returned, e.g. only 'id' to list the games of the snapshot.
+
+    Returns:
+        str: Formatted IGDB query string.
+    """
+    conditions = f"platforms = ({', '.join(map(str, platforms))}) & {IGDB_GAME_CONDITIONS} & id > {after_id}"
+    if updated_since:
+        conditions += f" & updated_at >= {updated_since}"
+
+    return f"""
+        fields {fields};
+        where {conditions};
+        sort id asc;
+        limit {limit};
+    """
+
+def iter_snapshot_pages(platforms, updated_since=None, fields=SNAPSHOT_FIELDS):
+    """
+    Downloads snapshot pages until IGDB returns a short page.
+
+    Keyset pagination on the ID keeps pages stable while games are being
+    edited upstream, unlike offsets.
+
+    Yields:
+        list: Game dictionaries, in ascending ID order.
+    """
+    after_id = 0
+    while True:
+        # Pages are not cached, the snapshot itself is the cache
+        page = query_igdb_endpoint(IGDB_URL, build_snapshot_query(platforms, after_id, updated_since, fields=fields), use_cache=False)
+        if page:
+            yield page
+        if len(page) < SNAPSHOT_PAGE_SIZE:
+            return
+        after_id = page[-1]["id"]
+
+def remove_missing_games(current_ids):
+    """
+    Deletes the snapshot games IGDB no longer lists, deleted upstream or no
+    longer matching IGDB_GAME_CONDITIONS.
+
+    Args:
+        current_ids (set): IDs of every game IGDB returns for the snapshot's platforms.
+
+    Returns:
+        int: Number of games removed.
+    """
+    collection = get_db()[SNAPSHOT_COLLECTION]
+    missing = [doc["_id"] for doc in collection.find({}, {"_id": 1}) if doc["_id"] not in current_ids]
+
+    for batch in chunked(missing, 1000):
+        collection.delete_many({"_id": {"$in": batch}})
+    return len(missing)
+
+@stage("sync_igdb_snapshot")
+def sync_igdb_snapshot(matcher=None, full=False):
+    """
+    Brings the local snapshot up to date with IGDB.
+
+    Only games updated since the previous sync are downloaded, unless this is
+    the first sync, the platform list changed or full is set. Names of new and
+    updated games are embedded right away so the index loads from the store.
+    Games missing from a full download are removed; after an incremental one
+    they are only looked for every SNAPSHOT_RECONCILE_DAYS, by listing the IDs
+    of every game.
+
+    Args:
+        matcher (EmbeddingMatcher): Matcher whose embedding store receives the names,
+            skipped if None.
+        full (bool): If True, download every game regardless of the stored state.
+    """
+    platforms = sorted(p["_id"] for p in platforms_in_db())
+    if not platforms:
+        print("No platforms to snapshot")
+        return
+
+    state = get_harvest_state(SNAPSHOT_COLLECTION)
+    updated_since = state.get("updated_at") if not full and state.get("platforms") == platforms else None
+    latest = updated_since or 0
+    reconcile = updated_since is None or time.time() - state.get("reconciled_at", 0) >= SNAPSHOT_RECONCILE_DAYS * 86400
+    current_ids = set()
+
+    # The snapshot is only kept in MongoDB, next to the queue the workers share
+    writer = BulkWriter(get_storage("mongodb"), SNAPSHOT_COLLECTION)
+    progress = tqdm(desc="Downloading IGDB snapshot", unit="game")
+
+    for page in iter_snapshot_pages(platforms, updated_since):
+        writer.add({"_id": game["id"], **game} for game in page)
+        current_ids.update(game["id"] for game in page)
+        latest = max([latest] + [game.get("updated_at", 0) for game in page])
+
+        if matcher is not None:
+            matcher.embed([game["name"] for game in page if game.get("name")])
+        progress.update(len(page))
+
+    progress.close()
+    writer.flush()
+    print(f"Snapshot: {writer.inserted} new, {writer.updated} updated, {writer.unchanged} unchanged games.")
+
+    if reconcile:
+        reconciled_at = time.time()
+        if updated_since is not None:
+            # Only IDs are listed, a fraction of the full download's payload
+            current_ids = {game["id"] for page in iter_snapshot_pages(platforms, fields="id") for game in page}
+        print(f"Snapshot: {remove_missing_games(current_ids)} games no longer on IGDB removed.")
+    else:
+        reconciled_at = state.get("reconciled_at", 0)
+
+    # Only advance the timestamp once every page has been stored
+    set_harvest_state(SNAPSHOT_COLLECTION, updated_at=latest, platforms=platforms, reconciled_at=reconciled_at)
+
+def load_snapshot():
+    """
+    Reads every named game of the snapshot.
+
+    Returns:
+        list: Game dictionaries shaped like IGDB search results.
+    """
+    return list(get_db()[SNAPSHOT_COLLECTION].find({"name": {"$ne": None}}, {"_id": 0, "updated_at": 0}))
+
+class SnapshotIndex:
+    """
+    Exact cosine nearest-neighbor index over snapshot game names, partitioned by platform.
+
+    Each platform holds a contiguous block of its games' normalized embeddings,
+    so a query only scores the games released on the item's platforms.
+    """
+    def __init__(self, matcher, games=None, candidates=SNAPSHOT_CANDIDATES, min_score=SNAPSHOT_MIN_SCORE):
+        """
+        Args:
+            matcher (EmbeddingMatcher): Matcher used to embed names and titles.
+            games (list): Games to index, loaded from the snapshot if None.
+            candidates (int): Number of nearest games returned per query.
+            min_score (float): Minimum cosine similarity of a candidate, standing in for 
+                the textual relevance cut-off of IGDB's search.
+        """
+        self.matcher = matcher
+        self.candidates = candidates
+        self.min_score = min_score
+        self.games = load_snapshot() if games is None else games
+
+        embeddings = self.normalize(self.matcher.embed([game["name"] for game in self.games]))
+
+        rows_by_platform = {}
+        for row, game in enumerate(self.games):
+            for platform in game.get("platforms") or []:
+                rows_by_platform.setdefault(platform, []).append(row)
+
+        # platform -> (snapshot rows, their embeddings)
+        self.partitions = {
+            platform: (np.array(rows), np.ascontiguousarray(embeddings[rows]))
+            for platform, rows in rows_by_platform.items()
+        }
+
+    def normalize(self, embeddings):
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def search(self, titles, platforms):
+        """
+        Finds the games closest to any of the titles on the given platforms.
+
+        Returns:
+            dict: IGDB ID -> game, closest first.
+        """
+        return self.search_many([(titles, platforms)])[0]
+
+    def search_many(self, queries):
+        """
+        Finds candidates for many catalog items, embedding all of their titles in one batch.
+
+        Args:
+            queries (list): (titles, platforms) tuples.
+
+        Returns:
+            list: One dict of IGDB ID -> game per query, closest first; empty for
+                queries without titles or indexed platforms.
+        """
+        texts = list(dict.fromkeys(title for titles, _ in queries for title in titles))
+        positions = {text: j for j, text in enumerate(texts)}
+        embeddings = self.normalize(self.matcher.embed(texts)) if texts else None
+
+        results = []
+        for titles, platforms in queries:
+            partitions = [self.partitions[p] for p in platforms if p in self.partitions]
+            if not (titles and partitions):
+                results.append({})
+                continue
+
+            # Score each game by its best title, across every platform partition
+            title_embeddings = embeddings[[positions[title] for title in titles]]
+            rows = np.concatenate([rows for rows, _ in partitions])
+            scores = np.concatenate([(block @ title_embeddings.T).max(axis=1) for _, block in partitions])
+
+            # Games on several platforms appear once per partition, keep their first occurrence
+            candidates = {}
+            order = np.argsort(-scores, kind="stable")
+            for row in rows[order[scores[order] >= self.min_score]]:
+                game = self.games[row]
+                if game["id"] not in candidates:
+                    candidates[game["id"]] = game
+                    if len(candidates) >= self.candidates:
+                        break
+
+            results.append(candidates)
+
+        return results
+
+if __name__ == "__main__":
+    from lib.string_matcher import GameTitleMatcher
+
+    parser = argparse.ArgumentParser(description="Download or refresh the local IGDB game snapshot.")
+    parser.add_argument("--full", action="store_true", help="Download every game instead of only updated ones")
+    args = parser.parse_args()
+
+    sync_igdb_snapshot(GameTitleMatcher(), full=args.full)
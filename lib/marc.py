@@ -0,0 +1,183 @@
+"""
+Streaming parser for MARC21 records in OAI-PMH responses.
+
+Responses are parsed incrementally with iterparse (lxml's when installed, the
+standard library's otherwise). Only the datafields the pipeline reads are
+looked at, and every record is cleared and detached from the tree once it has
+been yielded, so memory stays flat however many records a response holds.
+
+Author: Amrit Srivastava
+"""
+
+import io
+
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+MARC_NS = "{http://www.loc.gov/MARC21/slim}"
+OAI_NS = "{http://www.openarchives.org/OAI/2.0/}"
+
+# MARC tag -> metadata field, every other tag is skipped
+MARC_FIELDS = {
+    "245": "title",
+    "246": "alternative_titles",
+    "710": "authors",
+    "250": "edition",
+    "753": "platform",
+    "099": "callnumber",
+    "655": "genres",  # Only used to flag video games, not part of the metadata
+}
+
+OAI_RECORD = OAI_NS + "record"
+MARC_RECORD = MARC_NS + "record"
+MARC_DATAFIELD = MARC_NS + "datafield"
+CONTAINERS = {OAI_NS + "ListRecords", OAI_NS + "GetRecord", MARC_NS + "collection"}
+ENVELOPE_TAGS = [OAI_RECORD, MARC_RECORD, OAI_NS + "responseDate", OAI_NS + "resumptionToken", OAI_NS + "error", *CONTAINERS]
+
+# lxml only reports the envelope elements, the standard library reports every element
+ITERPARSE_OPTIONS = {"events": ("start", "end")}
+if ET.__name__ == "lxml.etree":
+    ITERPARSE_OPTIONS["tag"] = ENVELOPE_TAGS
+
+def extract_fields(record_elem):
+    """
+    Collects the $a subfields of the datafields listed in MARC_FIELDS.
+
+    Returns:
+        dict: Field name -> values in record order.
+    """
+    fields = {}
+    for datafield in record_elem.iterfind(MARC_DATAFIELD):
+        field = MARC_FIELDS.get(datafield.get("tag"))
+        if field is None:
+            continue
+
+        values = [subfield.text for subfield in datafield if subfield.get("code") == "a"]
+        if field == "genres":
+            fields.setdefault(field, []).extend(values)
+        elif values:
+            # The last $a wins, as when subfields are mapped by code
+            fields.setdefault(field, []).append(values[-1])
+    return fields
+
+def build_metadata(fields):
+    """
+    Shapes the collected subfield values like the rest of the pipeline expects them.
+    """
+    callnumbers = fields.get("callnumber", [])
+    return {
+        "title": fields.get("title", []),
+        "alternative_titles": fields.get("alternative_titles", []),
+        "authors": fields.get("authors", []),
+        "edition": fields.get("edition", []),
+        "platform": fields.get("platform", []),
+        "callnumber": callnumbers[0] if callnumbers else '',
+    }
+
+class OAIStream:
+    """
+    Iterates over the records of one OAI-PMH response (GetRecord or ListRecords).
+
+    Yields dicts with 'id', 'datestamp', 'deleted', 'is_game' and 'metadata'
+    (None for deleted records). Envelope values are set as they are parsed:
+    response_date before the first record, resumption_token and error once
+    iteration has finished.
+    """
+    def __init__(self, source):
+        """
+        Args:
+            source (str/bytes/file): The response body, or a binary file object to read it from.
+        """
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+
+        self.source = source
+        self.response_date = None
+        self.resumption_token = None
+        self.error = None  # (code, message)
+
+    def __iter__(self):
+        container = None  # Element whose finished records are detached
+        in_record = False
+
+        for event, elem in ET.iterparse(self.source, **ITERPARSE_OPTIONS):
+            tag = elem.tag
+
+            if event == "start":
+                if tag == OAI_RECORD:
+                    in_record = True
+                elif tag in CONTAINERS:
+                    container = elem
+
+            elif tag == OAI_RECORD:
+                header = elem.find(OAI_NS + "header")
+                yield self.record(header, elem.find(f"{OAI_NS}metadata/{MARC_RECORD}"))
+                in_record = False
+                self.detach(container, elem)
+
+            elif tag == MARC_RECORD:
+                if not in_record:
+                    # A bare MARC record outside an OAI envelope
+                    yield self.record(None, elem)
+                    self.detach(container, elem)
+
+            elif tag == OAI_NS + "responseDate":
+                self.response_date = elem.text
+
+            elif tag == OAI_NS + "resumptionToken":
+                self.resumption_token = (elem.text or "").strip()
+
+            elif tag == OAI_NS + "error":
+                self.error = (elem.get("code"), elem.text)
+
+    def record(self, header, record_elem):
+        """
+        Builds the output dict of one record from its OAI header and MARC record elements.
+        """
+        deleted = header is not None and header.get("status") == "deleted"
+        fields = extract_fields(record_elem) if record_elem is not None else {}
+        return {
+            "id": header.findtext(OAI_NS + "identifier") if header is not None else None,
+            "datestamp": header.findtext(OAI_NS + "datestamp") if header is not None else None,
+            "deleted": deleted,
+            "is_game": any('video games' in (genre or '').lower() for genre in fields.get("genres", [])),
+            "metadata": build_metadata(fields) if record_elem is not None and not deleted else None,
+        }
+
+    def detach(self, container, elem):
+        """
+        Frees a finished record, it is always the first child left in its container.
+        """
+        elem.clear()
+        if container is not None and len(container) and container[0] is elem:
+            del container[0]
+
+def parse_marc21_record(xml_data, id):
+    """
+    Extracts the fields used by the pipeline from an OAI-PMH GetRecord response.
+
+    A single record gains nothing from streaming, so the response is parsed 
+    whole and only the needed datafields are read.
+
+    Args:
+        xml_data (str/bytes): Raw XML returned by the OAI-PMH server.
+        id (str): The catalog record identifier, used for error reporting.
+
+    Returns:
+        dict: Extracted metadata including titles, authors, and call numbers.
+    """
+    root = ET.fromstring(xml_data.encode("utf-8") if isinstance(xml_data, str) else xml_data)
+
+    # Locate MARC record within the OAI wrapper, or a bare one
+    record_elem = root.find(f"{OAI_NS}GetRecord/{OAI_RECORD}/{OAI_NS}metadata/{MARC_RECORD}")
+    if record_elem is None:
+        record_elem = root if root.tag == MARC_RECORD else root.find(f".//{MARC_RECORD}")
+
+    if record_elem is None:
+        raise ValueError(f"MARC record not found for ID: {id}")
+
+    return build_metadata(extract_fields(record_elem))
@@ -0,0 +1,290 @@
+"""
+Lightweight in-process metrics for the pipeline.
+
+Counters and fixed-bucket histograms are recorded in a thread-safe registry and
+written at the end of a run as a JSON report and as a Prometheus textfile (for
+node_exporter's textfile collector). Enrichment workers running side by side
+write files of their own, labelled with the worker's name. A single stage can also be run under
+cProfile by naming it in PROFILE_STAGE or --profile-stage.
+
+    with timer("igdb_request_seconds", endpoint="games"):
+        ...
+
+    @timer("matcher_seconds", matcher="title")
+    def match_many(self, groups): ...
+
+    @stage("enrich_with_igdb")
+    def enrich_with_igdb(): ...
+
+Author: Amrit Srivastava
+"""
+
+import cProfile
+import contextlib
+import contextvars
+import json
+import math
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+METRICS_DIR = os.getenv("METRICS_DIR", "Database/metrics")  # Empty disables the report files
+PROFILE_STAGE = os.getenv("PROFILE_STAGE")                   # Stage run under cProfile
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Set while a stage runs under cProfile, only one profiler can be active at a time
+_profiling = contextvars.ContextVar("profiling", default=False)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with count, sum, min and max.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot holds values above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in, capped by the maximum.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 6)
+        return round(self.max, 6)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6),
+            "min": round(self.min, 6),
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+class MetricsRegistry:
+    """
+    Process-wide store of labelled counters and histograms.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = datetime.now(timezone.utc)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def report(self):
+        """
+        Returns the run report as a JSON-serializable dict.
+        """
+        def label_text(labels):
+            return ",".join(f"{k}={v}" for k, v in labels)
+
+        with self.lock:
+            return {
+                "started": self.started.isoformat(),
+                "finished": datetime.now(timezone.utc).isoformat(),
+                "counters": {
+                    name + (f"{{{label_text(labels)}}}" if labels else ""): round(value, 6)
+                    for (name, labels), value in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name + (f"{{{label_text(labels)}}}" if labels else ""): histogram.summary()
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def prometheus(self, prefix="games_api_", common_labels=None):
+        """
+        Returns every metric in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): Prepended to every metric name.
+            common_labels (dict): Labels added to every series, e.g. the worker's name.
+        """
+        common = sorted((common_labels or {}).items())
+
+        def label_text(labels, extra=()):
+            pairs = [f'{k}="{str(v)}"' for k, v in common + list(labels) + list(extra)]
+            return f"{{{','.join(pairs)}}}" if pairs else ""
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}{name} counter")
+                    typed.add(name)
+                lines.append(f"{prefix}{name}{label_text(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{prefix}{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{prefix}{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{prefix}{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{prefix}{name}_count{label_text(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+def increment(name, value=1, **labels):
+    """
+    Adds value to a counter.
+    """
+    metrics.increment(name, value, **labels)
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """
+    Records a value in a histogram.
+    """
+    metrics.observe(name, value, buckets, **labels)
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """
+    Records the duration of the block (or of every call, used as a decorator) in a 
+    latency histogram, also when it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(name, time.perf_counter() - start, **labels)
+
+def set_profile_stage(name):
+    """
+    Selects the stage run under cProfile, overriding PROFILE_STAGE.
+    """
+    global PROFILE_STAGE
+    PROFILE_STAGE = name
+
+class stage(contextlib.ContextDecorator):
+    """
+    Times a pipeline stage, and runs it under cProfile if it is the selected profile stage.
+
+    Usable as a decorator or a context manager. A decorated function shares one 
+    instance across its calls, which may be recursive or run in several threads 
+    at once, so every call keeps its start time and profiler on a stack held in 
+    a context variable instead of on the instance.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = contextvars.ContextVar(f"stage:{name}", default=())
+
+    def __enter__(self):
+        profiler = token = None
+        if PROFILE_STAGE == self.name and not _profiling.get():
+            token = _profiling.set(True)
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        self.calls.set(self.calls.get() + ((time.perf_counter(), profiler, token),))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        calls = self.calls.get()
+        start, profiler, token = calls[-1]
+        self.calls.set(calls[:-1])
+
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_seconds", elapsed, stage=self.name)
+        metrics.increment("stage_runs_total", stage=self.name, status="error" if exc_type else "ok")
+
+        if profiler is not None:
+            profiler.disable()
+            _profiling.reset(token)
+            self.dump_profile(profiler)
+        return False
+
+    def dump_profile(self, profiler):
+        """
+        Saves the profile for snakeviz/pstats and prints the hottest functions.
+        """
+        if METRICS_DIR:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = os.path.join(METRICS_DIR, f"{self.name}.prof")
+            profiler.dump_stats(path)
+            print(f"Profile of {self.name} written to {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+def write_atomic(path, text):
+    # Textfile collectors may read at any time, never expose a half-written file
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+def write_reports(directory=METRICS_DIR, worker=None):
+    """
+    Writes the JSON run report and the Prometheus textfile of this run.
+
+    Args:
+        directory (str): Output directory, nothing is written if empty.
+        worker (str): Name of the worker process (e.g. 'host:pid'). Workers run 
+            side by side, so their files are suffixed with it and every series 
+            gets a 'worker' label, instead of overwriting each other.
+    """
+    if not directory:
+        return
+
+    report = metrics.report()
+    suffix = ""
+    if worker:
+        report["worker"] = worker
+        suffix = "-" + re.sub(r'[^\w.-]', '_', worker)
+
+    os.makedirs(directory, exist_ok=True)
+    write_atomic(os.path.join(directory, f"run-report{suffix}.json"), json.dumps(report, indent=4))
+    write_atomic(
+        os.path.join(directory, f"games_api{suffix}.prom"),
+        metrics.prometheus(common_labels={"worker": worker} if worker else None)
+    )
+    print(f"Metrics written to {directory}")
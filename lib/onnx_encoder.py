@@ -0,0 +1,231 @@
+"""
+ONNX Runtime backend for the sentence embedding model.
+
+On first use the Sentence Transformers model is exported to ONNX, quantized to
+int8 (dynamic quantization of the linear layers) and saved next to its
+tokenizer; later runs only load the exported files, without importing torch.
+Tokenization, pooling and normalization reproduce the Sentence Transformers
+pipeline, so the encoder is a drop-in replacement for SentenceTransformer.encode.
+
+Only plain Transformer -> Pooling (mean, cls or max) -> Normalize pipelines are
+supported, which covers all-MiniLM-L6-v2.
+
+Author: Amrit Srivastava
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "Database/onnx")  # Exported models, one directory each
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "1") != "0"         # int8 weights, 0 keeps float32
+ONNX_OPSET = 17
+ENCODE_BATCH_SIZE = 32  # Same default batch size as SentenceTransformer.encode
+
+def model_directory(model_name, quantize=ONNX_QUANTIZE, path=ONNX_MODEL_DIR):
+    """
+    Returns the directory an exported model is stored in.
+    """
+    name = re.sub(r'[^\w.-]', '_', model_name)
+    return os.path.join(path, f"{name}-{'int8' if quantize else 'fp32'}")
+
+def export_onnx_model(model_name, directory, quantize=ONNX_QUANTIZE):
+    """
+    Exports a Sentence Transformers model to ONNX, optionally quantized to int8.
+
+    The export is written to a temporary directory and moved into place once
+    complete, so concurrent workers never load a half-written model.
+
+    Args:
+        model_name (str): Name or path of the Sentence Transformers model.
+        directory (str): Destination directory.
+        quantize (bool): Whether to quantize the weights to int8.
+
+    Raises:
+        ValueError: If the model's pipeline cannot be reproduced outside torch.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    modules = list(st_model)
+
+    # Transformer -> Pooling -> optional Normalize, anything else changes the embeddings
+    if not (
+        len(modules) in (2, 3)
+        and isinstance(modules[0], models.Transformer)
+        and isinstance(modules[1], models.Pooling)
+        and all(isinstance(m, models.Normalize) for m in modules[2:])
+    ):
+        raise ValueError(f"Unsupported module pipeline for ONNX export: {[type(m).__name__ for m in modules]}")
+
+    # Pooling exposes its mode differently across sentence-transformers releases
+    if hasattr(modules[1], "get_pooling_mode_str"):
+        pooling = modules[1].get_pooling_mode_str()
+    else:
+        pooling = modules[1].get_config_dict().get("pooling_mode")
+    if pooling not in ("mean", "cls", "max"):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling}")
+
+    transformer = modules[0]
+    tokenizer = transformer.tokenizer
+    input_names = list(tokenizer.model_input_names)
+
+    class LastHiddenState(torch.nn.Module):
+        # Positional inputs keep the exported graph signature independent of the model's forward()
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(os.path.abspath(directory)))
+    try:
+        sample = tokenizer(["a sample sentence", "another"], padding=True, return_tensors="pt")
+        float_path = os.path.join(staging, "model-fp32.onnx")
+        torch.onnx.export(
+            LastHiddenState(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            float_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+
+        model_path = os.path.join(staging, "model.onnx")
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            # Shape inference and graph fusion first, so more operators get quantized
+            prepared_path = os.path.join(staging, "model-prepared.onnx")
+            quant_pre_process(float_path, prepared_path, skip_symbolic_shape=True)
+            quantize_dynamic(prepared_path, model_path, weight_type=QuantType.QInt8)
+            os.remove(float_path)
+            os.remove(prepared_path)
+        else:
+            os.replace(float_path, model_path)
+
+        tokenizer.save_pretrained(staging)
+        with open(os.path.join(staging, "encoder.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "model": model_name,
+                "inputs": input_names,
+                "max_seq_length": st_model.max_seq_length,
+                "pad_token": tokenizer.pad_token,
+                "pad_id": tokenizer.pad_token_id,
+                "pooling": pooling,
+                "normalize": len(modules) == 3,
+                "quantized": quantize,
+            }, f, indent=4)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+
+class OnnxEncoder:
+    """
+    Sentence encoder running an exported model with ONNX Runtime on CPU.
+    """
+    def __init__(self, directory, threads=0):
+        """
+        Args:
+            directory (str): Directory written by export_onnx_model.
+            threads (int): Intra-op threads, 0 lets ONNX Runtime use every core.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(directory, "encoder.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(directory, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+
+    def encode(self, texts, convert_to_numpy=True, batch_size=ENCODE_BATCH_SIZE):
+        """
+        Embeds texts like SentenceTransformer.encode.
+
+        Args:
+            texts (list): Strings to embed.
+            convert_to_numpy (bool): Accepted for compatibility, the result is always a NumPy array.
+            batch_size (int): Strings per inference call.
+
+        Returns:
+            np.ndarray: Array of shape (len(texts), dim).
+        """
+        # Batching strings of similar length keeps padding to a minimum
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings = [None] * len(texts)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+
+            features = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: features[name] for name in self.config["inputs"]})[0]
+
+            for i, vector in zip(batch, self.pool(hidden, features["attention_mask"])):
+                embeddings[i] = vector
+
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(embeddings)
+
+    def pool(self, hidden, attention_mask):
+        """
+        Reduces token embeddings to one vector per string.
+        """
+        mask = attention_mask[:, :, None].astype(np.float32)
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        elif self.config["pooling"] == "max":
+            pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+        else:
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.config["normalize"]:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+def load_onnx_encoder(model_name, threads=0, quantize=ONNX_QUANTIZE, path=ONNX_MODEL_DIR):
+    """
+    Returns an ONNX encoder for a model, exporting it on first use.
+
+    Args:
+        model_name (str): Name of the Sentence Transformers model.
+        threads (int): Intra-op threads, 0 lets ONNX Runtime use every core.
+        quantize (bool): Whether to use int8 weights.
+        path (str): Directory holding exported models.
+
+    Returns:
+        OnnxEncoder: The loaded encoder.
+    """
+    directory = model_directory(model_name, quantize, path)
+    if not os.path.exists(os.path.join(directory, "encoder.json")):
+        print(f"Exporting {model_name} to ONNX ({'int8' if quantize else 'fp32'}) in {directory}")
+        export_onnx_model(model_name, directory, quantize)
+    return OnnxEncoder(directory, threads)
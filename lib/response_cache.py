@@ -0,0 +1,137 @@
+"""
+Persistent cache of IGDB API responses backed by SQLite.
+
+Responses are keyed on the endpoint and the whitespace-normalized query, and
+expire after a per-endpoint TTL. Empty results are cached as well (with a
+shorter TTL) so items that never match stop burning the rate limit.
+
+Author: Amrit Srivastava
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+IGDB_CACHE_PATH = os.getenv("IGDB_CACHE_PATH", "Database/igdb-cache.sqlite")
+IGDB_CACHE_BYPASS = os.getenv("IGDB_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+# Time to live per IGDB endpoint name, platforms barely change while game searches pick up new releases
+CACHE_TTLS = {
+    "platforms": 30 * DAY,
+    "games": 7 * DAY,
+}
+DEFAULT_TTL = DAY
+NEGATIVE_TTL = int(os.getenv("IGDB_NEGATIVE_TTL", 3 * DAY))  # TTL of empty results
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """
+    Returns the process-wide response cache, opening the database on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(IGDB_CACHE_PATH, bypass=IGDB_CACHE_BYPASS)
+        return _cache
+
+class ResponseCache:
+    """
+    SQLite-backed key/value store of JSON responses with expiry times.
+    """
+    def __init__(self, path, bypass=False):
+        """
+        Args:
+            path (str): SQLite database file.
+            bypass (bool): If True, lookups always miss but fresh responses are still stored.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, body TEXT, expires_at REAL)"
+            )
+            self.connection.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def key(self, endpoint, query):
+        """
+        Returns the cache key of a query, ignoring differences in whitespace.
+        """
+        normalized = " ".join(query.split())
+        return hashlib.sha1(f"{endpoint}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def ttl(self, endpoint, value):
+        """
+        Returns how long a response stays valid, based on the endpoint and whether it is empty.
+        """
+        if not value:
+            return NEGATIVE_TTL
+        return CACHE_TTLS.get(endpoint.rstrip("/").rsplit("/", 1)[-1], DEFAULT_TTL)
+
+    def get(self, endpoint, query):
+        """
+        Looks up a cached response.
+
+        Returns:
+            tuple: (hit, value); value is None on a miss.
+        """
+        if self.bypass:
+            self.misses += 1
+            return False, None
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body FROM responses WHERE key = ? AND expires_at >= ?",
+                (self.key(endpoint, query), time.time())
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            return True, json.loads(row[0])
+
+    def set(self, endpoint, query, value):
+        """
+        Stores a response with the TTL of its endpoint.
+        """
+        self.set_many(endpoint, [(query, value)])
+
+    def set_many(self, endpoint, responses):
+        """
+        Stores several (query, value) responses for one endpoint in a single transaction.
+        """
+        now = time.time()
+        rows = [
+            (self.key(endpoint, query), endpoint, json.dumps(value), now + self.ttl(endpoint, value))
+            for query, value in responses
+        ]
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, expires_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def stats(self):
+        """
+        Returns a one-line summary of cache hits and misses.
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"IGDB response cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)"
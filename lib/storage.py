@@ -0,0 +1,579 @@
+"""
+Storage backends for the pipeline's collections.
+
+The pipeline reads and writes 'platform-data', 'dmc-items', 'enriched-items'
+and 'harvest-state' through a Storage. MongoStorage is the production backend.
+SQLiteStorage keeps the same collections in a local SQLite file, so the whole
+pipeline runs offline without a MongoDB server. Its writes are batched into one
+transaction per call and its reads stream from their own connection, so a
+crawl checkpoints and resumes exactly like it does on MongoDB.
+
+Author: Amrit Srivastava
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import pymongo
+from lib.catalog_index import entry_folioid
+from lib.database_helpers import (
+    BulkOperationWriter, ensure_indexes, fetch_unprocessed_games, get_db, get_harvest_state,
+    platforms_in_db, set_harvest_state, unmatched_retry_cutoff, upsert_changed
+)
+from lib.metrics import timer
+
+STORAGE_BACKENDS = ("mongodb", "sqlite")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongodb")
+SQLITE_STORAGE_PATH = os.getenv("SQLITE_STORAGE_PATH", "Database/pipeline.sqlite")
+SQLITE_MAX_VARIABLES = 500  # IDs bound per IN (...) query
+
+# Fields of 'dmc-items' documents that enrichment reads
+ITEM_FIELDS = ("title", "alternative_titles", "platform_id_guess")
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+def get_storage(backend=None):
+    """
+    Returns the process-wide storage of a backend, opening it on first use.
+
+    Args:
+        backend (str): 'mongodb' or 'sqlite', STORAGE_BACKEND if None.
+
+    Returns:
+        Storage: The shared storage.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    backend = backend or STORAGE_BACKEND
+    with _storages_lock:
+        if backend not in _storages:
+            if backend == "mongodb":
+                _storages[backend] = MongoStorage()
+            elif backend == "sqlite":
+                _storages[backend] = SQLiteStorage(SQLITE_STORAGE_PATH)
+            else:
+                raise ValueError(f"Unknown storage backend: {backend}")
+        return _storages[backend]
+
+class Storage(ABC):
+    """
+    Interface of the pipeline's storage.
+
+    Documents have the shape described in the readme, '_id' included. Links
+    are written as (folioid, igdb_id, fields, confidence) tuples, unlinks as
+    (folioid, igdb_id) and enrichment records as (folioid, input_hash, enrichment).
+    """
+    name = None  # Prefix of the write metrics, e.g. 'mongo' -> mongo_write_seconds
+
+    @abstractmethod
+    def ensure_indexes(self):
+        """
+        Creates whatever the queries below rely on. Safe to call on every run.
+        """
+
+    @abstractmethod
+    def get_state(self, key):
+        """
+        Returns the state document of a harvest, or an empty dict if it never ran.
+        """
+
+    @abstractmethod
+    def set_state(self, key, **fields):
+        """
+        Records fields on the state document of a harvest.
+        """
+
+    @abstractmethod
+    def platforms(self):
+        """
+        Returns every stored platform document.
+        """
+
+    @abstractmethod
+    def add_platforms(self, platforms):
+        """
+        Stores the platforms not stored yet, existing ones are left as they are.
+
+        Returns:
+            int: Number of platforms added.
+        """
+
+    @abstractmethod
+    def upsert_changed(self, collection, documents):
+        """
+        Upserts the documents whose fields differ from the stored ones. Fields
+        missing from a document (e.g. an item's enrichment record) are kept.
+        Documents whose 'input_hash' is new or changed are flagged 'needs_enrichment'.
+
+        Returns:
+            tuple: (inserted, updated, unchanged) document counts.
+        """
+
+    @abstractmethod
+    def existing_ids(self, collection, ids=None):
+        """
+        Returns which of ids are stored in a collection, every stored ID if ids is None.
+        """
+
+    @abstractmethod
+    def unprocessed_items(self, matcher_version, batch_size=500):
+        """
+        Streams the 'dmc-items' documents that need to be (re-)enriched: flagged
+        'needs_enrichment', without an enrichment record, matched by another
+        matcher version, or unmatched since before unmatched_retry_cutoff(),
+        found through indexes. Only the fields enrichment reads and the record
+        are returned.
+        """
+
+    @abstractmethod
+    def find_items(self, folioids):
+        """
+        Returns the 'dmc-items' documents of folioids that are stored, with 
+        the fields enrichment reads and their record, like unprocessed_items.
+        """
+
+    @abstractmethod
+    def unrecorded_items(self, batch_size=500):
+        """
+        Streams the 'dmc-items' documents without an enrichment record.
+        """
+
+    @abstractmethod
+    def linked_games(self, folioids):
+        """
+        Returns the IGDB ID each linked item of folioids is linked to.
+        """
+
+    @abstractmethod
+    def link_items(self, links):
+        """
+        Links items to games, creating the games not stored yet. Linking an
+        item again to the same game only updates its confidence.
+        """
+
+    @abstractmethod
+    def unlink_items(self, unlinks):
+        """
+        Removes items from games they are no longer matched to.
+        """
+
+    @abstractmethod
+    def record_enrichment(self, records):
+        """
+        Stores enrichment records on items and clears their 'needs_enrichment'
+        flag. Items whose stored input hash differs from the record's were
+        changed by a harvest meanwhile and are left flagged, to be matched again.
+        """
+
+    @abstractmethod
+    def delete_unlinked_games(self, igdb_ids):
+        """
+        Deletes the games of igdb_ids that no item is linked to anymore.
+
+        Returns:
+            int: Number of games deleted.
+        """
+
+    @abstractmethod
+    def delete_items(self, folioids):
+        """
+        Deletes 'dmc-items' documents, e.g. of records withdrawn from the catalog.
+        Their links are left to unlink_items.
+
+        Returns:
+            int: Number of items deleted.
+        """
+
+    @abstractmethod
+    def iter_documents(self, collection, batch_size=500):
+        """
+        Streams every document of a collection.
+        """
+
+class MongoStorage(Storage):
+    """
+    Storage in the MongoDB database configured by MONGODB_URI.
+    """
+    name = "mongo"
+
+    def ensure_indexes(self):
+        ensure_indexes()
+
+    def get_state(self, key):
+        return get_harvest_state(key)
+
+    def set_state(self, key, **fields):
+        set_harvest_state(key, **fields)
+
+    def platforms(self):
+        return platforms_in_db()
+
+    def add_platforms(self, platforms):
+        operations = [pymongo.UpdateOne({"_id": p["_id"]}, {"$setOnInsert": p}, upsert=True) for p in platforms]
+        if not operations:
+            return 0
+
+        # Execute all upserts in a single database call
+        with timer("mongo_write_seconds", collection="platform-data"):
+            result = get_db()["platform-data"].bulk_write(operations)
+        return result.upserted_count
+
+    def upsert_changed(self, collection, documents):
+        return upsert_changed(get_db()[collection], documents)
+
+    def existing_ids(self, collection, ids=None):
+        query = {} if ids is None else {"_id": {"$in": list(ids)}}
+        return {doc["_id"] for doc in get_db()[collection].find(query, {"_id": 1})}
+
+    def unprocessed_items(self, matcher_version, batch_size=500):
+        return fetch_unprocessed_games(matcher_version, batch_size=batch_size)
+
+    def find_items(self, folioids):
+        return list(get_db()["dmc-items"].find({"_id": {"$in": list(folioids)}}, dict.fromkeys((*ITEM_FIELDS, "enrichment"), 1)))
+
+    def unrecorded_items(self, batch_size=500):
+        return get_db()["dmc-items"].find(
+            # Every record has a matcher version, so its index finds the items without one
+            {"enrichment.matcher_version": {"$exists": False}}, dict.fromkeys(ITEM_FIELDS, 1), batch_size=batch_size
+        )
+
+    def linked_games(self, folioids):
+        folioids = list(folioids)
+        linked = {}
+
+        # Entries are either {folioid, confidence} or, in older records, bare folio IDs
+        for game in get_db()["enriched-items"].find(
+            {"$or": [{"dmc_entries.folioid": {"$in": folioids}}, {"dmc_entries": {"$in": folioids}}]}, {"dmc_entries": 1}
+        ):
+            for entry in game["dmc_entries"]:
+                linked[entry_folioid(entry)] = game["_id"]
+        return {folioid: linked[folioid] for folioid in folioids if folioid in linked}
+
+    def link_items(self, links):
+        # Every write is idempotent, so an item processed twice still ends up linked exactly once.
+        # The writes of a link depend on each other: the $push only matches once the upsert
+        # created the game, so they are sent as an ordered bulk write
+        writer = BulkOperationWriter(get_db()["enriched-items"], ordered=True)
+        for folioid, igdb_id, fields, confidence in links:
+            writer.add(pymongo.UpdateOne({"_id": igdb_id}, {"$setOnInsert": fields}, upsert=True))
+            writer.add(pymongo.UpdateOne(
+                # Older records store bare folio IDs, those count as linked too
+                {"_id": igdb_id, "dmc_entries.folioid": {"$ne": folioid}, "dmc_entries": {"$ne": folioid}},
+                {"$push": {"dmc_entries": {"folioid": folioid, "confidence": confidence}}}
+            ))
+            writer.add(pymongo.UpdateOne(
+                {"_id": igdb_id, "dmc_entries.folioid": folioid},
+                {"$set": {"dmc_entries.$.confidence": confidence}}
+            ))
+        writer.flush()
+
+    def unlink_items(self, unlinks):
+        writer = BulkOperationWriter(get_db()["enriched-items"])
+        for folioid, igdb_id in unlinks:
+            writer.add(pymongo.UpdateOne({"_id": igdb_id}, {"$pull": {"dmc_entries": {"folioid": folioid}}}))
+            writer.add(pymongo.UpdateOne({"_id": igdb_id}, {"$pull": {"dmc_entries": folioid}}))
+        writer.flush()
+
+    def record_enrichment(self, records):
+        writer = BulkOperationWriter(get_db()["dmc-items"])
+        for folioid, input_hash, enrichment in records:
+            writer.add(pymongo.UpdateOne(
+                {"_id": folioid, "input_hash": {"$in": [input_hash, None]}},
+                {"$set": {"input_hash": input_hash, "enrichment": enrichment, "needs_enrichment": False}}
+            ))
+        writer.flush()
+
+    def delete_unlinked_games(self, igdb_ids):
+        # Games created by link_items get 'dmc_entries' with their first link, only emptied ones match
+        result = get_db()["enriched-items"].delete_many({"_id": {"$in": list(igdb_ids)}, "dmc_entries": {"$size": 0}})
+        return result.deleted_count
+
+    def delete_items(self, folioids):
+        result = get_db()["dmc-items"].delete_many({"_id": {"$in": list(folioids)}})
+        return result.deleted_count
+
+    def iter_documents(self, collection, batch_size=500):
+        return get_db()[collection].find({}, batch_size=batch_size)
+
+class SQLiteStorage(Storage):
+    """
+    Storage in a local SQLite file.
+
+    Every document is one JSON row of the 'documents' table, keyed by
+    collection and ID. Item-to-game links live in the 'links' table, indexed
+    both ways, and are put back into 'dmc_entries' when games are read.
+    """
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_STORAGE_PATH):
+        """
+        Args:
+            path (str): SQLite database file, created if missing.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock:
+            # WAL lets streaming readers keep their snapshot while the pipeline writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "collection TEXT NOT NULL, id NOT NULL, body TEXT NOT NULL, PRIMARY KEY (collection, id)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS links ("
+                "folioid TEXT PRIMARY KEY, igdb_id NOT NULL, confidence REAL) WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS links_by_game ON links (igdb_id);"
+                # Same detection indexes as on MongoDB, over the JSON fields of 'dmc-items'
+                "CREATE INDEX IF NOT EXISTS items_needing_enrichment ON documents "
+                "(json_extract(body, '$.needs_enrichment')) WHERE collection = 'dmc-items';"
+                "CREATE INDEX IF NOT EXISTS items_by_matcher ON documents "
+                "(json_extract(body, '$.enrichment.matcher_version')) WHERE collection = 'dmc-items';"
+                "CREATE INDEX IF NOT EXISTS items_by_match ON documents "
+                "(json_extract(body, '$.enrichment.igdb_id'), json_extract(body, '$.enrichment.enriched_at')) "
+                "WHERE collection = 'dmc-items';"
+            )
+
+    def ensure_indexes(self):
+        # The schema and its indexes are created when the file is opened, records
+        # written before the 'needs_enrichment' flag existed get it once
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE documents SET body = json_set(body, '$.needs_enrichment', json(CASE "
+                "WHEN json_extract(body, '$.enrichment.input_hash') IS NOT json_extract(body, '$.input_hash') "
+                "THEN 'true' ELSE 'false' END)) "
+                "WHERE collection = 'dmc-items' AND json_extract(body, '$.needs_enrichment') IS NULL "
+                "AND json_extract(body, '$.enrichment.matcher_version') IS NOT NULL"
+            )
+
+    def stream(self, query, params=(), batch_size=500):
+        """
+        Yields the rows of a query from a dedicated connection, batch_size rows at a time.
+
+        The connection is opened by the consuming thread and reads one snapshot,
+        so writes made while iterating neither block nor show up in the results.
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            cursor = connection.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            connection.close()
+
+    def get_many(self, collection, ids):
+        """
+        Returns the stored documents of ids, keyed by ID.
+        """
+        ids = list(ids)
+        documents = {}
+        for start in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[start:start + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                f"SELECT id, body FROM documents WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                [collection, *chunk]
+            )
+            documents.update((id, json.loads(body)) for id, body in rows)
+        return documents
+
+    def put_many(self, collection, documents):
+        """
+        Inserts or replaces whole documents, inside the caller's transaction.
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO documents (collection, id, body) VALUES (?, ?, ?)",
+            [(collection, doc["_id"], json.dumps(doc, ensure_ascii=False)) for doc in documents]
+        )
+
+    def get_state(self, key):
+        with self.lock:
+            return self.get_many("harvest-state", [key]).get(key, {})
+
+    def set_state(self, key, **fields):
+        with self.lock, self.connection:
+            state = self.get_many("harvest-state", [key]).get(key, {"_id": key})
+            self.put_many("harvest-state", [{**state, **fields}])
+
+    def platforms(self):
+        return list(self.iter_documents("platform-data"))
+
+    def add_platforms(self, platforms):
+        with self.lock, self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO documents (collection, id, body) VALUES ('platform-data', ?, ?)",
+                [(p["_id"], json.dumps(p, ensure_ascii=False)) for p in platforms]
+            )
+            return self.connection.total_changes - before
+
+    def upsert_changed(self, collection, documents):
+        if not documents:
+            return 0, 0, 0
+
+        with self.lock, self.connection:
+            if collection == "enriched-items":
+                # Entries of whole game documents (e.g. a MongoDB export) go to the links table
+                documents = [dict(doc) for doc in documents]
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO links (folioid, igdb_id, confidence) VALUES (?, ?, ?)",
+                    [
+                        (entry_folioid(entry), doc["_id"], entry.get("confidence") if isinstance(entry, dict) else None)
+                        for doc in documents for entry in doc.pop("dmc_entries", [])
+                    ]
+                )
+
+            existing = self.get_many(collection, [doc["_id"] for doc in documents])
+
+            # Same comparison as on MongoDB: only the fields present in the new document count
+            changed = []
+            for doc in documents:
+                stored = existing.get(doc["_id"], {})
+                if any(key not in stored or stored[key] != value for key, value in doc.items()):
+                    merged = {**stored, **doc}
+                    if "input_hash" in doc and stored.get("input_hash") != doc["input_hash"]:
+                        merged["needs_enrichment"] = True
+                    changed.append(merged)
+            self.put_many(collection, changed)
+
+        inserted = sum(1 for doc in documents if doc["_id"] not in existing)
+        return inserted, len(changed) - inserted, len(documents) - len(changed)
+
+    def existing_ids(self, collection, ids=None):
+        with self.lock:
+            if ids is None:
+                rows = self.connection.execute("SELECT id FROM documents WHERE collection = ?", (collection,))
+                return {id for (id,) in rows}
+            return set(self.get_many(collection, ids))
+
+    def item_rows(self, selects, params=(), batch_size=500):
+        """
+        Streams the enrichment inputs and record of 'dmc-items' documents.
+
+        Args:
+            selects (list): (index, SQL condition) pairs, the documents matching 
+                each condition are read through its index and concatenated.
+        """
+        # The planner prefers the primary key over expression indexes, INDEXED BY 
+        # makes the search use them (and fails loudly if one stops being usable)
+        query = " UNION ALL ".join(
+            f"SELECT body FROM documents INDEXED BY {index} WHERE collection = 'dmc-items' AND {condition}"
+            for index, condition in selects
+        )
+        for (body,) in self.stream(query, params, batch_size):
+            doc = json.loads(body)
+            yield {key: doc[key] for key in ("_id", *ITEM_FIELDS, "enrichment") if key in doc}
+
+    def unprocessed_items(self, matcher_version, batch_size=500):
+        # Flagged items, then unflagged ones without a record or with another matcher version, 
+        # then the rest of the unmatched ones due for another search; no item is in two selects
+        flagged = "json_extract(body, '$.needs_enrichment')"
+        version = "json_extract(body, '$.enrichment.matcher_version')"
+        selects = [("items_needing_enrichment", f"{flagged} = 1")] + [
+            ("items_by_matcher", f"{condition} AND {flagged} IS NOT 1")
+            for condition in (f"{version} IS NULL", f"{version} < ?", f"{version} > ?")
+        ] + [(
+            "items_by_match",
+            "json_extract(body, '$.enrichment.igdb_id') IS NULL AND json_extract(body, '$.enrichment.enriched_at') < ? "
+            f"AND {flagged} IS NOT 1 AND {version} = ?"
+        )]
+        params = (matcher_version, matcher_version, unmatched_retry_cutoff(), matcher_version)
+        return self.item_rows(selects, params, batch_size)
+
+    def find_items(self, folioids):
+        with self.lock:
+            documents = self.get_many("dmc-items", folioids)
+        return [{key: doc[key] for key in ("_id", *ITEM_FIELDS, "enrichment") if key in doc} for doc in documents.values()]
+
+    def unrecorded_items(self, batch_size=500):
+        return self.item_rows(
+            [("items_by_matcher", "json_extract(body, '$.enrichment.matcher_version') IS NULL")], batch_size=batch_size
+        )
+
+    def linked_games(self, folioids):
+        folioids = list(folioids)
+        linked = {}
+        with self.lock:
+            for start in range(0, len(folioids), SQLITE_MAX_VARIABLES):
+                chunk = folioids[start:start + SQLITE_MAX_VARIABLES]
+                linked.update(self.connection.execute(
+                    f"SELECT folioid, igdb_id FROM links WHERE folioid IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return linked
+
+    def link_items(self, links):
+        with self.lock, self.connection, timer("sqlite_write_seconds", collection="enriched-items"):
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO documents (collection, id, body) VALUES ('enriched-items', ?, ?)",
+                [(igdb_id, json.dumps({"_id": igdb_id, **fields}, ensure_ascii=False)) for _, igdb_id, fields, _ in links]
+            )
+            # An item is linked to one game, linking it elsewhere moves the link
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO links (folioid, igdb_id, confidence) VALUES (?, ?, ?)",
+                [(folioid, igdb_id, confidence) for folioid, igdb_id, _, confidence in links]
+            )
+
+    def unlink_items(self, unlinks):
+        with self.lock, self.connection, timer("sqlite_write_seconds", collection="enriched-items"):
+            self.connection.executemany("DELETE FROM links WHERE folioid = ? AND igdb_id = ?", list(unlinks))
+
+    def record_enrichment(self, records):
+        with self.lock, self.connection, timer("sqlite_write_seconds", collection="dmc-items"):
+            self.connection.executemany(
+                "UPDATE documents SET body = json_set(body, '$.input_hash', ?, '$.enrichment', json(?), "
+                "'$.needs_enrichment', json('false')) "
+                "WHERE collection = 'dmc-items' AND id = ? AND coalesce(json_extract(body, '$.input_hash'), ?) = ?",
+                [
+                    (input_hash, json.dumps(enrichment, ensure_ascii=False), folioid, input_hash, input_hash)
+                    for folioid, input_hash, enrichment in records
+                ]
+            )
+
+    def delete_unlinked_games(self, igdb_ids):
+        igdb_ids = list(igdb_ids)
+        deleted = 0
+        with self.lock, self.connection:
+            for start in range(0, len(igdb_ids), SQLITE_MAX_VARIABLES):
+                chunk = igdb_ids[start:start + SQLITE_MAX_VARIABLES]
+                deleted += self.connection.execute(
+                    f"DELETE FROM documents WHERE collection = 'enriched-items' AND id IN ({','.join('?' * len(chunk))}) "
+                    "AND id NOT IN (SELECT igdb_id FROM links)",
+                    chunk
+                ).rowcount
+        return deleted
+
+    def delete_items(self, folioids):
+        folioids = list(folioids)
+        deleted = 0
+        with self.lock, self.connection, timer("sqlite_write_seconds", collection="dmc-items"):
+            for start in range(0, len(folioids), SQLITE_MAX_VARIABLES):
+                chunk = folioids[start:start + SQLITE_MAX_VARIABLES]
+                deleted += self.connection.execute(
+                    f"DELETE FROM documents WHERE collection = 'dmc-items' AND id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).rowcount
+        return deleted
+
+    def iter_documents(self, collection, batch_size=500):
+        if collection != "enriched-items":
+            return (json.loads(body) for (body,) in self.stream(
+                "SELECT body FROM documents WHERE collection = ?", (collection,), batch_size
+            ))
+
+        # Games get their links back as 'dmc_entries', in link order
+        rows = self.stream(
+            "SELECT body, (SELECT json_group_array(json_object('folioid', folioid, 'confidence', confidence)) "
+            "FROM links WHERE igdb_id = documents.id) FROM documents WHERE collection = 'enriched-items'",
+            batch_size=batch_size
+        )
+        return ({**json.loads(body), "dmc_entries": json.loads(entries)} for body, entries in rows)
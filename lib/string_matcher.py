@@ -3,32 +3,180 @@ Semantic matching utilities for game titles and platforms using Sentence Transfo
 
 This module provides classes to reconcile local library metadata with 
 external database (IGDB) records via vector embeddings and cosine similarity.
+Models are loaded lazily on first use and shared by every matcher, so importing 
+this module does not pull in torch. With EMBEDDING_BACKEND=onnx the model runs 
+int8-quantized on ONNX Runtime instead (see lib.onnx_encoder).
 
 Author: Amrit Srivastava
 """
 
-from sentence_transformers import SentenceTransformer, util
-import torch
+import hashlib
+import importlib.util
+import json
+import os
 import re
+import string
+import threading
+import numpy as np
+from collections import OrderedDict
 from lib.database_helpers import platforms_in_db
+from lib.embedding_store import get_embedding_store
+from lib.metrics import SIZE_BUCKETS, increment, observe, timer
 
-class PlatformMatcher:
+# Platform match cache configuration, set PLATFORM_CACHE_PATH to persist matches across runs
+PLATFORM_CACHE_SIZE = int(os.getenv("PLATFORM_CACHE_SIZE", 4096))
+PLATFORM_CACHE_PATH = os.getenv("PLATFORM_CACHE_PATH")
+
+# Model placement configuration shared by every matcher
+MODEL_DEVICE = os.getenv("MODEL_DEVICE")                # e.g. 'cpu', unset lets the library choose
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", 0))      # Torch or ONNX Runtime intra-op threads, 0 keeps the default
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # 'torch' (SentenceTransformer) or 'onnx'
+
+# Stored with every enrichment, bump it to re-match the whole catalog (e.g. after tuning the matcher)
+MATCHER_VERSION = os.getenv("MATCHER_VERSION", "1")
+
+# Leading manufacturer words the platform alias table ignores ('Sony PlayStation 4' -> 'playstation 4')
+PLATFORM_MAKERS = {"sony", "microsoft", "nintendo", "sega", "atari", "nec", "snk", "bandai", "panasonic", "apple", "ibm"}
+
+_models = {}
+_models_lock = threading.Lock()
+
+def embedding_backend():
+    """
+    Returns the backend models run on, falling back to torch when ONNX Runtime is not installed.
+    """
+    if EMBEDDING_BACKEND == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+        print("EMBEDDING_BACKEND=onnx but onnxruntime is not installed, using SentenceTransformer.")
+        return "torch"
+    return EMBEDDING_BACKEND
+
+def embedding_key(model_name, backend):
+    """
+    Returns the name embeddings are stored under; quantized vectors differ slightly, so they are kept apart.
+    """
+    if backend == "onnx":
+        from lib.onnx_encoder import ONNX_QUANTIZE
+        return f"{model_name}@onnx-{'int8' if ONNX_QUANTIZE else 'fp32'}"
+    return model_name
+
+def get_model(model_name, backend="torch"):
+    """
+    Returns the shared model, loading it on first use.
+
+    Args:
+        model_name (str): Name of the Sentence Transformers model.
+        backend (str): 'torch' or 'onnx'.
+
+    Returns:
+        SentenceTransformer/OnnxEncoder: The loaded model, both provide encode().
+    """
+    with _models_lock:
+        if (model_name, backend) not in _models:
+            if backend == "onnx":
+                from lib.onnx_encoder import load_onnx_encoder
+                _models[(model_name, backend)] = load_onnx_encoder(model_name, threads=MODEL_THREADS)
+            else:
+                # Deferred so that only code paths which actually encode pay for torch
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                if MODEL_THREADS:
+                    torch.set_num_threads(MODEL_THREADS)
+                _models[(model_name, backend)] = SentenceTransformer(model_name, device=MODEL_DEVICE)
+
+        return _models[(model_name, backend)]
+
+def clean_title(title):
+    """
+    Strips the punctuation catalog titles are padded with (e.g. 'Lego party! /').
+    """
+    return title.strip(string.punctuation).strip()
+
+def normalize_text(text):
+    """
+    Folds case, apostrophes and punctuation, so "Assassin's Creed: III" and 'assassins creed iii' compare equal.
+    """
+    text = clean_title(text).lower().replace("'", "").replace("\u2019", "")
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+def record_decisions(matcher, tiers):
+    """
+    Counts how many decisions each tier of a matching cascade made.
+
+    Args:
+        matcher (str): 'platform' or 'title'.
+        tiers (dict): Tier name -> number of decisions.
+    """
+    for tier, count in tiers.items():
+        if count:
+            increment("matcher_decisions_total", count, matcher=matcher, tier=tier)
+
+def cos_sim(a, b):
+    """
+    Computes the cosine similarity matrix between two sets of embeddings.
+
+    Args:
+        a (np.ndarray): Array of shape (n, dim).
+        b (np.ndarray): Array of shape (m, dim).
+
+    Returns:
+        np.ndarray: Array of shape (n, m).
+    """
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+class EmbeddingMatcher:
+    """
+    Base class for matchers that embed strings with a shared, lazily loaded model.
+    """
+    def __init__(self, model_name='all-MiniLM-L6-v2', backend=None):
+        self.model_name = model_name
+        self.backend = backend or embedding_backend()
+        self.embeddings = get_embedding_store(embedding_key(model_name, self.backend))
+
+    @property
+    def model(self):
+        return get_model(self.model_name, self.backend)
+
+    def embed(self, texts):
+        """
+        Returns embeddings for texts, only running the model on strings not seen before.
+        """
+        return self.embeddings.encode(texts, self.encode)
+
+    def encode(self, texts):
+        """
+        Runs the model on a batch of strings, recording its latency and batch size.
+        """
+        observe("model_encode_batch_size", len(texts), SIZE_BUCKETS, model=self.model_name, backend=self.backend)
+        with timer("model_encode_seconds", model=self.model_name, backend=self.backend):
+            return self.model.encode(texts, convert_to_numpy=True)
+
+class PlatformMatcher(EmbeddingMatcher):
     """
     Handles mapping of platform strings to verified platform IDs.
-    Uses semantic search combined with exact version matching (e.g., distinguishing Xbox vs Xbox 360).
+    Strings naming a known alias are resolved through a lookup table, the rest by 
+    semantic search combined with exact version matching (e.g., distinguishing Xbox 
+    vs Xbox 360). Results are memoized in an LRU cache keyed on the cleaned input string.
     """
-    def __init__(self):
+    def __init__(self, model_name='all-MiniLM-L6-v2', cache_size=PLATFORM_CACHE_SIZE, cache_path=PLATFORM_CACHE_PATH, platform_data=None, backend=None):
         """
         Initializes the transformer model and builds a corpus of platform names.
         
         Args:
-            platform_data (list): List of platform dictionaries from the database.
+            model_name (str): Sentence Transformers model used for embeddings.
+            cache_size (int): Maximum number of memoized match results.
+            cache_path (str): Optional JSON file used to persist matches across runs.
+            platform_data (list): Platform documents, read from 'platform-data' if None.
+            backend (str): 'torch' or 'onnx', EMBEDDING_BACKEND if None.
         """
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        super().__init__(model_name, backend)
         self.platform_map = []
         self.corpus_strings = []
 
-        platform_data = platforms_in_db()
+        if platform_data is None:
+            platform_data = platforms_in_db()
 
         # Map IDs to searchable strings (names, abbreviations, and alternatives)
         for data in platform_data:
@@ -42,8 +190,59 @@ class PlatformMatcher:
                     self.corpus_strings.append(opt.lower())
                     self.platform_map.append(p_id)
 
-        # Pre-calculate embeddings for the search space
-        self.corpus_embeddings = self.model.encode(self.corpus_strings, convert_to_tensor=True)
+        # Normalized alias -> platform IDs, keyed with the version like semantic matches
+        self.aliases = {}
+        for alias, p_id in zip(self.corpus_strings, self.platform_map):
+            self.aliases.setdefault(self.alias_key(alias), set()).add(p_id)
+
+        # Pre-calculate embeddings for the search space, reusing those stored by earlier runs
+        self.corpus_embeddings = self.embed(self.corpus_strings)
+
+        # Cached matches are only valid for the platform corpus that produced them
+        self.corpus_fingerprint = hashlib.sha1(
+            json.dumps([self.corpus_strings, self.platform_map]).encode("utf-8")
+        ).hexdigest()
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_path = cache_path
+        self.load_cache()
+
+    def load_cache(self):
+        """
+        Loads persisted matches if they were produced from the same platform corpus.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+
+        with open(self.cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("corpus") == self.corpus_fingerprint:
+            for cleaned, threshold, platform_id in data.get("matches", []):
+                self.cache[(cleaned, threshold)] = platform_id
+
+    def save_cache(self):
+        """
+        Persists memoized matches to the cache file, if one is configured.
+        """
+        if not self.cache_path:
+            return
+
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "corpus": self.corpus_fingerprint,
+                "matches": [[cleaned, threshold, platform_id] for (cleaned, threshold), platform_id in self.cache.items()]
+            }, f, ensure_ascii=False)
+
+    def remember(self, key, platform_id):
+        """
+        Stores a match result, evicting the least recently used entries beyond the cache size.
+        """
+        self.cache[key] = platform_id
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
 
     def clean(self, text):
         """
@@ -62,6 +261,28 @@ class PlatformMatcher:
         match = re.search(r'\b(\d+|one|series|vita|portable)\b', text.lower())
         return match.group(1) if match else None
 
+    def alias_key(self, text):
+        """
+        Returns the alias table key of a platform string: its normalized form 
+        without a leading manufacturer ('Sony PlayStation 4.' -> 'playstation 4'), 
+        and its version.
+        """
+        words = normalize_text(text).split()
+        if len(words) > 1 and words[0] in PLATFORM_MAKERS:
+            words = words[1:]
+        normalized = " ".join(words)
+        return normalized, self.get_version(normalized)
+
+    def lookup(self, cleaned_input):
+        """
+        Resolves a cleaned platform string through the alias table.
+
+        Returns:
+            int: The platform ID if exactly one platform has this alias, otherwise None.
+        """
+        platform_ids = self.aliases.get(self.alias_key(cleaned_input), ())
+        return next(iter(platform_ids)) if len(platform_ids) == 1 else None
+
     def match(self, input_str, threshold=0.75):
         """
         Performs semantic search to find the best platform match.
@@ -73,21 +294,83 @@ class PlatformMatcher:
         Returns:
             int: The platform ID if a match is found, otherwise -1.
         """
-        cleaned_input = self.clean(input_str)
-        if not cleaned_input:
-            return -1
+        return self.match_many([input_str], threshold)[0]
 
-        input_ver = self.get_version(cleaned_input)
+    @timer("matcher_seconds", matcher="platform")
+    def match_many(self, input_strs, threshold=0.75):
+        """
+        Matches many platform strings at once.
+
+        Inputs are cleaned and deduplicated. Cache misses are looked up in the alias 
+        table first; only strings without an unambiguous alias are encoded, in a single 
+        batched forward pass scored against the corpus with one similarity matrix.
+
+        Args:
+            input_strs (list): Platform names from the local catalog.
+            threshold (float): Minimum cosine similarity score to consider a match.
+
+        Returns:
+            list: Platform IDs in the same order as input_strs, -1 where no match was found.
+        """
+        cleaned_inputs = [self.clean(input_str) for input_str in input_strs]
+        matches = {}
+        pending = []
+        tiers = {"cache": 0, "alias": 0}
+
+        # Serve memoized strings from the cache, then known aliases, collect every other distinct string for encoding
+        for cleaned in dict.fromkeys(cleaned_inputs):
+            if not cleaned:
+                continue
+            key = (cleaned, threshold)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                matches[cleaned] = self.cache[key]
+                tiers["cache"] += 1
+                continue
+
+            platform_id = self.lookup(cleaned)
+            if platform_id is not None:
+                matches[cleaned] = platform_id
+                self.remember(key, platform_id)
+                tiers["alias"] += 1
+            else:
+                pending.append(cleaned)
+
+        tiers["semantic"] = len(pending)
+        record_decisions("platform", tiers)
+
+        if pending:
+            cosine_scores = cos_sim(self.embed(pending), self.corpus_embeddings)
+
+            # Find top 5 semantic candidates for every input
+            top_indices = np.argsort(-cosine_scores, axis=1, kind="stable")[:, :5]
+            top_scores = np.take_along_axis(cosine_scores, top_indices, axis=1)
+
+            for cleaned, scores, indices in zip(pending, top_scores.tolist(), top_indices.tolist()):
+                matches[cleaned] = self.resolve(cleaned, scores, indices, threshold)
+                self.remember((cleaned, threshold), matches[cleaned])
+
+        return [matches.get(cleaned, -1) for cleaned in cleaned_inputs]
+
+    def resolve(self, cleaned_input, scores, indices, threshold):
+        """
+        Picks the best semantic candidate whose version matches the input.
+
+        Args:
+            cleaned_input (str): The cleaned platform string.
+            scores (list): Candidate similarity scores, highest first.
+            indices (list): Corpus indices of the candidates.
+            threshold (float): Minimum cosine similarity score to consider a match.
 
-        # Find top 5 semantic candidates
-        query_embedding = self.model.encode(cleaned_input, convert_to_tensor=True)
-        hits = util.semantic_search(query_embedding, self.corpus_embeddings, top_k=5)[0]
+        Returns:
+            int: The platform ID if a match is found, otherwise -1.
+        """
+        input_ver = self.get_version(cleaned_input)
 
-        for hit in hits:
-            if hit['score'] < threshold:
+        for score, idx in zip(scores, indices):
+            if score < threshold:
                 continue
 
-            idx = int(hit['corpus_id'])
             candidate_id = self.platform_map[idx]
             candidate_name = self.corpus_strings[idx]
             candidate_ver = self.get_version(candidate_name)
@@ -100,12 +383,17 @@ class PlatformMatcher:
 
         return -1
 
-class GameTitleMatcher:
+class GameTitleMatcher(EmbeddingMatcher):
     """
     Reconciles local game titles (including variants) with potential IGDB candidates.
     """
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
-        self.model = SentenceTransformer(model_name)
+
+    @property
+    def version(self):
+        """
+        Identifies the matching logic and model behind a decision, changing either re-matches stored links.
+        """
+        return f"{MATCHER_VERSION}:{embedding_key(self.model_name, self.backend)}"
 
     def match(self, local_titles, igdb_candidates):
         """
@@ -119,20 +407,99 @@ class GameTitleMatcher:
         Returns:
             tuple: (best_match_dict, score)
         """
-        igdb_names = [game["name"] for game in igdb_candidates]
+        return self.match_many([(local_titles, igdb_candidates)])[0]
 
-        # Generate embeddings for both sets
-        local_embeddings = self.model.encode(local_titles, convert_to_tensor=True)
-        igdb_embeddings = self.model.encode(igdb_names, convert_to_tensor=True)
+    @timer("matcher_seconds", matcher="title")
+    def match_many(self, groups):
+        """
+        Matches many records at once, each against its own list of IGDB candidates.
+
+        A group is decided lexically, with a score of 1.0, when exactly one candidate's 
+        name equals one of its titles after normalization, or failing that has the same 
+        words in another order. For the remaining groups, all distinct titles and 
+        candidate names are embedded in one batch. Since the mean of cosine similarities 
+        equals the similarity with the mean of normalized embeddings, each group's local 
+        titles are reduced to one mean vector and every candidate is scored with a 
+        single dot product.
 
-        # Calculate similarity matrix
-        cosine_scores = util.cos_sim(local_embeddings, igdb_embeddings)
+        Args:
+            groups (list): (local_titles, igdb_candidates) tuples as accepted by match.
+
+        Returns:
+            list: (best_match_dict, score) per group, (None, 0.0) for groups without 
+                titles or candidates.
+        """
+        results = [(None, 0.0)] * len(groups)
+        active = []
+        tiers = {"exact": 0, "token_sort": 0}
+
+        for i, (local_titles, candidates) in enumerate(groups):
+            if not (local_titles and candidates):
+                continue
+
+            best, tier = self.lexical_match(local_titles, candidates)
+            if best is not None:
+                results[i] = (best, 1.0)
+                tiers[tier] += 1
+            else:
+                active.append(i)
+
+        tiers["semantic"] = len(active)
+        record_decisions("title", tiers)
+        if not active:
+            return results
+
+        # Embed every distinct string once
+        texts = list(dict.fromkeys(
+            text 
+            for i in active 
+            for text in list(groups[i][0]) + [game["name"] for game in groups[i][1]]
+        ))
+        positions = {text: j for j, text in enumerate(texts)}
+        embeddings = self.embed(texts)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        # Flatten local titles and candidates into contiguous segments, one per group
+        local_rows = [positions[title] for i in active for title in groups[i][0]]
+        local_counts = np.array([len(groups[i][0]) for i in active])
+        candidate_rows = [positions[game["name"]] for i in active for game in groups[i][1]]
+        candidate_counts = np.array([len(groups[i][1]) for i in active])
 
         # Average similarity scores across all local titles for each candidate
-        candidate_mean_scores = torch.mean(cosine_scores, dim=0)
+        local_offsets = np.concatenate(([0], np.cumsum(local_counts)[:-1]))
+        mean_embeddings = np.add.reduceat(embeddings[local_rows], local_offsets, axis=0) / local_counts[:, None]
+
+        candidate_groups = np.repeat(np.arange(len(active)), candidate_counts)
+        scores = np.einsum("ij,ij->i", mean_embeddings[candidate_groups], embeddings[candidate_rows])
+
+        # Segment argmax: order by group, then score descending, then position so ties keep the first candidate
+        order = np.lexsort((np.arange(len(scores)), -scores, candidate_groups))
+        candidate_offsets = np.concatenate(([0], np.cumsum(candidate_counts)[:-1]))
+        best = order[candidate_offsets]
+
+        for k, i in enumerate(active):
+            best_igdb_idx = int(best[k] - candidate_offsets[k])
+            results[i] = (groups[i][1][best_igdb_idx], float(scores[best[k]]))
+
+        return results
+
+    def lexical_match(self, local_titles, igdb_candidates):
+        """
+        Looks for the one candidate named like a local title, exactly or up to word order.
+
+        Returns:
+            tuple: (candidate, tier), or (None, None) if no tier singles out a candidate.
+        """
+        titles = [normalize_text(title) for title in local_titles]
+        names = [normalize_text(game.get("name") or "") for game in igdb_candidates]
 
-        best_igdb_idx = int(torch.argmax(candidate_mean_scores).item())
-        best_match = igdb_candidates[best_igdb_idx]
-        best_score = candidate_mean_scores[best_igdb_idx].item()
+        for tier, key in (("exact", lambda text: text), ("token_sort", lambda text: " ".join(sorted(text.split())))):
+            wanted = {key(title) for title in titles if title}
+            hits = [j for j, name in enumerate(names) if name and key(name) in wanted]
+            if len(hits) == 1:
+                return igdb_candidates[hits[0]], tier
+            if hits:
+                # Several games sharing the name (remakes, ports...) are left to the semantic tier
+                break
 
-        return best_match, best_score
+        return None, None
@@ -0,0 +1,163 @@
+"""
+Fuzzy title search over enriched games and catalog items.
+
+Titles are cleaned like the enrichment pipeline does, split into character
+trigrams and stored in an inverted index whose posting lists are slices of one
+flat NumPy array. A query counts shared trigrams per title with a single
+bincount and ranks by Dice coefficient, which tolerates typos and partial
+titles without running the transformer model. The top results can optionally
+be re-ranked by semantic similarity using the cached embeddings.
+
+Author: Amrit Srivastava
+"""
+
+import re
+import numpy as np
+from lib.string_matcher import clean_title, cos_sim
+
+SEARCH_LIMIT = 10       # Results returned by default
+SEARCH_MIN_SCORE = 0.3  # Minimum Dice coefficient of a result
+SEMANTIC_WEIGHT = 0.5   # Share of the semantic score in re-ranked results
+
+def normalize(title):
+    """
+    Cleans a title and folds case and inner punctuation, so 'Halo: Reach' and 'halo reach' index the same.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", clean_title(title).lower()).split())
+
+def trigrams(text):
+    """
+    Returns the distinct character trigrams of a normalized title, padded so word edges count.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TitleSearchIndex:
+    """
+    Trigram inverted index mapping titles to the documents they belong to.
+
+    Each indexed title is an entry; several entries (main and alternative titles)
+    can point at the same document, which is returned once with its best score.
+    """
+    def __init__(self, documents):
+        """
+        Args:
+            documents (iterable): (kind, id, titles) tuples, e.g. ('game', 1266, ['Assassin's Creed III']).
+        """
+        self.targets = []       # (kind, id) per document
+        self.titles = []        # Display title per entry
+        entry_targets = []
+        entry_grams = []
+
+        grams = {}
+        for kind, id, titles in documents:
+            target = len(self.targets)
+            self.targets.append((kind, id))
+
+            seen = set()
+            for title in titles:
+                text = normalize(title)
+                if not text or text in seen:
+                    continue
+                seen.add(text)
+
+                self.titles.append(clean_title(title))
+                entry_targets.append(target)
+                entry_grams.append([grams.setdefault(gram, len(grams)) for gram in trigrams(text)])
+
+        self.grams = grams
+        self.entry_targets = np.array(entry_targets, dtype=np.int32)
+        self.entry_sizes = np.array([len(g) for g in entry_grams], dtype=np.int32)
+
+        # CSR layout: postings of trigram g are postings[offsets[g]:offsets[g + 1]]
+        gram_ids = np.fromiter((g for ids in entry_grams for g in ids), dtype=np.int32, count=int(self.entry_sizes.sum()))
+        entries = np.repeat(np.arange(len(entry_grams), dtype=np.int32), self.entry_sizes)
+        order = np.argsort(gram_ids, kind="stable")
+        self.postings = entries[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(gram_ids, minlength=len(grams)))))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def search(self, query, limit=SEARCH_LIMIT, min_score=SEARCH_MIN_SCORE):
+        """
+        Ranks documents by the trigram similarity of their best matching title.
+
+        Args:
+            query (str): Partial or misspelled title.
+            limit (int): Maximum number of documents returned.
+            min_score (float): Minimum Dice coefficient of a result.
+
+        Returns:
+            list: (score, kind, id, title) tuples, best first.
+        """
+        query_trigrams = trigrams(normalize(query))
+        query_grams = [self.grams[gram] for gram in query_trigrams if gram in self.grams]
+        if not query_grams:
+            return []
+
+        hits = np.concatenate([self.postings[self.offsets[g]:self.offsets[g + 1]] for g in query_grams])
+        shared = np.bincount(hits, minlength=len(self.titles))
+
+        # Dice coefficient over the full query size, so trigrams unknown to the index still count against it.
+        # A title sharing s trigrams scores at most 2s / (query_size + s), which bounds the shared count
+        query_size = len(query_trigrams)
+        min_shared = max(1, int(np.ceil(min_score * query_size / (2 - min_score))))
+        candidates = np.flatnonzero(shared >= min_shared)
+        scores = 2.0 * shared[candidates] / (query_size + self.entry_sizes[candidates])
+
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+
+        # Several titles can belong to one document, so over-fetch before deduplicating
+        top = min(len(candidates), limit * 4)
+        if top < len(candidates):
+            selected = np.argpartition(-scores, top - 1)[:top]
+            candidates, scores = candidates[selected], scores[selected]
+        order = np.lexsort((candidates, -scores))
+
+        results = {}
+        for entry, score in zip(candidates[order].tolist(), scores[order].tolist()):
+            target = int(self.entry_targets[entry])
+            if target not in results:
+                kind, id = self.targets[target]
+                results[target] = (score, kind, id, self.titles[entry])
+                if len(results) >= limit:
+                    break
+
+        return list(results.values())
+
+    def rerank(self, query, results, matcher, weight=SEMANTIC_WEIGHT):
+        """
+        Re-orders lexical results by blending in the semantic similarity of their titles.
+
+        Args:
+            query (str): The search query.
+            results (list): Output of search.
+            matcher (EmbeddingMatcher): Matcher whose cached embeddings are used.
+            weight (float): Share of the semantic score in the final score.
+
+        Returns:
+            list: (score, kind, id, title) tuples, best first.
+        """
+        if not results:
+            return results
+
+        # Titles come from the embedding store, free-form queries are encoded without being stored
+        query_embedding = np.asarray(matcher.model.encode([clean_title(query)], convert_to_numpy=True), dtype=np.float32)
+        semantic = cos_sim(query_embedding, matcher.embed([title for _, _, _, title in results]))[0]
+
+        reranked = [
+            ((1 - weight) * score + weight * float(similarity), kind, id, title)
+            for (score, kind, id, title), similarity in zip(results, semantic)
+        ]
+        return sorted(reranked, key=lambda result: -result[0])
+
+def catalog_documents(enriched_items, dmc_items):
+    """
+    Yields the searchable titles of enriched games and catalog items.
+    """
+    for game in enriched_items:
+        yield "game", game["_id"], [game.get("name") or ""]
+    for item in dmc_items:
+        yield "item", item["_id"], item.get("title", []) + item.get("alternative_titles", [])
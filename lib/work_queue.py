@@ -0,0 +1,346 @@
+"""
+Coordination of enrichment workers through MongoDB.
+
+Unprocessed folio IDs are enqueued in the 'enrich-queue' collection. Workers,
+in any number of processes or containers, claim batches under a lease that a
+heartbeat keeps alive while they work; leases of crashed workers expire and
+their items are claimed again. IGDB requests of every worker draw from one
+rate budget stored in 'rate-budget' and hold one of a fixed number of shared
+request slots while open, so adding workers never exceeds the API limits.
+
+Author: Amrit Srivastava
+"""
+
+import asyncio
+import contextlib
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+import pymongo
+from pymongo import ReturnDocument
+from lib.api_helpers import IGDB_MAX_CONCURRENCY, REQUEST_BURST, REQUEST_LIMIT, TokenBucket
+from lib.database_helpers import get_db
+from lib.metrics import increment
+
+QUEUE_COLLECTION = "enrich-queue"
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", 300))  # Lease length, renewed by heartbeats
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 5))       # Claims before an item is marked failed
+RATE_BUDGET_COLLECTION = "rate-budget"
+SLOT_LEASE_SECONDS = 60     # Longer than an IGDB request may take, slots of crashed workers free up after it
+SLOT_POLL_INTERVAL = 0.05   # Seconds between attempts while every slot is taken
+
+# Item states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+def worker_name():
+    """
+    Returns an identifier of this process, stored on leases to tell workers apart.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """
+    Queue of folio IDs with leased, at-least-once delivery.
+
+    Documents look like {_id, status, attempts, lease_owner, lease_token,
+    lease_expires, enqueued_at, updated_at, last_error}.
+    """
+    def __init__(self, collection=QUEUE_COLLECTION, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS):
+        """
+        Args:
+            collection (str): Name of the queue collection.
+            lease_seconds (int): Seconds a claim stays valid without a heartbeat.
+            max_attempts (int): Claims after which an item is given up on.
+        """
+        self.collection = get_db()[collection]
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def ensure_indexes(self):
+        # Claims look for pending items and expired leases, completions go by lease token
+        self.collection.create_index([("status", 1), ("lease_expires", 1)])
+        self.collection.create_index("lease_token")
+
+    def enqueue(self, ids):
+        """
+        Adds items to the queue. Finished or failed items are queued again,
+        items currently leased are left to their worker.
+
+        Args:
+            ids (iterable): Folio IDs.
+
+        Returns:
+            int: Number of items that became pending.
+        """
+        now = datetime.now(timezone.utc)
+        operations = []
+        for id in ids:
+            operations.append(pymongo.UpdateOne(
+                {"_id": id},
+                {"$setOnInsert": {"status": PENDING, "attempts": 0, "enqueued_at": now, "updated_at": now}},
+                upsert=True
+            ))
+            operations.append(pymongo.UpdateOne(
+                {"_id": id, "status": {"$in": [DONE, FAILED]}},
+                {"$set": {"status": PENDING, "attempts": 0, "enqueued_at": now, "updated_at": now}}
+            ))
+
+        if not operations:
+            return 0
+
+        result = self.collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.modified_count
+
+    def claim(self, limit, owner=None):
+        """
+        Leases up to limit claimable items (pending, or leased with an expired lease).
+
+        Workers racing for the same items each get a disjoint share, since the
+        lease is only taken on items that are still claimable.
+
+        Args:
+            limit (int): Maximum number of items.
+            owner (str): Name of the claiming worker.
+
+        Returns:
+            Lease: The claimed items, or None if nothing is claimable.
+        """
+        now = datetime.now(timezone.utc)
+        expired = {"status": LEASED, "lease_expires": {"$lt": now}}
+        claimable = {"$or": [{"status": PENDING}, expired]}
+
+        # Items whose workers kept dying on them are given up on
+        self.collection.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": FAILED, "updated_at": now}}
+        )
+
+        while True:
+            ids = [doc["_id"] for doc in self.collection.find(claimable, {"_id": 1}).limit(limit)]
+            if not ids:
+                return None
+
+            token = uuid.uuid4().hex
+            self.collection.update_many(
+                {"_id": {"$in": ids}, **claimable},
+                {
+                    "$set": {
+                        "status": LEASED,
+                        "lease_owner": owner or worker_name(),
+                        "lease_token": token,
+                        "lease_expires": now + timedelta(seconds=self.lease_seconds),
+                        "updated_at": now,
+                    },
+                    "$inc": {"attempts": 1}
+                }
+            )
+
+            # Another worker may have taken every listed item first, then look again
+            claimed = [doc["_id"] for doc in self.collection.find({"lease_token": token}, {"_id": 1})]
+            if claimed:
+                increment("queue_items_total", len(claimed), result="claimed")
+                return Lease(self, token, claimed)
+
+    def counts(self):
+        """
+        Returns the number of items in each state.
+        """
+        return {doc["_id"]: doc["count"] for doc in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+
+class Lease:
+    """
+    A batch of claimed items. Use as a context manager to keep the lease alive
+    while working and to return unfinished items to the queue on exit:
+
+        with queue.claim(50) as lease:
+            process(lease.ids)
+            lease.complete()
+    """
+    def __init__(self, queue, token, ids):
+        self.queue = queue
+        self.token = token
+        self.ids = ids
+        self.stopped = threading.Event()
+        self.heartbeat_thread = None
+
+    def __enter__(self):
+        self.heartbeat_thread = threading.Thread(target=self.keep_alive, daemon=True)
+        self.heartbeat_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stopped.set()
+        self.heartbeat_thread.join()
+        # Whatever was not completed goes back to the queue, with the error if there was one
+        self.release(error=repr(exc) if exc else None)
+        return False
+
+    def keep_alive(self):
+        # Renewing three times per lease tolerates a missed heartbeat
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except pymongo.errors.PyMongoError as e:
+                # A transient failure only matters if it lasts longer than the lease
+                print(f"Lease heartbeat failed: {e}")
+
+    def heartbeat(self):
+        """
+        Extends the lease on the items still held.
+        """
+        now = datetime.now(timezone.utc)
+        self.queue.collection.update_many(
+            {"lease_token": self.token, "status": LEASED},
+            {"$set": {"lease_expires": now + timedelta(seconds=self.queue.lease_seconds), "updated_at": now}}
+        )
+
+    def complete(self, ids=None):
+        """
+        Marks items as done. Items whose lease was lost to another worker are left alone.
+
+        Args:
+            ids (list): Items to complete, all held items if None.
+        """
+        ids = self.ids if ids is None else ids
+        result = self.queue.collection.update_many(
+            {"_id": {"$in": ids}, "lease_token": self.token, "status": LEASED},
+            {"$set": {"status": DONE, "updated_at": datetime.now(timezone.utc)}, "$unset": {"last_error": ""}}
+        )
+        increment("queue_items_total", result.modified_count, result="done")
+
+    def release(self, error=None):
+        """
+        Returns the items still held to the queue, or marks them failed once they
+        have used up their attempts.
+        """
+        now = datetime.now(timezone.utc)
+        held = {"lease_token": self.token, "status": LEASED}
+        extra = {"last_error": error} if error else {}
+
+        failed = self.queue.collection.update_many(
+            {**held, "attempts": {"$gte": self.queue.max_attempts}},
+            {"$set": {"status": FAILED, "updated_at": now, **extra}}
+        )
+        released = self.queue.collection.update_many(
+            held,
+            {"$set": {"status": PENDING, "updated_at": now, **extra}, "$unset": {"lease_expires": ""}}
+        )
+        increment("queue_items_total", failed.modified_count, result="failed")
+        increment("queue_items_total", released.modified_count, result="released")
+
+class SharedRateBudget(TokenBucket):
+    """
+    Token bucket whose state lives in MongoDB, shared by every process using the same name.
+
+    The bucket is kept as a theoretical arrival time (GCRA): each reservation
+    atomically pushes it one interval past max(itself, now), computed with the
+    database clock so hosts with skewed clocks still agree. One round trip per
+    request, and concurrent workers are spaced out evenly like local callers.
+    """
+    def __init__(self, name="igdb", rate=REQUEST_LIMIT, capacity=REQUEST_BURST, collection=RATE_BUDGET_COLLECTION):
+        """
+        Args:
+            name (str): Budget identifier, workers sharing it share the rate.
+            rate (float): Requests per second across all workers.
+            capacity (int): Requests that may be sent back to back before pacing applies.
+            collection (str): Collection holding the budget documents.
+        """
+        super().__init__(rate, capacity)
+        self.name = name
+        self.collection = get_db()[collection]
+
+    def reserve(self):
+        """
+        Takes a slot from the shared budget and returns how many seconds to wait before using it.
+        """
+        interval = 1000.0 / self.rate
+        budget = self.collection.find_one_and_update(
+            {"_id": self.name},
+            [
+                {"$set": {"now": {"$toLong": "$$NOW"}}},
+                {"$set": {"tat": {"$add": [{"$max": [{"$ifNull": ["$tat", 0]}, "$now"]}, interval]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return max(0.0, (budget["tat"] - budget["now"] - self.capacity * interval) / 1000.0)
+
+    async def acquire_async(self):
+        # The reservation is a database round trip, keep it off the event loop
+        wait = await asyncio.to_thread(self.reserve)
+        if wait:
+            await asyncio.sleep(wait)
+        self.record(wait)
+        return wait
+
+class SharedRequestSlots:
+    """
+    Limit on the requests open at once across every process using the same name.
+
+    Each slot is a document in MongoDB. A request holds one under a short lease
+    for as long as it is open, so the slots of a crashed worker free themselves
+    once SLOT_LEASE_SECONDS has passed. Lease expiry uses the database clock,
+    like SharedRateBudget.
+    """
+    def __init__(self, name="igdb", slots=IGDB_MAX_CONCURRENCY, collection=RATE_BUDGET_COLLECTION):
+        """
+        Args:
+            name (str): Limit identifier, workers sharing it share the slots.
+            slots (int): Requests that may be open at once across all workers.
+            collection (str): Collection holding the slot documents.
+        """
+        self.collection = get_db()[collection]
+        self.slot_ids = [f"{name}:slot:{i}" for i in range(slots)]
+
+        # Slots are created once, free, and never removed
+        self.collection.bulk_write(
+            [pymongo.UpdateOne({"_id": id}, {"$setOnInsert": {"holder": None, "expires": None}}, upsert=True) for id in self.slot_ids],
+            ordered=False
+        )
+
+    def try_acquire(self):
+        """
+        Takes a free or expired slot.
+
+        Returns:
+            tuple: (slot_id, holder) to pass to release, None if every slot is taken.
+        """
+        holder = uuid.uuid4().hex
+        slot = self.collection.find_one_and_update(
+            {
+                "_id": {"$in": self.slot_ids},
+                "$expr": {"$or": [{"$eq": [{"$ifNull": ["$holder", None]}, None]}, {"$lt": ["$expires", "$$NOW"]}]},
+            },
+            [{"$set": {"holder": holder, "expires": {"$add": ["$$NOW", SLOT_LEASE_SECONDS * 1000]}}}],
+            projection={"_id": 1}
+        )
+        return (slot["_id"], holder) if slot else None
+
+    def release(self, slot):
+        """
+        Frees a slot, unless its lease expired and another request took it meanwhile.
+        """
+        slot_id, holder = slot
+        self.collection.update_one({"_id": slot_id, "holder": holder}, {"$set": {"holder": None, "expires": None}})
+
+    @contextlib.asynccontextmanager
+    async def hold(self):
+        """
+        Holds a slot for the duration of the block, waiting until one is free.
+        """
+        # Slot operations are database round trips, keep them off the event loop
+        while True:
+            slot = await asyncio.to_thread(self.try_acquire)
+            if slot:
+                break
+            increment("request_slot_waits_total")
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self.release, slot)
@@ -6,34 +6,156 @@ the Michigan State University library catalog with enriched metadata from IGDB.
 
 Workflow:
 1. update_dmc_catalog_data: Scrapes MSU catalog, extracts MARC21 metadata, 
-   and stores raw item data in MongoDB.
+   and stores raw item data in MongoDB. With --incremental, only records changed 
+   since the last harvest are pulled via OAI-PMH ListRecords.
 2. enrich_with_igdb: Identifies new items, performs semantic matching against 
-   the IGDB database, and stores the merged enriched results.
+   the IGDB database, and stores the merged enriched results. With --igdb-snapshot, 
+   candidates come from a local, incrementally refreshed copy of IGDB instead.
+   With --enqueue, new items are queued instead, to be enriched by any number of 
+   processes started with --worker. Items are only matched again when the fields 
+   matching reads or the matcher version changed. The enriched games are then 
+   exported as a versioned columnar snapshot (lib/export.py).
+
+Collections live in MongoDB, or in a local SQLite file with --storage sqlite (see lib/storage.py).
 
 Author: Amrit Srivastava
 """
 
-import pymongo
-import string
+import argparse
+import asyncio
+import hashlib
+import queue
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from tqdm import tqdm
 import math
+import os
+import time
+
+from lib.api_helpers import msu_catalog_api, msu_oai_metadata_many, msu_oai_list_records, chunked, igdb_bucket, OAI_WORKERS
+from lib.database_helpers import build_platforms, BulkWriter, WRITE_BATCH_SIZE
+from lib.string_matcher import PlatformMatcher, GameTitleMatcher, clean_title
+from lib.response_cache import get_response_cache
+from lib.igdb_client import AsyncIGDBClient
+from lib.igdb_snapshot import SnapshotIndex, sync_igdb_snapshot
+from lib.export import export_snapshot
+from lib.metrics import SIZE_BUCKETS, increment, observe, set_profile_stage, stage, write_reports
+from lib.storage import STORAGE_BACKEND, STORAGE_BACKENDS, get_storage
+from lib.work_queue import SharedRateBudget, SharedRequestSlots, WorkQueue, worker_name
 
-from lib.api_helpers import msu_catalog_api, msu_oai_metadata_api, query_igdb_endpoint, IGDB_URL, build_igdb_search_game_query
-from lib.database_helpers import db, fetch_unprocessed_games, build_platforms
-from lib.string_matcher import PlatformMatcher, GameTitleMatcher
+ENRICH_WINDOW = int(os.getenv("ENRICH_WINDOW", 50))      # Games whose IGDB searches are batched together
+ENRICH_IN_FLIGHT = int(os.getenv("ENRICH_IN_FLIGHT", 4)) # Windows searched concurrently
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", 200))  # Queue items claimed per lease
+WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", 30))  # Seconds between claims while others hold leases
 
-def update_dmc_catalog_data(page_limit=100, debug=False):
+def match_platform_strings(metadata, matcher):
+    """
+    Matches the edition and platform strings of many records in one batch.
+
+    Args:
+        metadata (list): Metadata dicts returned by the OAI-PMH helpers.
+        matcher (PlatformMatcher): Matcher used to guess the platform IDs.
+
+    Returns:
+        dict: Platform ID (or -1) for every distinct edition/platform string.
+    """
+    platform_strs = list({s for data in metadata for s in data["edition"] + data["platform"]})
+    return dict(zip(platform_strs, matcher.match_many(platform_strs)))
+
+def build_game(id, data, platform_matches):
+    """
+    Builds a 'dmc-items' document from parsed MARC21 metadata.
+
+    Args:
+        id (str): The catalog record identifier.
+        data (dict): Metadata returned by the OAI-PMH helpers.
+        platform_matches (dict): Platform IDs keyed by edition/platform string.
+
+    Returns:
+        dict: The document to store in 'dmc-items'.
+    """
+    # Attempt to extract platform IDs by matching text from edition and platform fields
+    platforms = {platform_matches[platform_str] for platform_str in data["edition"] + data["platform"]}
+
+    # Clean up results: -1 indicates the matcher failed to find a high-confidence ID
+    if platforms != set([-1]):
+        platforms.discard(-1)
+
+    game = {
+        "_id": id,
+        "title": data["title"],
+        "alternative_titles": data["alternative_titles"],
+        "authors": data["authors"],
+        "edition": data["edition"],
+        "platform": data["platform"],
+        # Sorted so that re-harvesting an unchanged record yields an identical document
+        "platform_id_guess": sorted(platforms),
+        "callnumber" : data["callnumber"]
+    }
+    game["input_hash"] = enrichment_input_hash(game)
+    return game
+
+def iter_catalog_pages(first_page, last_page, after=None):
+    """
+    Yields the record IDs of each page of the MSU Catalog 'video game' search.
+
+    Args:
+        first_page (int): First page to fetch.
+        last_page (int): Last page to fetch (inclusive).
+        after (str): If set, only IDs sorting after it are yielded.
+
+    Yields:
+        tuple: (page, ids)
+    """
+    for curr_page in range(first_page, last_page + 1):
+        data = msu_catalog_api(curr_page)
+        records = data.get("records", [])
+        ids = [record.get("id", "N/A") for record in records]
+        yield curr_page, [id for id in ids if after is None or id > after]
+
+def iter_page_metadata(pages, workers=OAI_WORKERS):
+    """
+    Retrieves granular MARC21 fields for every record ID on each page in parallel.
+
+    Yields:
+        tuple: (page, ids, metadata)
+    """
+    for curr_page, ids in pages:
+        yield curr_page, ids, msu_oai_metadata_many(ids, workers=workers)
+
+def iter_page_games(pages, matcher):
+    """
+    Converts fetched metadata into 'dmc-items' documents, one page at a time.
+
+    Yields:
+        tuple: (page, games)
+    """
+    for curr_page, ids, metadata in pages:
+        platform_matches = match_platform_strings(metadata, matcher)
+        games = [build_game(id, data, platform_matches) for id, data in zip(ids, metadata)]
+        yield curr_page, games
+
+@stage("update_dmc_catalog_data")
+def update_dmc_catalog_data(page_limit=100, debug=False, workers=OAI_WORKERS, batch_size=WRITE_BATCH_SIZE, storage=None):
     """
     Synchronizes the local 'dmc-items' collection with the MSU Library Catalog.
 
     Fetches game records via REST and OAI APIs, identifies the target hardware platform,
-    and performs a bulk upsert to the database.
+    and upserts them to the database in batches as pages are processed. The last 
+    completed page and record ID are checkpointed so an interrupted crawl resumes 
+    where it stopped.
 
     Args:
         page_limit (int): Maximum number of catalog pages to scan.
-        debug (bool): If True, writes results to a local JSON file instead of MongoDB.
+        debug (bool): If True, writes results to a local JSON file instead of the database.
+        workers (int): Number of concurrent OAI-PMH metadata requests.
+        batch_size (int): Number of documents per bulk write.
+        storage (Storage): Backend holding 'dmc-items', STORAGE_BACKEND if None.
     """
+    storage = storage or get_storage()
     
     # Initialize total page count based on the 'video game' genre query
     data = msu_catalog_api(1)
@@ -44,143 +166,674 @@ def update_dmc_catalog_data(page_limit=100, debug=False):
         print("No results found.")
         return
 
+    last_page = min(page_limit, total_pages)
+    first_page = 1
+
+    # Remember when the crawl began so the next incremental harvest picks up from here,
+    # an interrupted crawl keeps its original start time and continues after its checkpoint
+    state = storage.get_state("dmc-items") if not debug else {}
+    resume_after = state.get("resume_after")
+    if state.get("resume_page"):
+        # Records added or removed meanwhile shift the pages, so with an ID to resume after 
+        # the checkpointed page is listed again and only the records past that ID are fetched
+        first_page = state["resume_page"] if resume_after else state["resume_page"] + 1
+        harvest_started = state["crawl_started"]
+        print(f"Resuming interrupted crawl at page {first_page}.")
+    else:
+        harvest_started = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if not debug:
+            storage.set_state("dmc-items", crawl_started=harvest_started)
+
     # Initialize PlatformMatcher, matches a game to the platform it's available on
-    matcher = PlatformMatcher()
+    matcher = PlatformMatcher(platform_data=storage.platforms())
+
+    # Stream pages through fetch -> parse -> platform match, holding at most one page in memory
+    pages = iter_catalog_pages(first_page, last_page, after=resume_after)
+    pages = iter_page_metadata(pages, workers=workers)
+    pages = iter_page_games(pages, matcher)
 
     all_games = []
+    completed_page = None
+    completed_id = resume_after
+    in_id_order = True
 
-    # Iterate through paginated results from the MSU Catalog API
-    with tqdm(total=min(total_pages, page_limit), desc="Fetching pages", unit="page") as page_bar:
-        for curr_page in range(1, min(page_limit + 1, total_pages + 1)):
-            data = msu_catalog_api(curr_page)
-            records = data.get("records", [])
-
-            for record in tqdm(records, desc=f"Page {curr_page}", unit="record", leave=False):
-                # Retrieve granular MARC21 fields for each specific record ID
-                id = record.get("id", "N/A")
-                data = msu_oai_metadata_api(id) 
-
-                platforms = set()
-
-                # Attempt to extract platform IDs by matching text from edition and platform fields
-                for platform_str in data["edition"] + data["platform"]:
-                    platforms.add(matcher.match(platform_str))
-
-                # Clean up results: -1 indicates the matcher failed to find a high-confidence ID
-                if platforms != set([-1]):
-                    platforms.discard(-1)
-                
-                game = {
-                    "_id": id,
-                    "title": data["title"],
-                    "alternative_titles": data["alternative_titles"],
-                    "authors": data["authors"],
-                    "edition": data["edition"],
-                    "platform": data["platform"],
-                    "platform_id_guess": list(platforms),
-                    "callnumber" : data["callnumber"]
-                }
-                all_games.append(game)
+    def checkpoint():
+        # Every page added before this flush is now fully persisted. Resuming after an 
+        # ID is only safe if the server returned the records sorted by ID
+        if completed_page:
+            storage.set_state("dmc-items", resume_page=completed_page, resume_after=completed_id if in_id_order else None)
 
+    writer = BulkWriter(storage, "dmc-items", batch_size=batch_size, on_flush=checkpoint)
+
+    with tqdm(total=last_page - first_page + 1, desc="Fetching pages", unit="page") as page_bar:
+        for curr_page, games in pages:
+            if debug:
+                all_games.extend(games)
+            else:
+                writer.add(games)
+
+            ids = [game["_id"] for game in games]
+            if ids:
+                in_id_order = in_id_order and ids == sorted(ids) and (completed_id is None or completed_id <= ids[0])
+                completed_id = ids[-1]
+            completed_page = curr_page
             page_bar.update(1)
 
-    # Persist data: Replace existing records or insert new ones (Upsert)
+    matcher.save_cache()
+    print(matcher.embeddings.stats())
+
+    # Persist data: Insert new records and update only those whose content changed
     if not debug:
-        operations = [pymongo.ReplaceOne({"_id": game["_id"]}, game, upsert=True) for game in all_games]
-        result = db["dmc-items"].bulk_write(operations)
-        print(f"Upserted {result.upserted_count} new games.")
-        print(f"Updated {result.modified_count} existing games.")
+        writer.flush()
+        print(f"Upserted {writer.inserted} new games.")
+        print(f"Updated {writer.updated} existing games.")
+        print(f"Skipped {writer.unchanged} unchanged games.")
+        storage.set_state("dmc-items", last_harvest=harvest_started, resume_page=None, resume_after=None)
     else:
         with open("Database/dmc-items.json", "w", encoding="utf-8") as f:
             json.dump(all_games, f, indent=4, ensure_ascii=False)
         print("Raw catalog data written to Database/dmc-items.json")
 
-def enrich_with_igdb(debug=False):
+def remove_deleted_items(storage, folioids):
     """
-    Enriches raw MSU records with data from the Internet Game Database (IGDB).
+    Removes items withdrawn from the catalog along with their links. Games no 
+    other item is linked to are deleted too.
 
-    Uses semantic matching to link local library items to IGDB entries, 
-    enabling access to high-res covers, genres, and release dates.
+    Args:
+        storage (Storage): Backend holding the collections.
+        folioids (list): Folio IDs of the withdrawn items.
+
+    Returns:
+        int: Number of items deleted.
+    """
+    linked = storage.linked_games(folioids)
+    storage.unlink_items(linked.items())
+    storage.delete_unlinked_games(set(linked.values()))
+    return storage.delete_items(folioids)
+
+@stage("update_dmc_catalog_data_incremental")
+def update_dmc_catalog_data_incremental(storage=None):
+    """
+    Applies catalog changes made since the last successful harvest to 'dmc-items'.
+
+    Uses OAI-PMH ListRecords with a 'from' datestamp to pull only changed records 
+    in bulk, keeping video games and records already tracked in 'dmc-items'. 
+    Tracked records the server reports as deleted are removed, links included. 
+    Falls back to a full crawl when no previous harvest has been recorded.
 
     Args:
-        debug (bool): If True, logs enriched data to a local file.
+        storage (Storage): Backend holding 'dmc-items', STORAGE_BACKEND if None.
     """
-    
-    # Identify items in 'dmc-items' that have no linked record in 'enriched-items'
-    unprocessed_games = fetch_unprocessed_games()
-    enriched_games = {}
-    title_matcher = GameTitleMatcher()
+    storage = storage or get_storage()
+    last_harvest = storage.get_state("dmc-items").get("last_harvest")
+    if not last_harvest:
+        print("No previous harvest recorded, running a full crawl.")
+        update_dmc_catalog_data(storage=storage)
+        return
+
+    matcher = PlatformMatcher(platform_data=storage.platforms())
+    writer = BulkWriter(storage, "dmc-items")
+    harvest_started = None
+    deleted = []
+
+    # Day granularity is the minimum every OAI-PMH server must accept; re-listing 
+    # part of a day is harmless because unchanged records are not rewritten
+    pages = msu_oai_list_records(from_date=last_harvest[:10])
+
+    for response_date, records in tqdm(pages, desc="Harvesting changes", unit="page"):
+        harvest_started = harvest_started or response_date
+
+        # Deleted records carry no metadata, only the IDs of tracked ones are kept
+        withdrawn = [r["id"] for r in records if r["deleted"]]
+        deleted.extend(storage.existing_ids("dmc-items", withdrawn) if withdrawn else [])
+
+        # Changed records outside the video game genre are only relevant if we already track them
+        ids = [r["id"] for r in records if r["metadata"] and not r["is_game"]]
+        tracked = storage.existing_ids("dmc-items", ids) if ids else set()
+
+        records = [r for r in records if r["metadata"] and (r["is_game"] or r["id"] in tracked)]
+        platform_matches = match_platform_strings([r["metadata"] for r in records], matcher)
+        games = [build_game(r["id"], r["metadata"], platform_matches) for r in records]
+
+        writer.add(games)
+
+    matcher.save_cache()
+    print(matcher.embeddings.stats())
+    writer.flush()
+    print(f"Upserted {writer.inserted} new games.")
+    print(f"Updated {writer.updated} existing games.")
+    print(f"Skipped {writer.unchanged} unchanged games.")
+    print(f"Removed {remove_deleted_items(storage, deleted) if deleted else 0} deleted games.")
+
+    # Only advance the datestamp once the whole delta has been applied
+    if harvest_started:
+        storage.set_state("dmc-items", last_harvest=harvest_started)
+
+def clean_titles(game):
+    """
+    Combines and cleans all possible title variants of a 'dmc-items' document.
+    """
+    titles = game["title"] + game["alternative_titles"]
+    return list({clean_title(s) for s in titles})
+
+def enrichment_input_hash(game):
+    """
+    Hashes the fields of a 'dmc-items' document that enrichment reads, so an item 
+    is matched again exactly when one of them changes.
+    """
+    # Title variants are a set, sort them so the hash does not depend on their order
+    inputs = {"titles": sorted(clean_titles(game)), "platforms": sorted(game["platform_id_guess"])}
+    return hashlib.sha1(json.dumps(inputs, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def prepare_searches(games):
+    """
+    Builds the IGDB title searches for a window of games.
+
+    Returns:
+        tuple: (prepared, searches) where prepared lists (game, titles, search_count) 
+            in order and searches holds every game's (title, platforms) pairs.
+    """
+    prepared = []
+    searches = []
+
+    for game in games:
+        titles = clean_titles(game)
+        platforms = game["platform_id_guess"]
 
-    for unprocessed_game in tqdm(unprocessed_games, desc="Enriching games with IGDB"):
-        # Combine and clean all possible title variants for broader search coverage
-        titles = unprocessed_game["title"] + unprocessed_game["alternative_titles"]
-        titles = list({s.strip(string.punctuation).strip() for s in titles})
-        platforms = unprocessed_game["platform_id_guess"]
-        
         # Cannot match without both a title and a platform hint
         if not (platforms and titles):
+            prepared.append((game, titles, 0))
             continue
-        
-        igdb_candidates = {}
-        
+
         # Query IGDB for every known title variation to maximize match potential
-        for title in titles:
-            query = build_igdb_search_game_query(title, platforms)
-            igdb_results = query_igdb_endpoint(IGDB_URL, query)
-            
-            for result in igdb_results:
+        searches.extend((title, platforms) for title in titles)
+        prepared.append((game, titles, len(titles)))
+
+    return prepared, searches
+
+def split_candidates(prepared, results):
+    """
+    Splits search results back per game, deduplicating candidates by IGDB ID.
+
+    Yields:
+        tuple: (game, titles, igdb_candidates)
+    """
+    results = iter(results)
+
+    for game, titles, search_count in prepared:
+        igdb_candidates = {}
+        for _ in range(search_count):
+            for result in next(results):
                 game_id = result.get("id")
                 if game_id and game_id not in igdb_candidates:
                     igdb_candidates[game_id] = result
-        
-        if not igdb_candidates:
+
+        yield game, titles, igdb_candidates
+
+def put_until_stopped(output, item, stop):
+    """
+    Puts an item on a bounded queue, giving up once stop is set.
+
+    Returns:
+        bool: True if the item was queued, False if the consumer stopped.
+    """
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.5)
+            return True
+        except queue.Full:
             continue
-        
+    return False
+
+async def fetch_candidate_windows(windows, output, in_flight, bucket=igdb_bucket, stop=None, slots=None):
+    """
+    Searches IGDB for several windows of games concurrently, passing results on in order.
+
+    Windows are read in a thread of their own, so database cursors never block 
+    the event loop while searches are in flight.
+
+    Args:
+        windows (iterator): Lists of games.
+        output (queue.Queue): Receives one list of (game, titles, igdb_candidates) per window.
+        in_flight (int): Number of windows searched at the same time.
+        bucket (TokenBucket): Limiter pacing the IGDB requests.
+        stop (threading.Event): Set when the consumer stopped, no more windows are read or searched.
+        slots (SharedRequestSlots): Limit on open IGDB requests shared with other workers.
+    """
+    stop = stop or threading.Event()
+    loop = asyncio.get_running_loop()
+
+    async def hand_over(task):
+        return await asyncio.to_thread(put_until_stopped, output, await task, stop)
+
+    # One reader thread, SQLite streams are tied to the thread that opened them
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        async with AsyncIGDBClient(bucket=bucket, slots=slots) as client:
+            async def fetch(games):
+                prepared, searches = prepare_searches(games)
+                observe("igdb_window_searches", len(searches), SIZE_BUCKETS)
+                return list(split_candidates(prepared, await client.search_many(searches)))
+
+            pending = deque()
+            try:
+                while not stop.is_set():
+                    games = await loop.run_in_executor(reader, next, windows, None)
+                    if games is None:
+                        break
+                    pending.append(asyncio.create_task(fetch(games)))
+                    if len(pending) >= in_flight and not await hand_over(pending.popleft()):
+                        return
+
+                while pending:
+                    if not await hand_over(pending.popleft()):
+                        return
+            finally:
+                # Searches of windows nobody will read are abandoned
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+def iter_igdb_candidates(unprocessed_games, window=ENRICH_WINDOW, in_flight=ENRICH_IN_FLIGHT, bucket=igdb_bucket, slots=None):
+    """
+    Retrieves IGDB candidates for games, searching a window of games at a time.
+
+    Every title variant of every game in a window is searched through batched 
+    IGDB multiqueries. An event loop in a background thread keeps several windows 
+    in flight, so searches overlap with the matching done by the caller. If the 
+    caller stops iterating early, the background thread stops as well.
+
+    Args:
+        unprocessed_games (iterable): Documents from 'dmc-items'.
+        window (int): Number of games whose searches are batched together.
+        in_flight (int): Number of windows searched concurrently.
+        bucket (TokenBucket): Limiter pacing the IGDB requests, shared by workers in worker mode.
+        slots (SharedRequestSlots): Limit on open IGDB requests, shared by workers in worker mode.
+
+    Yields:
+        tuple: (game, titles, igdb_candidates) where igdb_candidates maps IGDB ID to 
+            result; games without a title or platform hint get no candidates.
+    """
+    output = queue.Queue(maxsize=in_flight)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            asyncio.run(fetch_candidate_windows(chunked(unprocessed_games, window), output, in_flight, bucket, stop, slots))
+            put_until_stopped(output, done, stop)
+        except BaseException as e:
+            put_until_stopped(output, e, stop)
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            item = output.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield from item
+    finally:
+        # Also reached when the caller fails or closes the generator, the producer 
+        # would otherwise wait forever for room in the queue
+        stop.set()
+
+def iter_snapshot_candidates(unprocessed_games, index, window=ENRICH_WINDOW):
+    """
+    Retrieves IGDB candidates for games from the local snapshot instead of IGDB searches.
+
+    Args:
+        unprocessed_games (iterable): Documents from 'dmc-items'.
+        index (SnapshotIndex): Nearest-neighbor index over the snapshot.
+        window (int): Number of games whose titles are embedded together.
+
+    Yields:
+        tuple: (game, titles, igdb_candidates) like iter_igdb_candidates.
+    """
+    for games in chunked(unprocessed_games, window):
+        titles = [clean_titles(game) for game in games]
+        found = index.search_many([(t, game["platform_id_guess"]) for game, t in zip(games, titles)])
+        yield from zip(games, titles, found)
+
+def build_enriched_fields(igdb_data):
+    """
+    Selects the IGDB fields stored on an 'enriched-items' record.
+    """
+    return {
+        "name": igdb_data.get("name", "Unknown Title"),
+        "cover": igdb_data.get("cover", {}),
+        "release_date": igdb_data.get("first_release_date", 0),
+        "genres": igdb_data.get("genres", []),
+        "summary": igdb_data.get("summary", ""),
+        "game_type": igdb_data.get("game_type", 0),
+        "platforms": igdb_data.get("platforms", []),
+    }
+
+def iter_title_matches(games_with_candidates, title_matcher, window=ENRICH_WINDOW):
+    """
+    Picks the best IGDB candidate for each game, matching a window of games per model call.
+
+    Args:
+        games_with_candidates (iterable): (game, titles, igdb_candidates) tuples.
+        title_matcher (GameTitleMatcher): Matcher scoring titles against candidate names.
+        window (int): Number of games matched together.
+
+    Yields:
+        tuple: (game, best_igdb_data, confidence) for every game, (game, None, 0.0) 
+            for games without candidates.
+    """
+    for batch in chunked(games_with_candidates, window):
         # Use semantic transformer to find the most likely match among candidates
-        igdb_data, confidence = title_matcher.match(titles, list(igdb_candidates.values()))
-        igdb_id = igdb_data["id"]
-        
-        # Check if this IGDB entry already exists (e.g., library has the same game on multiple platforms)
-        exists = db["enriched-items"].count_documents({"_id": igdb_id}, limit=1) > 0
-
-        # Case 1: Existing record, Link this new MSU item to the existing IGDB entry
-        if exists:
-            db["enriched-items"].update_one(
-                {"_id": igdb_id},
-                {"$addToSet": {"dmc_entries": {"folioid": unprocessed_game["_id"], "confidence": confidence}}}
-            )
-        # Case 2: New IGDB ID already in the current processing buffer, Update buffer
-        elif igdb_id in enriched_games:
-            if not any(e["folioid"] == unprocessed_game["_id"] for e in enriched_games[igdb_id]["dmc_entries"]):
-                enriched_games[igdb_id]["dmc_entries"].append({"folioid": unprocessed_game["_id"], "confidence": confidence})
-        # Case 3: Completely new entry, Create new enriched record
-        else:
-            enriched_games[igdb_id] = {
-                "_id": igdb_id,
-                "name": igdb_data.get("name", "Unknown Title"),
-                "cover": igdb_data.get("cover", {}),
-                "release_date": igdb_data.get("first_release_date", 0),
-                "genres": igdb_data.get("genres", []),
-                "summary": igdb_data.get("summary", ""),
-                "game_type": igdb_data.get("game_type", 0),
-                "platforms": igdb_data.get("platforms", []),
-                "dmc_entries": [{"folioid": unprocessed_game["_id"], "confidence": confidence}]
-            }
-    # Final Batch Insert
-    enriched_games_list = list(enriched_games.values())
-    
+        matches = title_matcher.match_many([(titles, list(c.values())) for _, titles, c in batch])
+
+        for (game, _, _), (igdb_data, confidence) in zip(batch, matches):
+            yield game, igdb_data, confidence
+
+def enrichment_record(game, igdb_id, matcher_version):
+    """
+    Builds the record stored on a 'dmc-items' document of which inputs and matcher 
+    produced its link (igdb_id is None when nothing matched).
+
+    Returns:
+        tuple: (folioid, input_hash, enrichment) as taken by Storage.record_enrichment.
+    """
+    input_hash = enrichment_input_hash(game)
+    return game["_id"], input_hash, {
+        "input_hash": input_hash,
+        "matcher_version": matcher_version,
+        "igdb_id": igdb_id,
+        "enriched_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def write_matches(matches, matcher_version, existing_ids=None, batch_size=WRITE_BATCH_SIZE, storage=None):
+    """
+    Persists title matches: links in 'enriched-items', then enrichment records in 'dmc-items'.
+
+    An item previously linked to another game (or now matching none) is removed 
+    from that game, and games left without any item are deleted. Records are 
+    only written once the links of their batch are persisted, so whatever an 
+    interrupted run did not finish is matched again.
+
+    Args:
+        matches (iterable): (game, igdb_data, confidence) tuples from iter_title_matches.
+        matcher_version (str): Version of the title matcher that made the matches.
+        existing_ids (set): IGDB IDs with an enriched record, kept up to date. 
+            Without it, new records are counted as links.
+        batch_size (int): Matches written per batch.
+        storage (Storage): Backend the matches are written to, STORAGE_BACKEND if None.
+
+    Returns:
+        dict: Number of items per outcome ('inserted', 'linked', 'unmatched', 'unlinked').
+    """
+    storage = storage or get_storage()
+    counts = {"inserted": 0, "linked": 0, "unmatched": 0, "unlinked": 0}
+    unlinked = set()
+
+    for batch in chunked(matches, batch_size):
+        links = []
+        unlinks = []
+
+        for game, igdb_data, confidence in batch:
+            igdb_id = igdb_data["id"] if igdb_data else None
+            previous = (game.get("enrichment") or {}).get("igdb_id")
+
+            # A stale link is dropped when the item now matches another game or none
+            if previous is not None and previous != igdb_id:
+                unlinks.append((game["_id"], previous))
+                unlinked.add(previous)
+                counts["unlinked"] += 1
+
+            if igdb_id is None:
+                counts["unmatched"] += 1
+                continue
+
+            links.append((game["_id"], igdb_id, build_enriched_fields(igdb_data), confidence))
+
+            if existing_ids is not None and igdb_id not in existing_ids:
+                existing_ids.add(igdb_id)
+                counts["inserted"] += 1
+            else:
+                counts["linked"] += 1
+
+        storage.unlink_items(unlinks)
+        storage.link_items(links)
+        storage.record_enrichment([
+            enrichment_record(game, igdb_data["id"] if igdb_data else None, matcher_version)
+            for game, igdb_data, _ in batch
+        ])
+
+    if unlinked:
+        deleted = storage.delete_unlinked_games(unlinked)
+        print(f"Removed {deleted} enriched games no longer matched by any item.")
+
+    return counts
+
+@stage("adopt_linked_items")
+def adopt_linked_items(matcher_version, batch_size=WRITE_BATCH_SIZE, storage=None):
+    """
+    Records the enrichment of items linked before enrichment records existed.
+
+    Their links are kept as if made by the current matcher, so upgrading does not 
+    send the whole catalog back through IGDB and the model; they are matched 
+    again once their inputs or the matcher version change. Items without a 
+    link are left to the next enrichment.
+
+    Args:
+        matcher_version (str): Version of the current title matcher.
+        batch_size (int): Items looked up per query.
+        storage (Storage): Backend holding the items, STORAGE_BACKEND if None.
+    """
+    storage = storage or get_storage()
+    adopted = 0
+
+    for games in chunked(storage.unrecorded_items(batch_size=batch_size), batch_size):
+        linked = storage.linked_games(game["_id"] for game in games)
+        records = [enrichment_record(game, linked[game["_id"]], matcher_version) for game in games if game["_id"] in linked]
+        storage.record_enrichment(records)
+        adopted += len(records)
+
+    if adopted:
+        print(f"Recorded the enrichment of {adopted} previously linked games.")
+
+@stage("enrich_with_igdb")
+def enrich_with_igdb(debug=False, window=ENRICH_WINDOW, in_flight=ENRICH_IN_FLIGHT, use_snapshot=False, storage=None):
+    """
+    Enriches raw MSU records with data from the Internet Game Database (IGDB).
+
+    Uses semantic matching to link local library items to IGDB entries, 
+    enabling access to high-res covers, genres, and release dates. Items whose 
+    matching inputs and matcher version are unchanged since their last match 
+    are skipped without any IGDB or model calls.
+
+    Args:
+        debug (bool): If True, logs enriched data to a local file.
+        window (int): Number of games whose IGDB searches are batched together.
+        in_flight (int): Number of windows searched concurrently.
+        use_snapshot (bool): If True, candidates come from the local IGDB snapshot 
+            instead of remote title searches.
+        storage (Storage): Backend holding the items and games, STORAGE_BACKEND if None.
+    """
+    storage = storage or get_storage()
+    title_matcher = GameTitleMatcher()
     if not debug:
-        if enriched_games_list:
-            db["enriched-items"].insert_many(enriched_games_list, ordered=False)
-            print(f"Successfully inserted {len(enriched_games_list)} new enriched games.")
+        adopt_linked_items(title_matcher.version, storage=storage)
+
+    # Identify items in 'dmc-items' that are new, changed, or matched by another matcher version
+    unprocessed_games = storage.unprocessed_items(title_matcher.version)
+    enriched_games = {}
+
+    if use_snapshot:
+        games_with_candidates = iter_snapshot_candidates(unprocessed_games, SnapshotIndex(title_matcher), window=window)
+    else:
+        games_with_candidates = iter_igdb_candidates(unprocessed_games, window=window, in_flight=in_flight)
+    games_with_candidates = tqdm(games_with_candidates, desc="Enriching games with IGDB", unit="game")
+
+    matches = iter_title_matches(games_with_candidates, title_matcher, window=window)
+
+    if debug:
+        for unprocessed_game, igdb_data, confidence in matches:
+            if igdb_data is None:
+                continue
+            igdb_id = igdb_data["id"]
+            entry = {"folioid": unprocessed_game["_id"], "confidence": confidence}
+
+            # Collect records locally, linking repeated IGDB IDs to the same entry
+            enriched_games.setdefault(igdb_id, {"_id": igdb_id, **build_enriched_fields(igdb_data), "dmc_entries": []})
+            if not any(e["folioid"] == entry["folioid"] for e in enriched_games[igdb_id]["dmc_entries"]):
+                enriched_games[igdb_id]["dmc_entries"].append(entry)
+    else:
+        # Known IGDB IDs are loaded once, links and enrichment records are written in batches
+        counts = write_matches(matches, title_matcher.version, existing_ids=storage.existing_ids("enriched-items"), storage=storage)
+
+    print(title_matcher.embeddings.stats())
+    print(get_response_cache().stats())
+
+    if not debug:
+        print(f"Successfully inserted {counts['inserted']} new enriched games.")
+        print(f"Linked {counts['linked']} items to existing enriched games.")
+        print(f"Found no match for {counts['unmatched']} items, unlinked {counts['unlinked']} stale matches.")
+        for result, count in counts.items():
+            increment("enriched_items_total", count, result=result)
+
+        # Signals running API servers to reload their snapshot
+        storage.set_state("enriched-items", last_enriched=datetime.now(timezone.utc).isoformat())
+
+        # Columnar snapshot for the frontend and analytics, only changed partitions are rewritten
+        export_snapshot(storage=storage)
     else:    
+        enriched_games_list = list(enriched_games.values())
         with open("Database/enriched-items.json", "w", encoding="utf-8") as f:
             json.dump(enriched_games_list, f, indent=4, ensure_ascii=False) 
             print(f"Successfully logged {len(enriched_games_list)} new enriched games to local file.")
 
 
+@stage("enqueue_unprocessed_games")
+def enqueue_unprocessed_games():
+    """
+    Queues every item that needs to be (re-)enriched for the enrichment workers.
+    """
+    storage = get_storage("mongodb")
+    work_queue = WorkQueue()
+    work_queue.ensure_indexes()
+    matcher_version = GameTitleMatcher().version
+    adopt_linked_items(matcher_version, storage=storage)
+
+    queued = 0
+    for games in chunked(storage.unprocessed_items(matcher_version), WRITE_BATCH_SIZE):
+        queued += work_queue.enqueue(game["_id"] for game in games)
+
+    print(f"Queued {queued} games for enrichment.")
+    print(work_queue.counts())
+
+@stage("enrich_worker")
+def run_enrichment_worker(batch_size=WORKER_BATCH_SIZE, window=ENRICH_WINDOW, in_flight=ENRICH_IN_FLIGHT, use_snapshot=False, poll_interval=WORKER_POLL_INTERVAL):
+    """
+    Enriches queued items until the queue is drained, alongside any number of other workers.
+
+    Each leased batch goes through the same candidate search and title matching 
+    as enrich_with_igdb. IGDB requests draw from a rate budget and request slots 
+    shared through MongoDB, and links and enrichment records are written idempotently before 
+    the batch is completed, so a batch re-run after a crash does not duplicate anything. 
+    A batch that fails goes back to the queue and the worker carries on with the next.
+
+    Args:
+        batch_size (int): Items claimed per lease.
+        window (int): Number of games whose IGDB searches are batched together.
+        in_flight (int): Number of windows searched concurrently.
+        use_snapshot (bool): If True, candidates come from the local IGDB snapshot.
+        poll_interval (int): Seconds to wait for leases held by other workers to finish or expire.
+    """
+    storage = get_storage("mongodb")
+    work_queue = WorkQueue()
+    budget = SharedRateBudget()
+    slots = SharedRequestSlots()
+    title_matcher = GameTitleMatcher()
+    index = SnapshotIndex(title_matcher) if use_snapshot else None
+    processed = 0
+    counts = {}
+
+    with tqdm(desc="Enriching queued games", unit="game") as bar:
+        while True:
+            lease = work_queue.claim(batch_size)
+            if lease is None:
+                # Leases held by other workers may still expire and need picking up
+                if not work_queue.counts().get("leased"):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            try:
+                with lease:
+                    games = storage.find_items(lease.ids)
+
+                    if use_snapshot:
+                        games_with_candidates = iter_snapshot_candidates(games, index, window=window)
+                    else:
+                        games_with_candidates = iter_igdb_candidates(games, window=window, in_flight=in_flight, bucket=budget, slots=slots)
+
+                    # Links and records are persisted before the items are marked done
+                    matches = iter_title_matches(games_with_candidates, title_matcher, window=window)
+                    for result, count in write_matches(matches, title_matcher.version, storage=storage).items():
+                        counts[result] = counts.get(result, 0) + count
+                    lease.complete()
+            except Exception as e:
+                # Leaving the lease returned the batch to the queue with the error, items out 
+                # of attempts are marked failed; back off before claiming again
+                print(f"Failed to enrich a batch of {len(lease.ids)} queued games: {e!r}")
+                increment("worker_batch_failures_total")
+                time.sleep(poll_interval)
+                continue
+
+            processed += len(lease.ids)
+            bar.update(len(lease.ids))
+
+    print(f"Processed {processed} queued games: {counts}")
+    print(title_matcher.embeddings.stats())
+    for result, count in counts.items():
+        increment("enriched_items_total", count, result=result)
+
+    # Signals running API servers to reload their snapshot
+    if processed:
+        storage.set_state("enriched-items", last_enriched=datetime.now(timezone.utc).isoformat())
+
 if __name__ == "__main__":
-    # Standard operational flow
-    build_platforms()
-    update_dmc_catalog_data()
-    enrich_with_igdb()
+    parser = argparse.ArgumentParser(description="Synchronize the MSU video game collection with IGDB.")
+    parser.add_argument("--incremental", action="store_true", help="Only harvest catalog records changed since the last run")
+    parser.add_argument("--refresh-igdb-cache", action="store_true", help="Ignore cached IGDB responses (fresh ones are still stored)")
+    parser.add_argument("--igdb-snapshot", action="store_true", help="Refresh the local IGDB snapshot and match against it instead of searching IGDB")
+    parser.add_argument("--enqueue", action="store_true", help="Queue unprocessed games for workers instead of enriching them in this process")
+    parser.add_argument("--worker", action="store_true", help="Only enrich queued games, alongside any number of other workers")
+    parser.add_argument("--profile-stage", help="Run one stage (e.g. enrich_with_igdb) under cProfile")
+    parser.add_argument("--storage", choices=STORAGE_BACKENDS, default=STORAGE_BACKEND, help="Where the collections are stored")
+    args = parser.parse_args()
+
+    # The work queue, rate budget and IGDB snapshot are shared through MongoDB
+    if args.storage != "mongodb" and (args.worker or args.enqueue or args.igdb_snapshot):
+        parser.error("--worker, --enqueue and --igdb-snapshot require --storage mongodb")
+    storage = get_storage(args.storage)
+
+    if args.refresh_igdb_cache:
+        get_response_cache().bypass = True
+    if args.profile_stage:
+        set_profile_stage(args.profile_stage)
+
+    # Standard operational flow, metrics are written even if a stage fails
+    try:
+        storage.ensure_indexes()
+        if args.worker:
+            run_enrichment_worker(use_snapshot=args.igdb_snapshot)
+        else:
+            build_platforms(storage=storage)
+            if args.incremental:
+                update_dmc_catalog_data_incremental(storage=storage)
+            else:
+                update_dmc_catalog_data(storage=storage)
+            if args.igdb_snapshot:
+                sync_igdb_snapshot(GameTitleMatcher())
+            if args.enqueue:
+                enqueue_unprocessed_games()
+            else:
+                enrich_with_igdb(use_snapshot=args.igdb_snapshot, storage=storage)
+    finally:
+        write_reports(worker=worker_name() if args.worker else None)
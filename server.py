@@ -0,0 +1,218 @@
+"""
+Read-only HTTP API over the enriched MSU video game collection.
+
+Serves from an in-memory CatalogIndex instead of querying MongoDB per request,
+and reloads it in the background once a nightly enrich_with_igdb run finishes.
+
+Endpoints:
+    GET /games?genre=&platform=&year=&offset=&limit=  filtered, paginated game list
+    GET /games/<igdb_id>                              one enriched game
+    GET /items/<folio_id>                             one catalog item and its linked game
+    GET /search?q=&limit=&semantic=                   fuzzy title search, optionally re-ranked semantically
+    GET /health                                       snapshot size and marker
+
+Every successful response carries the snapshot's ETag, requests with a
+matching If-None-Match get an empty 304 instead. Invalid requests and
+unknown records are answered with 400 and 404 whatever the client holds.
+
+Author: Amrit Srivastava
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from lib.catalog_index import enrichment_marker, load_catalog_index
+from lib.title_search import SEARCH_LIMIT
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", 8000))
+API_RELOAD_INTERVAL = float(os.getenv("API_RELOAD_INTERVAL", 60))  # Seconds between checks for a finished enrichment run
+PAGE_LIMIT = 50       # Default page size
+MAX_PAGE_LIMIT = 500  # Largest page a client may request
+
+class BadRequest(Exception):
+    pass
+
+class CatalogHandler(BaseHTTPRequestHandler):
+    """
+    Routes GET requests to the server's current catalog snapshot.
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients reuse connections
+    disable_nagle_algorithm = True  # Headers and body are separate writes, don't let the body wait for an ACK
+
+    def do_GET(self):
+        # Take one reference, a reload swapping the snapshot mid-request cannot mix versions
+        index = self.server.index
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+
+        try:
+            render = self.route(index, parts, parse_qs(url.query))
+        except BadRequest as e:
+            return self.send_error_body(400, str(e))
+
+        if render is None:
+            return self.send_error_body(404, "Not found")
+
+        # Only a request that would succeed is answered as not modified
+        if self.headers.get("If-None-Match") == index.etag:
+            return self.send_body(b"", index.etag, status=304)
+        self.send_body(render(), index.etag)
+
+    def route(self, index, parts, query):
+        """
+        Validates a request and looks up the record it names.
+
+        Pages and searches are only built by the returned function, so a 
+        client holding the current snapshot does not pay for them.
+
+        Returns:
+            callable: Builds the response body, None if there is nothing at this path.
+        """
+        if parts == ["games"]:
+            params = self.page_params(query)
+            return lambda: index.page(**params)
+        elif parts == ["search"]:
+            return self.search(index, query)
+        elif len(parts) == 2 and parts[0] == "games":
+            body = index.game(self.int_param("igdb_id", parts[1]))
+        elif len(parts) == 2 and parts[0] == "items":
+            body = index.item(parts[1])
+        elif parts == ["health"]:
+            body = json.dumps({"games": len(index), "items": len(index.items), "marker": index.marker}).encode("utf-8")
+        else:
+            body = None
+
+        return None if body is None else lambda: body
+
+    def int_param(self, name, value, minimum=0):
+        try:
+            value = int(value)
+        except ValueError:
+            raise BadRequest(f"{name} must be an integer")
+        if value < minimum:
+            raise BadRequest(f"{name} must be at least {minimum}")
+        return value
+
+    def page_params(self, query):
+        """
+        Validates the filters and pagination of a /games request.
+        """
+        params = {name: values[-1] for name, values in query.items()}
+        unknown = set(params) - {"genre", "platform", "year", "offset", "limit"}
+        if unknown:
+            raise BadRequest(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+        return {
+            "genre": params.get("genre"),
+            "platform": params.get("platform"),
+            "year": params.get("year"),
+            "offset": self.int_param("offset", params.get("offset", 0)),
+            "limit": min(self.int_param("limit", params.get("limit", PAGE_LIMIT), minimum=1), MAX_PAGE_LIMIT),
+        }
+
+    def search(self, index, query):
+        """
+        Validates a /search request, returns the function running it.
+        """
+        params = {name: values[-1] for name, values in query.items()}
+        if not params.get("q", "").strip():
+            raise BadRequest("q is required")
+
+        limit = min(self.int_param("limit", params.get("limit", SEARCH_LIMIT), minimum=1), MAX_PAGE_LIMIT)
+        semantic = params.get("semantic", "").lower() in ("1", "true", "yes")
+        return lambda: index.search(params["q"], limit, matcher=self.server.title_matcher() if semantic else None)
+
+    def send_body(self, body, etag, status=200):
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, status, message):
+        body = json.dumps({"error": message}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Access logs would dominate the output under load
+        pass
+
+class CatalogServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the current catalog snapshot.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, index, loader=load_catalog_index, marker=enrichment_marker):
+        """
+        Args:
+            address (tuple): (host, port) to listen on.
+            index (CatalogIndex): Initial snapshot.
+            loader (callable): Builds a fresh snapshot.
+            marker (callable): Returns the current enrichment marker.
+        """
+        super().__init__(address, CatalogHandler)
+        self.index = index
+        self.loader = loader
+        self.marker = marker
+        self.matcher = None
+        self.matcher_lock = threading.Lock()
+
+    def title_matcher(self):
+        """
+        Returns the matcher used for semantic re-ranking, created on the first semantic search.
+        """
+        with self.matcher_lock:
+            if self.matcher is None:
+                from lib.string_matcher import GameTitleMatcher
+                self.matcher = GameTitleMatcher()
+            return self.matcher
+
+    def watch(self, interval=API_RELOAD_INTERVAL):
+        """
+        Starts a background thread reloading the snapshot whenever the enrichment marker changes.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.marker() != self.index.marker:
+                        self.reload()
+                except Exception as e:
+                    # Keep serving the current snapshot if the database is unreachable
+                    print(f"Catalog reload failed: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def reload(self):
+        """
+        Builds a new snapshot and swaps it in.
+        """
+        start = time.perf_counter()
+        self.index = self.loader()
+        print(f"Reloaded {len(self.index)} games in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the enriched game catalog over HTTP.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    server = CatalogServer((args.host, args.port), load_catalog_index())
+    server.watch()
+    print(f"Serving {len(server.index)} games on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -5,7 +5,7 @@ import json
 # TODO : this will get moved to an admin front end because a developer isn't responsible
 # for erroneous results
 
-unprocessed_games = fetch_unprocessed_games()
+unprocessed_games = list(fetch_unprocessed_games(GameTitleMatcher().version))
 with open("Tests/unprocessed_games.json", "w", encoding="utf-8") as f:
     json.dump(unprocessed_games, f, indent=4, ensure_ascii=False)
 
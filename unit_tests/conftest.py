@@ -0,0 +1,67 @@
+"""
+Stubs and fixtures shared by the unit tests.
+
+Author: Amrit Srivastava
+"""
+
+import pytest
+import lib.database_helpers as database_helpers
+import main
+from lib.storage import SQLiteStorage
+
+class StubPlatformMatcher:
+    """
+    Stands in for the embedding model, every platform string is left unmatched.
+    """
+    def __init__(self, platform_data=None):
+        self.embeddings = self
+
+    def match_many(self, strings):
+        return [-1] * len(strings)
+
+    def save_cache(self):
+        pass
+
+    def stats(self):
+        return "stub embeddings"
+
+def item(id, **fields):
+    """
+    Builds a 'dmc-items' document with the fields enrichment reads.
+
+    Args:
+        id: Folio ID of the item, also used in its title and input hash.
+        **fields: Fields to add or override.
+    """
+    return {"_id": id, "title": [f"Game {id}"], "alternative_titles": [], "platform_id_guess": [6],
+            "input_hash": f"hash-{id}", **fields}
+
+def catalog_item(id):
+    """
+    Builds a 'dmc-items' document as the catalog crawl stores it, with its real input hash.
+    """
+    game = item(id, authors=[], edition=[], platform=[], platform_id_guess=[], callnumber="")
+    game["input_hash"] = main.enrichment_input_hash(game)
+    return game
+
+@pytest.fixture(name="item")
+def item_fixture():
+    return item
+
+@pytest.fixture(name="catalog_item")
+def catalog_item_fixture():
+    return catalog_item
+
+@pytest.fixture
+def stub_platform_matcher(monkeypatch):
+    monkeypatch.setattr(main, "PlatformMatcher", StubPlatformMatcher)
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    return SQLiteStorage(str(tmp_path / "pipeline.sqlite"))
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setattr(database_helpers, "_client", mongomock.MongoClient())
+    return database_helpers.get_db()
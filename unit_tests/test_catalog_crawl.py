@@ -0,0 +1,67 @@
+"""
+Tests of the checkpointed full crawl of the MSU catalog.
+
+Author: Amrit Srivastava
+"""
+
+import pytest
+import main
+
+class StubCatalog:
+    """
+    Pages through a list of record IDs like the catalog search, optionally failing on one page.
+    """
+    def __init__(self, ids):
+        self.ids = ids
+        self.fail_on = None
+        self.requested = []
+
+    def search(self, page, limit=100):
+        return {"resultCount": len(self.ids), "records": [{"id": id} for id in self.ids[(page - 1) * limit:page * limit]]}
+
+    def metadata_many(self, ids, workers=None):
+        if self.fail_on and self.fail_on in ids:
+            raise ConnectionError("catalog went away")
+        self.requested.extend(ids)
+        return [{"title": [f"Game {id}"], "alternative_titles": [], "authors": [], "edition": [], "platform": [], "callnumber": ""}
+                for id in ids]
+
+@pytest.fixture
+def catalog(stub_platform_matcher, monkeypatch):
+    catalog = StubCatalog([f"id-{n:03d}" for n in range(300)])
+    monkeypatch.setattr(main, "msu_catalog_api", catalog.search)
+    monkeypatch.setattr(main, "msu_oai_metadata_many", catalog.metadata_many)
+    return catalog
+
+@pytest.fixture
+def storage(sqlite_storage):
+    return sqlite_storage
+
+def interrupted_crawl(catalog, storage):
+    catalog.fail_on = catalog.ids[200]  # First record of page 3
+    with pytest.raises(ConnectionError):
+        main.update_dmc_catalog_data(batch_size=100, storage=storage)
+    catalog.fail_on = None
+    catalog.requested = []
+
+def test_resumed_crawl_misses_no_record_when_earlier_ones_were_removed(catalog, storage):
+    interrupted_crawl(catalog, storage)
+    assert storage.get_state("dmc-items")["resume_after"] == "id-099"
+
+    # Withdrawn records shift every later record to an earlier page
+    catalog.ids = catalog.ids[10:]
+    main.update_dmc_catalog_data(batch_size=100, storage=storage)
+
+    assert catalog.requested == catalog.ids[90:]
+    assert set(catalog.ids) <= storage.existing_ids("dmc-items")
+    assert storage.get_state("dmc-items")["resume_after"] is None
+
+def test_crawl_out_of_id_order_resumes_at_the_next_page(catalog, storage):
+    catalog.ids.reverse()
+    interrupted_crawl(catalog, storage)
+
+    state = storage.get_state("dmc-items")
+    assert (state["resume_page"], state["resume_after"]) == (1, None)
+
+    main.update_dmc_catalog_data(batch_size=100, storage=storage)
+    assert catalog.requested == catalog.ids[100:]
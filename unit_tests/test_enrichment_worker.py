@@ -0,0 +1,71 @@
+"""
+Tests of enrichment workers draining the shared queue.
+
+Author: Amrit Srivastava
+"""
+
+from datetime import datetime, timezone
+import pytest
+import main
+from lib.work_queue import QUEUE_COLLECTION, WorkQueue
+
+class StubTitleMatcher:
+    """
+    Stands in for the embedding model, no game is matched.
+    """
+    version = "test"
+
+    def __init__(self):
+        self.embeddings = self
+
+    def stats(self):
+        return "stub embeddings"
+
+@pytest.fixture
+def db(mongo_db, item, monkeypatch):
+    db = mongo_db
+    ids = ["a", "b", "c", "d"]
+    db["dmc-items"].insert_many([item(id) for id in ids])
+    now = datetime.now(timezone.utc)
+    db[QUEUE_COLLECTION].insert_many([{"_id": id, "status": "pending", "attempts": 0, "enqueued_at": now} for id in ids])
+
+    # The shared budget and slots rely on the database clock, which mongomock lacks
+    monkeypatch.setattr(main, "SharedRateBudget", lambda: None)
+    monkeypatch.setattr(main, "SharedRequestSlots", lambda: None)
+    monkeypatch.setattr(main, "GameTitleMatcher", StubTitleMatcher)
+    monkeypatch.setattr(main, "iter_title_matches", lambda candidates, matcher, window: ((game, None, 0.0) for game, _, _ in candidates))
+    monkeypatch.setattr(main, "write_matches", lambda matches, version, storage: {"unmatched": len(list(matches))})
+    return db
+
+def failing_search(should_fail):
+    """
+    Returns an iter_igdb_candidates replacement failing the batches should_fail picks.
+    """
+    calls = []
+
+    def search(games, window, in_flight, bucket, slots):
+        ids = [game["_id"] for game in games]
+        calls.append(ids)
+        if should_fail(ids, len(calls)):
+            raise ConnectionError("IGDB retries exhausted")
+        return ((game, [], {}) for game in games)
+    return search
+
+def statuses(db):
+    return {doc["_id"]: doc["status"] for doc in db[QUEUE_COLLECTION].find()}
+
+def test_a_failed_batch_is_released_and_retried(db, monkeypatch):
+    monkeypatch.setattr(main, "iter_igdb_candidates", failing_search(lambda ids, call: call == 1))
+
+    main.run_enrichment_worker(batch_size=2, poll_interval=0)
+
+    assert statuses(db) == dict.fromkeys("abcd", "done")
+
+def test_a_batch_failing_every_attempt_is_marked_failed(db, monkeypatch):
+    monkeypatch.setattr(main, "iter_igdb_candidates", failing_search(lambda ids, call: "a" in ids))
+
+    main.run_enrichment_worker(batch_size=2, poll_interval=0)
+
+    status = statuses(db)
+    assert status["a"] == "failed" and status["c"] == status["d"] == "done"
+    assert db[QUEUE_COLLECTION].find_one({"_id": "a"})["attempts"] == WorkQueue().max_attempts
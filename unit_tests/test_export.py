@@ -0,0 +1,81 @@
+"""
+Tests of the columnar export of 'enriched-items'.
+
+Author: Amrit Srivastava
+"""
+
+import os
+import pytest
+from lib import export
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+PARTITIONS = 4
+
+GAMES = {
+    8: {"name": "Halo", "release_date": 1005091200, "genres": [{"id": 5, "name": "Shooter"}], "platforms": [11]},
+    13: {"name": "Fable", "release_date": None, "genres": [], "platforms": [11, 6]},
+    14: {"name": "Okami", "release_date": 1145577600, "genres": [31], "platforms": [8]},
+}
+
+@pytest.fixture
+def storage(sqlite_storage):
+    sqlite_storage.link_items([
+        ("halo-1", 8, GAMES[8], 0.95),
+        ("halo-2", 8, GAMES[8], 0.8),
+        ("fable", 13, GAMES[13], 0.9),
+        ("okami", 14, GAMES[14], 1.0),
+    ])
+    return sqlite_storage
+
+def export_to(storage, tmp_path, full=False):
+    return export.export_snapshot(storage=storage, full=full, export_dir=str(tmp_path / "export"), partitions=PARTITIONS)
+
+def read_table(version_dir, table):
+    return pa.concat_tables([
+        pq.read_table(export.partition_path(version_dir, table, partition))
+        for partition in range(PARTITIONS)
+    ]).sort_by("igdb_id" if table == "games" else "folioid").to_pylist()
+
+def test_export_reads_back_and_joins(storage, tmp_path):
+    version_dir = export_to(storage, tmp_path)
+
+    assert export.latest_version(str(tmp_path / "export")) == version_dir
+    assert read_table(version_dir, "games") == [
+        {"igdb_id": 8, "name": "Halo", "release_date": 1005091200, "genre_ids": [5], "platform_ids": [11]},
+        {"igdb_id": 13, "name": "Fable", "release_date": None, "genre_ids": [], "platform_ids": [11, 6]},
+        {"igdb_id": 14, "name": "Okami", "release_date": 1145577600, "genre_ids": [31], "platform_ids": [8]},
+    ]
+    assert read_table(version_dir, "links") == [
+        {"folioid": "fable", "igdb_id": 13, "confidence": 0.9},
+        {"folioid": "halo-1", "igdb_id": 8, "confidence": 0.95},
+        {"folioid": "halo-2", "igdb_id": 8, "confidence": 0.8},
+        {"folioid": "okami", "igdb_id": 14, "confidence": 1.0},
+    ]
+
+    joined = export.load_joined_view(version_dir).sort_by("folioid").to_pylist()
+    assert [(row["folioid"], row["igdb_id"], row["name"], row["confidence"]) for row in joined] == [
+        ("fable", 13, "Fable", 0.9),
+        ("halo-1", 8, "Halo", 0.95),
+        ("halo-2", 8, "Halo", 0.8),
+        ("okami", 14, "Okami", 1.0),
+    ]
+
+def test_unchanged_partitions_are_reused_by_the_next_export(storage, tmp_path):
+    first = export_to(storage, tmp_path)
+    assert export_to(storage, tmp_path) == first  # Nothing changed, no new version
+
+    storage.link_items([("fable-2", 13, GAMES[13], 0.7)])
+    second = export_to(storage, tmp_path)
+
+    changed = 13 % PARTITIONS
+    assert export.read_manifest(second)["rewritten"] == [changed]
+    for partition in range(PARTITIONS):
+        for table in export.TABLES:
+            reused = os.path.samefile(export.partition_path(first, table, partition), export.partition_path(second, table, partition))
+            assert reused == (partition != changed)
+
+    # A full export rewrites every partition
+    third = export_to(storage, tmp_path, full=True)
+    assert export.read_manifest(third)["rewritten"] == list(range(PARTITIONS))
@@ -0,0 +1,64 @@
+"""
+Tests of the background IGDB candidate search.
+
+Author: Amrit Srivastava
+"""
+
+import threading
+import time
+import pytest
+import main
+
+class StubIGDBClient:
+    """
+    Answers every search with one candidate named like the searched title.
+    """
+    def __init__(self, bucket=None, slots=None):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def search_many(self, searches):
+        return [[{"id": hash(title) % 1000 + 1, "name": title}] for title, _ in searches]
+
+@pytest.fixture(autouse=True)
+def stub_client(monkeypatch):
+    monkeypatch.setattr(main, "AsyncIGDBClient", StubIGDBClient)
+
+def producer_threads():
+    return {thread for thread in threading.enumerate() if thread.name.endswith("(produce)")}
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+def test_every_game_is_yielded_in_order(item):
+    games = [item(str(id)) for id in range(25)]
+
+    results = list(main.iter_igdb_candidates(iter(games), window=4, in_flight=2))
+
+    assert [game["_id"] for game, _, _ in results] == [game["_id"] for game in games]
+    assert all(len(candidates) == 1 for _, _, candidates in results)
+
+def test_producer_stops_when_the_consumer_stops_early(item):
+    read = []
+
+    def games():
+        for id in range(10_000):
+            read.append(id)
+            yield item(str(id))
+
+    before = producer_threads()
+    candidates = main.iter_igdb_candidates(games(), window=1, in_flight=1)
+    next(candidates)
+    candidates.close()
+
+    # The producer gives up on the full queue instead of waiting for a consumer forever
+    assert wait_for(lambda: not (producer_threads() - before))
+    assert len(read) < 10
@@ -0,0 +1,91 @@
+"""
+Tests of the local IGDB snapshot sync.
+
+Author: Amrit Srivastava
+"""
+
+import re
+import pytest
+import lib.igdb_snapshot as igdb_snapshot
+from lib.igdb_snapshot import SNAPSHOT_COLLECTION, sync_igdb_snapshot
+
+class StubIGDB:
+    """
+    Answers snapshot pages from a dict of games, like IGDB's /games endpoint.
+    """
+    def __init__(self, games):
+        self.games = games
+        self.queries = []
+
+    def query(self, url, query, use_cache=True):
+        self.queries.append(query)
+        after_id = int(re.search(r"id > (\d+)", query).group(1))
+        since = re.search(r"updated_at >= (\d+)", query)
+        limit = int(re.search(r"limit (\d+)", query).group(1))
+        fields = re.search(r"fields ([^;]+);", query).group(1).strip()
+
+        page = [
+            game if fields != "id" else {"id": game["id"]}
+            for id, game in sorted(self.games.items())
+            if id > after_id and (since is None or game["updated_at"] >= int(since.group(1)))
+        ]
+        return page[:limit]
+
+class MongomockWrites:
+    """
+    Writes the snapshot one document at a time, mongomock cannot run pymongo's bulk writes.
+    """
+    name = "mongodb"
+
+    def __init__(self, db):
+        self.db = db
+
+    def upsert_changed(self, collection, documents):
+        for doc in documents:
+            self.db[collection].replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        return len(documents), 0, 0
+
+def game(id, updated_at=100):
+    return {"id": id, "name": f"Game {id}", "platforms": [6], "updated_at": updated_at}
+
+@pytest.fixture
+def igdb(mongo_db, monkeypatch):
+    igdb = StubIGDB({id: game(id) for id in (1, 2, 3)})
+    monkeypatch.setattr(igdb_snapshot, "query_igdb_endpoint", igdb.query)
+    monkeypatch.setattr(igdb_snapshot, "platforms_in_db", lambda: [{"_id": 6}])
+    monkeypatch.setattr(igdb_snapshot, "get_storage", lambda backend: MongomockWrites(mongo_db))
+
+    sync_igdb_snapshot()
+    igdb.queries.clear()
+    return igdb
+
+def snapshot_ids(mongo_db):
+    return sorted(doc["_id"] for doc in mongo_db[SNAPSHOT_COLLECTION].find())
+
+def test_incremental_syncs_between_reconciles_keep_deleted_games(igdb, mongo_db):
+    del igdb.games[2]
+    igdb.games[3] = game(3, updated_at=200)
+
+    sync_igdb_snapshot()
+
+    assert snapshot_ids(mongo_db) == [1, 2, 3]
+    assert all("updated_at >= 100" in query for query in igdb.queries)
+
+def test_reconcile_drops_games_gone_from_igdb(igdb, mongo_db, monkeypatch):
+    monkeypatch.setattr(igdb_snapshot, "SNAPSHOT_RECONCILE_DAYS", 0)
+    del igdb.games[2]
+    igdb.games[4] = game(4, updated_at=200)
+
+    sync_igdb_snapshot()
+
+    assert snapshot_ids(mongo_db) == [1, 3, 4]
+    # The updated games are downloaded, then only the IDs of every game are listed
+    assert ["fields id;" in query for query in igdb.queries] == [False, True]
+
+def test_full_download_drops_games_gone_from_igdb(igdb, mongo_db):
+    del igdb.games[1]
+
+    sync_igdb_snapshot(full=True)
+
+    assert snapshot_ids(mongo_db) == [2, 3]
+    assert len(igdb.queries) == 1
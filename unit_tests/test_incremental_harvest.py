@@ -0,0 +1,73 @@
+"""
+Tests of the incremental OAI-PMH harvest of 'dmc-items'.
+
+Author: Amrit Srivastava
+"""
+
+import os
+import pytest
+import main
+import lib.metrics as metrics_module
+from lib.metrics import MetricsRegistry
+from lib.marc import OAIStream
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def list_fixture_pages(name):
+    """
+    Returns a msu_oai_list_records replacement serving one fixture page.
+    """
+    def list_records(from_date=None, until=None):
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            stream = OAIStream(f.read())
+        records = list(stream)
+        yield stream.response_date, records
+    return list_records
+
+@pytest.fixture
+def storage(sqlite_storage, catalog_item, stub_platform_matcher, monkeypatch):
+    monkeypatch.setattr(main, "msu_oai_list_records", list_fixture_pages("oai_deleted_page.xml"))
+
+    storage = sqlite_storage
+    storage.upsert_changed("dmc-items", [catalog_item("withdrawn"), catalog_item("kept"), catalog_item("shared")])
+    storage.link_items([
+        ("withdrawn", 1, {"name": "Only withdrawn"}, 0.9),
+        ("kept", 2, {"name": "Kept"}, 0.9),
+        ("shared", 2, {"name": "Kept"}, 0.8),
+    ])
+    storage.set_state("dmc-items", last_harvest="2026-01-31T00:00:00Z")
+    return storage
+
+def test_deleted_records_are_removed_with_their_links(storage):
+    main.update_dmc_catalog_data_incremental(storage=storage)
+
+    assert storage.existing_ids("dmc-items") == {"kept", "shared"}
+    assert storage.linked_games(["withdrawn", "kept", "shared"]) == {"kept": 2, "shared": 2}
+
+    # The game only the withdrawn item was linked to goes with it
+    games = {game["_id"]: game for game in storage.iter_documents("enriched-items")}
+    assert list(games) == [2]
+    assert [entry["folioid"] for entry in games[2]["dmc_entries"]] == ["kept", "shared"]
+
+def test_changed_records_are_still_applied(storage):
+    main.update_dmc_catalog_data_incremental(storage=storage)
+
+    kept = next(doc for doc in storage.iter_documents("dmc-items") if doc["_id"] == "kept")
+    assert kept["title"] == ["Game kept (Remastered)"]
+    assert kept["needs_enrichment"] is True
+    assert storage.get_state("dmc-items")["last_harvest"] == "2026-02-01T06:00:00Z"
+
+def test_deleted_records_in_the_fixture_parse_without_metadata():
+    with open(os.path.join(FIXTURES, "oai_deleted_page.xml"), "rb") as f:
+        records = list(OAIStream(f.read()))
+
+    assert [(r["id"], r["deleted"], r["metadata"]) for r in records[:2]] == [("withdrawn", True, None), ("never-tracked", True, None)]
+    assert records[2]["deleted"] is False and records[2]["is_game"]
+
+def test_the_harvest_is_timed_as_a_stage(storage, monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+
+    main.update_dmc_catalog_data_incremental(storage=storage)
+
+    assert registry.histograms[("stage_seconds", (("stage", "update_dmc_catalog_data_incremental"),))].count == 1
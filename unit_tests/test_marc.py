@@ -0,0 +1,64 @@
+"""
+Tests of the streaming OAI-PMH/MARC21 parser.
+
+Author: Amrit Srivastava
+"""
+
+import os
+import xml.etree.ElementTree
+import pytest
+import lib.marc as marc
+from lib.marc import OAIStream
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+@pytest.fixture(params=["lxml", "stdlib"], autouse=True)
+def parser(request, monkeypatch):
+    # lxml is picked when installed, the standard library parser must read the page the same way
+    if request.param == "lxml":
+        pytest.importorskip("lxml")
+        assert marc.ET.__name__ == "lxml.etree"
+    else:
+        monkeypatch.setattr(marc, "ET", xml.etree.ElementTree)
+        monkeypatch.setattr(marc, "ITERPARSE_OPTIONS", {"events": ("start", "end")})
+    return request.param
+
+@pytest.fixture
+def stream():
+    f = open(os.path.join(FIXTURES, "oai_list_records_page.xml"), "rb")
+    yield OAIStream(f)
+    f.close()
+
+def test_namespaced_records_are_parsed(stream):
+    records = list(stream)
+
+    assert [(r["id"], r["datestamp"], r["deleted"], r["is_game"]) for r in records] == [
+        ("folio-halo", "2026-01-30T09:15:02Z", False, True),
+        ("folio-withdrawn", "2026-01-31T14:02:11Z", True, False),
+        ("folio-manual", "2026-01-31T16:12:37Z", False, False),
+    ]
+    assert records[0]["metadata"] == {
+        "title": ["Halo :"],
+        "alternative_titles": ["Halo combat evolved", "Halo CE"],
+        "authors": ["Bungie Studios,", "Microsoft Game Studios,"],
+        "edition": ["Platinum hits edition."],
+        "platform": ["Xbox"],
+        "callnumber": "GAME XBOX H35",
+    }
+
+def test_deleted_records_have_no_metadata(stream):
+    withdrawn = next(r for r in stream if r["id"] == "folio-withdrawn")
+
+    assert withdrawn["deleted"] is True
+    assert withdrawn["metadata"] is None
+
+def test_envelope_values_are_set_while_iterating(stream):
+    assert stream.resumption_token is None
+
+    records = iter(stream)
+    next(records)
+    assert stream.response_date == "2026-02-01T06:00:00Z"
+
+    list(records)
+    assert stream.resumption_token == "marc21|2026-01-30|3"
+    assert stream.error is None
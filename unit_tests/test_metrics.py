@@ -0,0 +1,83 @@
+"""
+Tests of stage timing and the metrics report files.
+
+Author: Amrit Srivastava
+"""
+
+import json
+import threading
+import time
+import pytest
+import lib.metrics as metrics_module
+from lib.metrics import MetricsRegistry, stage, write_reports
+
+@pytest.fixture
+def metrics(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    return registry
+
+def stage_seconds(metrics, name):
+    return metrics.histograms[("stage_seconds", (("stage", name),))]
+
+def test_recursive_calls_are_timed_separately(metrics):
+    @stage("recursive")
+    def run(depth):
+        time.sleep(0.02)
+        if depth:
+            run(depth - 1)
+
+    run(2)
+
+    # The outermost call spans all three sleeps, the innermost only its own
+    histogram = stage_seconds(metrics, "recursive")
+    assert histogram.count == 3
+    assert histogram.max >= 0.06
+    assert histogram.min < 0.04
+
+def test_concurrent_calls_are_timed_separately(metrics):
+    @stage("concurrent")
+    def run(seconds):
+        time.sleep(seconds)
+
+    threads = [threading.Thread(target=run, args=(seconds,)) for seconds in (0.01, 0.1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    histogram = stage_seconds(metrics, "concurrent")
+    assert histogram.count == 2
+    assert histogram.min < 0.05 <= histogram.max
+
+def test_nested_profiled_stage_is_profiled_once(metrics, monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics_module, "PROFILE_STAGE", "profiled")
+    monkeypatch.setattr(metrics_module, "METRICS_DIR", str(tmp_path))
+
+    @stage("profiled")
+    def run(depth):
+        if depth:
+            run(depth - 1)
+
+    run(1)
+
+    assert [path.name for path in tmp_path.iterdir()] == ["profiled.prof"]
+    assert metrics.counters[("stage_runs_total", (("stage", "profiled"), ("status", "ok")))] == 2
+
+def test_workers_write_reports_of_their_own(metrics, tmp_path):
+    metrics.increment("items_total", stage="enrich")
+
+    write_reports(str(tmp_path), worker="host-a:101")
+    write_reports(str(tmp_path), worker="host-b:202")
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "games_api-host-a_101.prom", "games_api-host-b_202.prom",
+        "run-report-host-a_101.json", "run-report-host-b_202.json",
+    ]
+    assert 'games_api_items_total{worker="host-b:202",stage="enrich"} 1' in (tmp_path / "games_api-host-b_202.prom").read_text()
+    assert json.loads((tmp_path / "run-report-host-a_101.json").read_text())["worker"] == "host-a:101"
+
+def test_single_runs_keep_the_fixed_report_names(metrics, tmp_path):
+    write_reports(str(tmp_path))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["games_api.prom", "run-report.json"]
@@ -0,0 +1,52 @@
+"""
+Tests of the read API's conditional responses.
+
+Author: Amrit Srivastava
+"""
+
+import http.client
+import threading
+import pytest
+from lib.catalog_index import CatalogIndex
+from server import CatalogServer
+
+GAMES = [{"_id": 8, "name": "Halo", "genres": [{"id": 5, "name": "Shooter"}], "platforms": [11],
+          "dmc_entries": [{"folioid": "halo", "confidence": 0.95}]}]
+ITEMS = [{"_id": "halo", "title": ["Halo"], "alternative_titles": []}]
+
+@pytest.fixture(scope="module")
+def server():
+    server = CatalogServer(("127.0.0.1", 0), CatalogIndex(GAMES, ITEMS))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get(server, path, etag=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    connection.request("GET", path, headers={"If-None-Match": etag} if etag else {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, body
+
+@pytest.mark.parametrize("path", ["/games", "/games?genre=shooter", "/games/8", "/items/halo", "/search?q=halo", "/health"])
+def test_current_etag_gets_a_304_on_successful_routes(server, path):
+    assert get(server, path)[0] == 200
+    assert get(server, path, server.index.etag) == (304, b"")
+
+@pytest.mark.parametrize("path, status", [
+    ("/games/9", 404),
+    ("/items/missing", 404),
+    ("/nowhere", 404),
+    ("/games/eight", 400),
+    ("/games?limit=0", 400),
+    ("/games?colour=red", 400),
+    ("/search", 400),
+])
+def test_errors_are_not_masked_by_a_matching_etag(server, path, status):
+    assert get(server, path, server.index.etag)[0] == status
+
+def test_stale_etag_gets_the_body(server):
+    status, body = get(server, "/games/8", '"stale"')
+    assert status == 200 and b'"Halo"' in body
@@ -0,0 +1,35 @@
+"""
+Tests of the storage interface shared by both backends.
+
+Author: Amrit Srivastava
+"""
+
+import pytest
+from lib.storage import MongoStorage, Storage
+
+@pytest.fixture(params=["sqlite", "mongodb"])
+def storage(request, item):
+    if request.param == "sqlite":
+        storage = request.getfixturevalue("sqlite_storage")
+        storage.upsert_changed("dmc-items", [item("a"), item("b"), item("c")])
+    else:
+        mongo_db = request.getfixturevalue("mongo_db")
+        mongo_db["dmc-items"].insert_many([item(id, needs_enrichment=True) for id in "abc"])
+        storage = MongoStorage()
+    return storage
+
+def test_find_items_returns_the_enrichment_inputs_of_stored_items(storage):
+    found = sorted(storage.find_items(["c", "a", "missing"]), key=lambda doc: doc["_id"])
+
+    assert found == [
+        {"_id": "a", "title": ["Game a"], "alternative_titles": [], "platform_id_guess": [6]},
+        {"_id": "c", "title": ["Game c"], "alternative_titles": [], "platform_id_guess": [6]},
+    ]
+
+def test_backends_must_implement_the_whole_interface():
+    class PartialStorage(Storage):
+        def get_state(self, key):
+            return {}
+
+    with pytest.raises(TypeError):
+        PartialStorage()
@@ -0,0 +1,153 @@
+"""
+Tests of the title and platform matchers, run on deterministic stand-in embeddings.
+
+Author: Amrit Srivastava
+"""
+
+import zlib
+import numpy as np
+import pytest
+import lib.metrics as metrics_module
+import lib.string_matcher as string_matcher
+from lib.metrics import MetricsRegistry
+from lib.string_matcher import GameTitleMatcher, PlatformMatcher
+
+PLATFORMS = [
+    {"_id": 48, "name": "PlayStation 4", "abbreviation": "PS4"},
+    {"_id": 9, "name": "PlayStation 3", "abbreviation": "PS3"},
+    {"_id": 49, "name": "Xbox One", "abbreviation": "XONE"},
+    {"_id": 5, "name": "Wii", "alternative_name": "Revolution"},
+    {"_id": 41, "name": "Wii U", "alternative_name": "Revolution"},
+]
+
+class StubEmbeddingStore:
+    """
+    Stands in for the embedding cache and model, every string gets a fixed pseudo-random vector.
+    """
+    def __init__(self):
+        self.requested = []
+
+    def encode(self, texts, encode):
+        self.requested.extend(texts)
+        return np.array([vector(text) for text in texts])
+
+def vector(text):
+    return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=16)
+
+def game(id, name):
+    return {"id": id, "name": name}
+
+def scalar_match(local_titles, candidates):
+    """
+    Matches one group the way GameTitleMatcher.match did before batching: mean
+    similarity across the local titles, first candidate on ties.
+    """
+    if not (local_titles and candidates):
+        return None, 0.0
+    similarities = string_matcher.cos_sim(np.array([vector(t) for t in local_titles]), np.array([vector(g["name"]) for g in candidates]))
+    scores = similarities.mean(axis=0)
+    best = int(np.argmax(scores))
+    return candidates[best], float(scores[best])
+
+@pytest.fixture
+def store(monkeypatch):
+    store = StubEmbeddingStore()
+    monkeypatch.setattr(string_matcher, "get_embedding_store", lambda model_name: store)
+    return store
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_module, "metrics", registry)
+    return registry
+
+@pytest.fixture
+def title_matcher(store):
+    return GameTitleMatcher(backend="torch")
+
+@pytest.fixture
+def platform_matcher(store):
+    matcher = PlatformMatcher(cache_path=None, platform_data=PLATFORMS, backend="torch")
+    store.requested.clear()  # Forget the corpus embedded on construction
+    return matcher
+
+def decisions(registry, matcher):
+    return {
+        dict(labels)["tier"]: count 
+        for (name, labels), count in registry.counters.items() 
+        if name == "matcher_decisions_total" and dict(labels)["matcher"] == matcher
+    }
+
+def test_batched_matches_equal_the_per_group_path(title_matcher):
+    groups = [
+        (["Halo", "Halo: Combat Evolved"], [game(1, "Fable"), game(2, "Gears of War"), game(3, "Forza")]),
+        (["Wii Sports"], [game(4, "Mario Kart")]),                        # A single candidate
+        (["Okami", "Ookami", "Okami HD"], [game(5, "Bayonetta"), game(6, "Viewtiful Joe")]),
+        (["Tetris"], []),                                                 # No candidates
+        ([], [game(7, "Pong")]),                                          # No titles
+        (["Portal"], [game(8, "Half-Life"), game(9, "Half-Life")]),       # Tied candidates
+    ]
+
+    results = title_matcher.match_many(groups)
+
+    for (best, score), (local_titles, candidates) in zip(results, groups):
+        expected_best, expected_score = scalar_match(local_titles, candidates)
+        assert best is expected_best
+        assert score == pytest.approx(expected_score, abs=1e-6)
+
+def test_groups_without_titles_or_candidates_are_unmatched(title_matcher, store):
+    assert title_matcher.match_many([(["Tetris"], []), ([], [game(7, "Pong")])]) == [(None, 0.0), (None, 0.0)]
+    assert store.requested == []
+
+def test_tied_candidates_keep_the_first(title_matcher):
+    candidates = [game(8, "Half-Life"), game(9, "Half-Life"), game(10, "Half-Life")]
+
+    (best, _), = title_matcher.match_many([(["Portal"], candidates)])
+
+    assert best is candidates[0]
+
+def test_a_single_candidate_is_returned_with_its_score(title_matcher):
+    candidate = game(4, "Mario Kart")
+
+    (best, score), = title_matcher.match_many([(["Wii Sports", "Wii Sports Resort"], [candidate])])
+
+    assert best is candidate
+    assert score == pytest.approx(scalar_match(["Wii Sports", "Wii Sports Resort"], [candidate])[1], abs=1e-6)
+
+def test_known_platform_aliases_are_resolved_without_the_model(platform_matcher, store, registry):
+    assert platform_matcher.match_many(["Sony PlayStation 4.", "PS3", "xone"]) == [48, 9, 49]
+    assert store.requested == []
+    assert decisions(registry, "platform") == {"alias": 3}
+
+def test_platform_near_misses_fall_through_to_the_model(platform_matcher, store, registry):
+    # Not an alias, and an alias naming two platforms
+    platform_matcher.match_many(["PlayStation 4 Pro", "Revolution"])
+
+    assert store.requested == ["playstation 4 pro", "revolution"]
+    assert decisions(registry, "platform") == {"semantic": 2}
+
+def test_titles_equal_after_normalization_are_matched_exactly(title_matcher, store, registry):
+    candidates = [game(1, "Assassin's Creed"), game(2, "Assassins Creed III")]
+
+    assert title_matcher.match_many([(["Assassin's Creed: III /"], candidates)]) == [(candidates[1], 1.0)]
+    assert store.requested == []
+    assert decisions(registry, "title") == {"exact": 1}
+
+def test_titles_with_reordered_words_are_matched_by_token_sort(title_matcher, store, registry):
+    candidates = [game(1, "The Sims"), game(2, "The Sims 2")]
+
+    assert title_matcher.match_many([(["Sims 2, The"], candidates)]) == [(candidates[1], 1.0)]
+    assert store.requested == []
+    assert decisions(registry, "title") == {"token_sort": 1}
+
+def test_title_near_misses_fall_through_to_the_model(title_matcher, store, registry):
+    groups = [
+        (["Halo 2"], [game(1, "Halo"), game(2, "Halo 3")]),                  # No candidate of that name
+        (["Tomb Raider"], [game(3, "Tomb Raider"), game(4, "Tomb Raider")]),  # Several games of that name
+    ]
+
+    results = title_matcher.match_many(groups)
+
+    assert [best for best, _ in results] == [scalar_match(*group)[0] for group in groups]
+    assert set(store.requested) == {"Halo 2", "Halo", "Halo 3", "Tomb Raider"}
+    assert decisions(registry, "title") == {"semantic": 2}
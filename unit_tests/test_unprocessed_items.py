@@ -0,0 +1,64 @@
+"""
+Tests of unprocessed-item detection on both storage backends.
+
+Author: Amrit Srivastava
+"""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+import lib.database_helpers as database_helpers
+from lib.response_cache import NEGATIVE_TTL
+
+MATCHER_VERSION = "test"
+
+def record(id, igdb_id, age):
+    enriched_at = datetime.now(timezone.utc) - age
+    return id, f"hash-{id}", {
+        "input_hash": f"hash-{id}",
+        "matcher_version": MATCHER_VERSION,
+        "igdb_id": igdb_id,
+        "enriched_at": enriched_at.isoformat(),
+    }
+
+@pytest.fixture
+def storage(sqlite_storage, item):
+    seed(sqlite_storage, item)
+    return sqlite_storage
+
+def seed(storage, item):
+    storage.ensure_indexes()
+    ids = ["new", "matched-old", "unmatched-recent", "unmatched-old", "changed"]
+    storage.upsert_changed("dmc-items", [item(id) for id in ids])
+    storage.record_enrichment([
+        record("matched-old", 42, timedelta(days=365)),
+        record("unmatched-recent", None, timedelta(seconds=NEGATIVE_TTL // 2)),
+        record("unmatched-old", None, timedelta(seconds=NEGATIVE_TTL + 60)),
+        record("changed", 42, timedelta(days=1)),
+    ])
+    storage.upsert_changed("dmc-items", [{**item("changed"), "input_hash": "hash-changed-2"}])
+
+def unprocessed(storage, matcher_version=MATCHER_VERSION):
+    return sorted(doc["_id"] for doc in storage.unprocessed_items(matcher_version))
+
+def test_unmatched_items_are_searched_again_after_the_negative_ttl(storage):
+    assert unprocessed(storage) == ["changed", "new", "unmatched-old"]
+
+def test_recording_the_enrichment_clears_the_item(storage):
+    storage.record_enrichment([record("unmatched-old", None, timedelta(0)), record("new", 7, timedelta(0))])
+    assert unprocessed(storage) == ["changed"]
+
+def test_another_matcher_version_returns_every_item_once(storage):
+    assert unprocessed(storage, "other") == ["changed", "matched-old", "new", "unmatched-old", "unmatched-recent"]
+
+def test_mongodb_query_selects_the_same_items(mongo_db, item):
+    # Documents as upsert_changed and record_enrichment leave them
+    documents = [{**item("new"), "needs_enrichment": True}]
+    for id, igdb_id, age in [("matched-old", 42, 365 * 86400), ("unmatched-recent", None, NEGATIVE_TTL // 2), ("unmatched-old", None, NEGATIVE_TTL + 60)]:
+        _, _, enrichment = record(id, igdb_id, timedelta(seconds=age))
+        documents.append({**item(id), "needs_enrichment": False, "enrichment": enrichment})
+    _, _, enrichment = record("changed", 42, timedelta(days=1))
+    documents.append({**item("changed"), "input_hash": "hash-changed-2", "needs_enrichment": True, "enrichment": enrichment})
+    mongo_db["dmc-items"].insert_many(documents)
+
+    found = sorted(doc["_id"] for doc in database_helpers.fetch_unprocessed_games(MATCHER_VERSION))
+    assert found == ["changed", "new", "unmatched-old"]